@@ -0,0 +1,36 @@
+#benchmark: throughput of the majority logic QRM decoder on bit-packed syndrome batches
+#usage: python benchmarks/bench_decoder.py [m_max] [shots]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from rm_generators import rm_monomials
+from qrm_decoder import pack_shots, unpack_shots, monomial_parities, decode_syndromes
+
+def correctable_errors(shots, r, m, rng):
+    #random X errors of weight < 2^(m-r-1), packed along the shots
+    t = 2**(m-r-1) - 1 if r < m else 0
+    E = np.zeros((shots, 2**m), dtype=np.uint8)
+    for i, w in enumerate(rng.integers(0, t + 1, shots)):
+        E[i, rng.choice(2**m, w, replace=False)] = 1
+    return E
+
+def main(m_max = 10, shots = 2**14):
+    rng = np.random.default_rng(0)
+    print('{:>3} {:>3} {:>8} {:>9} {:>10} {:>12}'.format('r', 'm', 'checks', 'decode s', 'shots/s', 'all correct'))
+    for m in range(2, m_max + 1):
+        for r in range(m//2, m):
+            E = correctable_errors(shots, r, m, rng)
+            e = pack_shots(E)
+            syndromes = monomial_parities(e, rm_monomials(0, m-r-1, m), m)
+            t = time.perf_counter()
+            estimate = decode_syndromes(syndromes, r, m)
+            t = time.perf_counter() - t
+            correct = bool((unpack_shots(estimate, shots) == E).all())
+            print('{:>3} {:>3} {:>8} {:>9.3f} {:>10.0f} {:>12}'.format(r, m, len(syndromes), t, shots/t, str(correct)))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
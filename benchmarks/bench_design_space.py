@@ -0,0 +1,29 @@
+#benchmark: analytic design space explorer over (r1, r2, m1, m2) up to m = 60, time and Pareto front per family
+#usage: python benchmarks/bench_design_space.py [m_max] [processes]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from design_space import explore
+
+def main(m_max = 60, processes = 1):
+    print('{:>10} {:>10} {:>13} {:>10} {:>10} {:>6} {:>8}'.format('family', 'rate', 'cost', 'candidates', 'feasible', 'front', 's'))
+    for family, rate, cost in [('tpc', 'catalytic', 'cx'), ('tpc', 'EA', 'cx'), ('tpc', 'catalytic', 'cx_per_qubit'),
+                               ('assym', 'catalytic', 'cx'), ('assym', 'catalytic', 'cx_per_qubit'),
+                               ('assym_punc', 'catalytic', 'cx'), ('assym_punc', 'catalytic', 'cx_per_qubit')]:
+        t = time.perf_counter()
+        res = explore(family, m_max, rate=rate, cost=cost, processes=processes)
+        s = res['stats']
+        print('{:>10} {:>10} {:>13} {:>10} {:>10} {:>6} {:>8.2f}'.format(family, rate if family == 'tpc' else '-', cost,
+              s['candidates'], s['feasible'], s['front'], time.perf_counter() - t))
+    front = explore('tpc', m_max, cost='cx_per_qubit', processes=processes)['front']
+    print('\ntpc front, cx per qubit')
+    print('{:>3} {:>3} {:>3} {:>3} {:>10} {:>12} {:>6}'.format('r1', 'r2', 'm1', 'm2', 'rate', 'cx/qubit', 'depth'))
+    for i in range(len(front['rate'])):
+        print('{:>3} {:>3} {:>3} {:>3} {:>10.6f} {:>12.3f} {:>6}'.format(*[int(front[c][i]) for c in ['r1', 'r2', 'm1', 'm2']],
+              front['rate'][i], front['cost'][i], int(front['depth'][i])))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
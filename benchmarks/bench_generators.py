@@ -0,0 +1,79 @@
+#benchmark: Kronecker generator construction vs the bit-packed generator engine
+#usage: python benchmarks/bench_generators.py [m_min] [m_max]
+
+import os
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import rm_generators
+from qrm_matrices import get_full_matrix
+from qrm_circuits import QRM_rec_circuit
+
+LEGACY_MAX_M = 12 #the full 2^m x 2^m int64 matrix needs 8*4^m bytes
+
+def legacy_Grm(r, m):
+    F = get_full_matrix(m)
+    return [F[i] for i in range(len(F)) if sum(F[i]) >=2**(m-r)]
+
+def legacy_leading_bits_r1r2(r1, r2, m):
+    F = get_full_matrix(m)
+    G = [F[i] for i in range(len(F)) if sum(F[i]) >=2**(m-r2)]
+    G = [row for row in G if sum(row) in [2**(m-i) for i in range(r1, r2 + 1)]]
+    return [int(np.argmax(row)) for row in G]
+
+def encoder_calls(r, m):
+    #(r1, r2, m) generator calls made by QRM_rec_circuit(r, m)
+    if m == 0 or r == m:
+        return []
+    calls = encoder_calls(r, m-1)
+    if r > m-r-1:
+        calls = [(m-r, r, m-1)] + calls
+    return [(m-r-1, m-r-1, m-1)] + 2*calls
+
+def measure(f, *args):
+    tracemalloc.start()
+    t = time.perf_counter()
+    f(*args)
+    t = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return t, peak
+
+def replay(calls, leading_bits):
+    for c in calls:
+        leading_bits(*c)
+
+def engine_leading_bits_r1r2(r1, r2, m):
+    return rm_generators.rm_monomials(r1, r2, m).tolist()
+
+def main(m_min = 8, m_max = 14):
+    print('{:>3} {:>3} | {:>12} {:>12} | {:>12} {:>12} | {:>12} {:>12}'.format(
+        'r', 'm', 'Grm old s', 'Grm new s', 'Grm old MB', 'Grm new MB', 'enc old s', 'enc new s'))
+    for m in range(m_min, m_max + 1):
+        r = m//2
+        rm_generators.clear_cache()
+        new_t, new_peak = measure(rm_generators.packed_generator, r, m)
+        rm_generators.clear_cache()
+        calls = encoder_calls(r, m)
+        enc_new, _ = measure(replay, calls, engine_leading_bits_r1r2)
+        if m <= LEGACY_MAX_M:
+            old_t, old_peak = measure(legacy_Grm, r, m)
+            enc_old, _ = measure(replay, calls, legacy_leading_bits_r1r2)
+            old = (old_t, old_peak/2**20, enc_old)
+        else:
+            old = (float('nan'),)*3
+        print('{:>3} {:>3} | {:>12.4f} {:>12.4f} | {:>12.1f} {:>12.1f} | {:>12.4f} {:>12.4f}'.format(
+            r, m, old[0], new_t, old[1], new_peak/2**20, old[2], enc_new))
+
+    #full encoder construction with the engine, only_cnots
+    for m in range(m_min, min(m_max, 10) + 1):
+        r = m//2
+        t = time.perf_counter()
+        QRM_rec_circuit(r, m, only_cnots=True)
+        print('QRM_rec_circuit({}, {}): {:.2f} s'.format(r, m, time.perf_counter() - t))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,48 @@
+#benchmark: binary / stim / OpenQASM 2 writers and readers vs tequila.export_open_qasm
+#usage: python benchmarks/bench_io.py [m] [tequila_max_m]
+
+import os
+import sys
+import time
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import tequila
+from qrm_circuits import QRM_rec_circuit
+from encoder_stream import stream_QRM_rec_circuit, collect
+from encoder_io import write_binary, read_binary, write_stim, read_stim, write_qasm, read_qasm
+
+def timed(f, *args, **kwargs):
+    t = time.perf_counter()
+    out = f(*args, **kwargs)
+    return time.perf_counter() - t, out
+
+def main(m = 17, tequila_max_m = 11):
+    r = m//2
+    directory = tempfile.mkdtemp()
+    t, U = timed(lambda: collect(stream_QRM_rec_circuit(r, m)))
+    print('QRM_rec_circuit({}, {}): {} gates, built in {:.2f} s'.format(r, m, len(U), t))
+    print('{:>8} | {:>9} {:>9} {:>9} | {:>9}'.format('format', 'write s', 'read s', 'MB', 'same'))
+    for name, write, read, kwargs in [('binary', write_binary, read_binary, {}),
+                                      ('stim', write_stim, read_stim, {}),
+                                      ('qasm', write_qasm, read_qasm, {})]:
+        path = os.path.join(directory, 'encoder.' + name)
+        tw, _ = timed(write, path, U, **kwargs)
+        tr, (V, _) = timed(read, path)
+        same = len(V) == len(U) and (V.targets == U.targets).all() and (V.controls == U.controls).all()
+        print('{:>8} | {:>9.2f} {:>9.2f} {:>9.1f} | {:>9}'.format(name, tw, tr, os.path.getsize(path)/2**20, str(same)))
+        os.remove(path)
+
+    #streamed straight from the encoder, without the full circuit
+    path = os.path.join(directory, 'encoder.bin')
+    t, n = timed(write_binary, path, stream_QRM_rec_circuit(r, m))
+    print('streamed binary write of {} gates: {:.2f} s'.format(n, t))
+    os.remove(path)
+
+    for m_small in range(8, tequila_max_m + 1):
+        U = QRM_rec_circuit(m_small//2, m_small)[0]
+        t, qasm = timed(tequila.export_open_qasm, U)
+        print('tequila.export_open_qasm m = {}: {} gates, {:.2f} s'.format(m_small, len(U.gates), t))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
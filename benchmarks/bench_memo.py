@@ -0,0 +1,43 @@
+#benchmark: recursive encoders with memoized sub-encoders vs building every recursion branch
+#usage: python benchmarks/bench_memo.py [m_min] [m_max]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import qrm_circuits
+from qrm_circuits import QRM_rec_circuit, QRM_rec_classical_circuit, clear_sub_encoder_cache
+from qrm_circuits_new import RecursiveQRM, RecursiveBasisQRM
+
+ENCODERS = {
+    'QRM_rec_circuit': lambda r, m: QRM_rec_circuit(r, m, circ_type='native'),
+    'QRM_rec_classical': lambda r, m: QRM_rec_classical_circuit(r, m, circ_type='native'),
+    'RecursiveQRM': lambda r, m: RecursiveQRM(r, m, circ_type='native'),
+    'RecursiveBasisQRM': lambda r, m: RecursiveBasisQRM(r, m, circ_type='native'),
+}
+
+def build(encoder, r, m, memoize):
+    qrm_circuits.MEMOIZE_SUB_ENCODERS = memoize
+    clear_sub_encoder_cache()
+    t = time.perf_counter()
+    out = ENCODERS[encoder](r, m)
+    return time.perf_counter() - t, out
+
+def same_circuit(a, b):
+    return all(np.array_equal(x, y) for x, y in [(a.opcodes, b.opcodes), (a.controls, b.controls), (a.targets, b.targets)])
+
+def main(m_min = 8, m_max = 14):
+    print('{:>18} {:>3} {:>3} | {:>10} {:>10} {:>8} | {}'.format('encoder', 'r', 'm', 'old s', 'memo s', 'speedup', 'same'))
+    for m in range(m_min, m_max + 1):
+        r = m//2
+        for encoder in ENCODERS:
+            old_t, old = build(encoder, r, m, memoize=False)
+            new_t, new = build(encoder, r, m, memoize=True)
+            print('{:>18} {:>3} {:>3} | {:>10.3f} {:>10.3f} {:>8.1f} | {}'.format(
+                encoder, r, m, old_t, new_t, old_t/new_t, same_circuit(old[0], new[0])))
+    qrm_circuits.MEMOIZE_SUB_ENCODERS = True
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,29 @@
+#benchmark: logical / detection failure rates of the encoders under circuit level depolarizing noise
+#usage: python benchmarks/bench_noise.py [r] [m] [p] [max_shots]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from qrm_circuits import QRM_rec_circuit, QRM_std_circuit
+from qrm_circuits_new import RecursiveQRM
+from noise_benchmark import benchmark_encoder
+
+def main(r = 3, m = 6, p = 1e-3, max_shots = 10**7):
+    noises = [('DEPOLARIZE1', p), ('DEPOLARIZE2', p)]
+    print('QRM({}, {}), depolarizing p = {}, target 5% relative precision'.format(r, m, p))
+    print('{:>14} {:>6} {:>6} | {:>9} {:>11} {:>23} {:>11} | {:>7} {:>9}'.format(
+        'encoder', 'gates', 'depth', 'shots', 'detected', 'logical (95% CI)', 'undetected', 's', 'shots/s'))
+    for name, encoder in [('QRM_rec', QRM_rec_circuit), ('QRM_std', QRM_std_circuit), ('RecursiveQRM', RecursiveQRM)]:
+        t = time.perf_counter()
+        res = benchmark_encoder(encoder, r, m, noises, shots=max_shots, target_rse=0.05, seed=1)
+        t = time.perf_counter() - t
+        lo, hi = res['intervals']['logical']
+        print('{:>14} {:>6} {:>6} | {:>9} {:>11.3e} {:>23} {:>11.3e} | {:>7.2f} {:>9.0f}'.format(
+            name, res['gates'], res['depth'], res['shots'], res['rates']['detected'],
+            '{:.3e} [{:.2e}, {:.2e}]'.format(res['rates']['logical'], lo, hi),
+            res['rates']['undetected_logical'], t, res['shots']/t))
+
+if __name__ == '__main__':
+    main(*[cast(a) for cast, a in zip([int, int, float, int], sys.argv[1:])])
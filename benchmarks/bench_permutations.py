@@ -0,0 +1,91 @@
+#microbenchmark: dict-backed vs array-backed Permutation
+#usage: python benchmarks/bench_permutations.py [log2_n_min] [log2_n_max]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from permutations import Permutation, concatenate_permutations
+
+LEGACY_FILL_MAX = 1 << 14 #legacy fill is O(n^2)
+
+class LegacyPermutation:
+    #the previous dict-backed implementation of the benchmarked operations
+    def __init__(self, mapping):
+        self.mapping = mapping
+
+    def inv_permute(self, i):
+        return list(self.mapping.keys())[list(self.mapping.values()).index(i)]
+
+    def __add__(self, other):
+        new_mapping = dict(self.mapping)
+        new_mapping.update(other.mapping)
+        return LegacyPermutation(new_mapping)
+
+    def __mul__(self, other):
+        return LegacyPermutation({k: self.mapping[v] for k, v in other.mapping.items()})
+
+    def fill(self, qubit_list):
+        ukeys, uvalues = [], []
+        for q in qubit_list:
+            if q not in self.mapping.keys():
+                ukeys.append(q)
+            if q not in self.mapping.values():
+                uvalues.append(q)
+        for k, v in zip(sorted(ukeys), sorted(uvalues)):
+            self.mapping[k] = v
+
+def legacy_concatenate(perm_list, vec_list):
+    new_dict = {}
+    for perm, vec in zip(perm_list, vec_list):
+        for k, v in perm.mapping.items():
+            new_dict[vec[k]] = vec[v]
+    return LegacyPermutation(new_dict)
+
+def timeit(f, repeat = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        f()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def cases(n, rng):
+    a = rng.permutation(n)
+    b = rng.permutation(n)
+    half = rng.permutation(n//2)
+    vecs = [list(range(0, n, 2)), list(range(1, n, 2))]
+    partial = {int(k): int(v) for k, v in zip(rng.choice(n, n//2, replace=False), rng.choice(n, n//2, replace=False))}
+
+    old_a, old_b = LegacyPermutation(dict(enumerate(a.tolist()))), LegacyPermutation(dict(enumerate(b.tolist())))
+    new_a, new_b = Permutation.init_from_vector(a), Permutation.init_from_vector(b)
+    old_h, new_h = LegacyPermutation(dict(enumerate(half.tolist()))), Permutation.init_from_vector(half)
+    queries = rng.integers(0, n, 100).tolist()
+    return {
+        'compose': (lambda: old_a * old_b, lambda: new_a * new_b),
+        'add': (lambda: old_a + old_b, lambda: new_a + new_b),
+        'inv_permute x100': (lambda: [old_a.inv_permute(q) for q in queries],
+                             lambda: [new_a.inv_permute(q) for q in queries]),
+        'concatenate': (lambda: legacy_concatenate([old_h, old_h], vecs),
+                        lambda: concatenate_permutations([new_h, new_h], vecs)),
+        'fill': (lambda: LegacyPermutation(dict(partial)).fill(range(n)) if n <= LEGACY_FILL_MAX else None,
+                 lambda: Permutation(partial).fill(range(n))),
+    }
+
+def main(lo = 10, hi = 16):
+    rng = np.random.default_rng(0)
+    print('{:>8} {:>18} | {:>10} {:>10} {:>8}'.format('n', 'operation', 'dict s', 'array s', 'speedup'))
+    for p in range(lo, hi + 1):
+        n = 1 << p
+        for name, (old, new) in cases(n, rng).items():
+            if name == 'fill' and n > LEGACY_FILL_MAX:
+                t_old = float('nan')
+            else:
+                t_old = timeit(old)
+            t_new = timeit(new)
+            print('{:>8} {:>18} | {:>10.5f} {:>10.5f} {:>8.1f}'.format(n, name, t_old, t_new, t_old/t_new))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:3]])
@@ -0,0 +1,34 @@
+#benchmark: codewords per second of the batched RM(r, m) encoder in its three layouts, checked against Grm(r, m)
+#usage: python benchmarks/bench_rm_encoder.py [m_max] [batch]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+from qrm_matrices import Grm
+from qrm_decoder import pack_shots
+from rm_encoder import rm_encode, rm_encode_packed
+
+def rate(f, batch):
+    t = time.perf_counter()
+    f()
+    return batch/(time.perf_counter() - t)
+
+def main(m_max = 10, batch = 2**18):
+    rng = np.random.default_rng(0)
+    print('{:>3} {:>3} {:>6} {:>12} {:>12} {:>12} {:>8}'.format('r', 'm', 'k', 'dense/s', 'rows/s', 'packed/s', 'correct'))
+    for m in range(2, m_max + 1):
+        r = m//2
+        G = np.array(Grm(r, m))
+        a = rng.integers(0, 2, (batch, len(G)), dtype=np.uint8)
+        packed = pack_shots(a)
+        dense = rate(lambda: rm_encode(a, r, m), batch)
+        rows = rate(lambda: rm_encode(a, r, m, packed_rows=True), batch)
+        words = rate(lambda: rm_encode_packed(packed, r, m), batch)
+        correct = bool((rm_encode(a[:256], r, m) == (a[:256].astype(np.int64) @ G) % 2).all())
+        print('{:>3} {:>3} {:>6} {:>12.0f} {:>12.0f} {:>12.0f} {:>8}'.format(r, m, len(G), dense, rows, words, str(correct)))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,41 @@
+#benchmark: routed cost (SWAPs, routed depth) of the encoder families on a grid and a heavy hex lattice
+#usage: python benchmarks/bench_routing.py [m] [processes] [edge_list_file]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from qrm_circuits import QRM_rec_circuit, QRM_std_circuit, QRM_rec_punc_circuit
+from qrm_circuits_new import RecursiveQRM
+from coupling import CouplingMap, smallest, routed_cost, RoutedCost
+from partition_search import optimize_partitions
+
+ENCODERS = [('QRM_rec', QRM_rec_circuit), ('QRM_std', QRM_std_circuit), ('RecursiveQRM', RecursiveQRM),
+            ('QRM_rec_punc', QRM_rec_punc_circuit)]
+
+def main(m = 8, processes = 1, edge_list = None):
+    r = m//2
+    couplings = [smallest('grid', 2**m), smallest('heavy_hex', 2**m)]
+    if edge_list:
+        couplings.append(CouplingMap.from_file(edge_list))
+    for coupling in couplings:
+        print('{}, QRM({}, {})'.format(coupling, r, m))
+        print('{:>14} {:>7} {:>9} {:>8} {:>10} {:>22} {:>7}'.format('encoder', 'gates', 'depth', 'swaps', 'routed', 'best layout', 's'))
+        rows = []
+        for name, encoder in ENCODERS:
+            t = time.perf_counter()
+            layout, best, ranked = routed_cost(encoder, r, m, coupling, processes=processes)
+            U = encoder(r, m, circ_type='native')[0]
+            rows.append((best['swaps'], name, len(U), U.depth, best['depth'], layout, time.perf_counter() - t))
+        for swaps, name, gates, depth, routed, layout, t in sorted(rows):
+            print('{:>14} {:>7} {:>9} {:>8} {:>10} {:>22} {:>7.2f}'.format(name, gates, depth, swaps, routed, layout, t))
+    #partitions of QRM_rec_circuit ranked by SWAPs on the grid (identity layout)
+    t = time.perf_counter()
+    best, swaps, stats = optimize_partitions('rec', r, min(m, 6), cost=RoutedCost(smallest('grid', 2**min(m, 6))), processes=processes)
+    print('QRM_rec({}, {}) partitions {}: {} SWAPs (default {}), {} trees, {:.2f} s'.format(
+        r, min(m, 6), best, swaps, stats['default_cost'], stats['evaluated'], time.perf_counter() - t))
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(*([int(a) for a in args[:2]] + args[2:3]))
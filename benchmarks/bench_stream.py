@@ -0,0 +1,52 @@
+#benchmark: peak memory and time of streaming the recursive encoders vs building them
+#usage: python benchmarks/bench_stream.py [m_min] [m_max] [build_max_m]
+
+import os
+import sys
+import time
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from qrm_circuits import QRM_rec_circuit, QRM_rec_punc_circuit, QRM_rec_assym_circuit, QRM_rec_assym_punc_circuit, \
+    clear_sub_encoder_cache
+from qrm_circuits_new import RecursiveQRM
+from encoder_stream import stream_QRM_rec_circuit, stream_QRM_rec_punc_circuit, stream_QRM_rec_assym_circuit, \
+    stream_QRM_rec_assym_punc_circuit, stream_RecursiveQRM, clear_stream_cache
+
+def measure(f):
+    clear_sub_encoder_cache()
+    clear_stream_cache()
+    tracemalloc.start()
+    t = time.perf_counter()
+    n = f()
+    t = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return n, t, peak/2**20
+
+def consume(stream):
+    return sum(len(batch) for batch in stream)
+
+def main(m_min = 10, m_max = 16, build_max_m = 14):
+    print('{:>14} {:>3} {:>3} | {:>9} | {:>9} {:>9} | {:>9} {:>9}'.format(
+        'encoder', 'r', 'm', 'gates', 'build s', 'build MB', 'stream s', 'stream MB'))
+    for m in range(m_min, m_max + 1):
+        r = m//2
+        #asymmetric codes in the classical regime, r_in = r1 of design_space 'assym' and 'assym_punc'
+        r_in, r_punc = (m - 1)//2, (m - 2)//2
+        for name, build, stream in [
+            ('QRM_rec', lambda: len(QRM_rec_circuit(r, m, circ_type='native')[0]), lambda: consume(stream_QRM_rec_circuit(r, m))),
+            ('QRM_rec_punc', lambda: len(QRM_rec_punc_circuit(r, m, circ_type='native')[0]), lambda: consume(stream_QRM_rec_punc_circuit(r, m))),
+            ('QRM_rec_assym', lambda: len(QRM_rec_assym_circuit(r_in - 1, m, r_in, m, circ_type='native')[0]),
+             lambda: consume(stream_QRM_rec_assym_circuit(r_in - 1, m, r_in, m))),
+            ('QRM_assym_punc', lambda: len(QRM_rec_assym_punc_circuit(r_punc, m, r_punc, m, circ_type='native')[0]),
+             lambda: consume(stream_QRM_rec_assym_punc_circuit(r_punc, m, r_punc, m))),
+            ('RecursiveQRM', lambda: len(RecursiveQRM(r, m, circ_type='native')[0]), lambda: consume(stream_RecursiveQRM(r, m)))]:
+            n, st, smb = measure(stream)
+            bt, bmb = float('nan'), float('nan')
+            if m <= build_max_m:
+                _, bt, bmb = measure(build)
+            print('{:>14} {:>3} {:>3} | {:>9} | {:>9.2f} {:>9.1f} | {:>9.2f} {:>9.1f}'.format(name, r, m, n, bt, bmb, st, smb))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:4]])
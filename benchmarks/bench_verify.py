@@ -0,0 +1,24 @@
+#benchmark: GF(2) verification of the streamed CNOT encoders up to m = 20 (10^6 qubits)
+#usage: python benchmarks/bench_verify.py [m_max] [samples]
+
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cnot_verify import verify_stream
+
+def main(m_max = 16, samples = 64):
+    sys.setrecursionlimit(10000)
+    print('{:>3} {:>3} {:>26} {:>6} {:>9}'.format('r', 'm', 'encoder', 'ok', 's'))
+    for m in range(4, m_max + 1, 2):
+        r = m//2
+        for name, kw in [('QRM_rec_classical_circuit', {}), ('QRM_rec_circuit', {}), ('QRM_rec_punc_circuit', {}),
+                         ('QRM_rec_assym_circuit', {'r_in': r + 1}), ('QRM_rec_assym_punc_circuit', {'r_in': r}),
+                         ('RecursiveQRM', {})]:
+            t = time.perf_counter()
+            res = verify_stream(name, r, m, samples=samples, seed=0, **kw)
+            print('{:>3} {:>3} {:>26} {:>6} {:>9.2f}'.format(r, m, name, str(res['ok']), time.perf_counter() - t))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,52 @@
+#checks the predicted depths and CX counts of qrm_counts against the scheduled encoders
+#usage: python benchmarks/check_depths.py [m_max]
+
+import io
+import os
+import sys
+import time
+import contextlib
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from qrm_circuits import QRM_rec_circuit, QRM_rec_punc_circuit
+from qrm_circuits_new import RecursiveQRM, RecursiveBasisQRM
+import qrm_counts
+
+def families(m):
+    #name, (r range), encoder, predicted depth, predicted CX count
+    quantum = range(m//2, m + 1)
+    yield 'rec', quantum, lambda r: QRM_rec_circuit(r, m, circ_type='native')[0], \
+        lambda r: qrm_counts.rec_depth(r, m), lambda r: qrm_counts.rec_CX_count(r, m)
+    yield 'rec only_cnots', quantum, lambda r: QRM_rec_circuit(r, m, only_cnots=True, circ_type='native')[0], \
+        lambda r: qrm_counts.rec_depth(r, m, only_cnots=True), lambda r: qrm_counts.rec_CX_count(r, m)
+    yield 'rec classical', range(0, m + 1), lambda r: QRM_rec_circuit(r, m, classical=True, circ_type='native')[0], \
+        lambda r: qrm_counts.rec_depth(r, m, classical=True), lambda r: qrm_counts.Urm_CX_count(r, m)
+    yield 'RecursiveQRM', quantum, lambda r: RecursiveQRM(r, m, circ_type='native')[0], \
+        lambda r: qrm_counts.rec_depth(r, m), lambda r: qrm_counts.rec_CX_count(r, m)
+    yield 'RecursiveBasisQRM', range(0, m + 1), lambda r: RecursiveBasisQRM(r, m, circ_type='native')[0], \
+        lambda r: qrm_counts.Urm_depth(r, m), lambda r: qrm_counts.Urm_CX_count(r, m)
+    for state_prep in [False, True]:
+        yield 'punc state_prep={}'.format(state_prep), range(m//2, m) if m > 1 else [], \
+            lambda r, s=state_prep: QRM_rec_punc_circuit(r, m, state_prep=s, circ_type='native')[0], \
+            lambda r, s=state_prep: qrm_counts.rec_depth_punc(r, m, state_prep=s), \
+            lambda r, s=state_prep: qrm_counts.rec_CX_count_punc(r, m, state_prep=s)
+
+def main(m_max = 10):
+    failures = 0
+    for m in range(1, m_max + 1):
+        t = time.perf_counter()
+        checked = 0
+        for name, r_range, encoder, depth, count in families(m):
+            for r in r_range:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    U = encoder(r)
+                checked += 1
+                if (U.depth, U.gate_count - U.layer_widths()['H'].sum()) != (depth(r), count(r)):
+                    failures += 1
+                    print('{} r = {}, m = {}: depth {} predicted {}, CX {} predicted {}'.format(
+                        name, r, m, U.depth, depth(r), U.gate_count - U.layer_widths()['H'].sum(), count(r)))
+        print('m = {:>2}: {} encoders checked in {:.2f} s'.format(m, checked, time.perf_counter() - t))
+    print('{} mismatches'.format(failures))
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
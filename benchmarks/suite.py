@@ -0,0 +1,194 @@
+#benchmark suite: size ladders (m = 4..14) of the encoder families and utility hot paths
+#records wall time (best of the repeats, caches cleared before every run), peak traced memory (one extra
+#run under tracemalloc) and items per second (gates for encoders), and saves them as JSON.
+#usage: python benchmarks/suite.py run --out base.json [--m-min 4] [--m-max 14] [--cases ...] [--budget 60]
+#       python benchmarks/suite.py compare base.json new.json [--threshold 0.25]  (exit code 1 on regressions)
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+import qrm_circuits
+import encoder_stream
+import rm_generators
+from qrm_gates import CX_GATE
+from qrm_matrices import Grm
+from qrm_utils import connectivity
+from permutations import Permutation
+from qrm_circuits import canonical_CSS, std_generators, QRM_rec_circuit, QRM_rec_punc_circuit, QRM_rec_assym_circuit
+from qrm_circuits_new import RecursiveQRM
+
+def _gates(out):
+    return len(out[0])
+
+def _cx_arrays(m):
+    U = QRM_rec_circuit(m//2, m, only_cnots=True, circ_type='native')[0]
+    is_cx = U.opcodes == CX_GATE
+    return (U.controls[is_cx], U.targets[is_cx])
+
+def _permutations(m):
+    rng = np.random.default_rng(m)
+    return Permutation(rng.permutation(2**m)), Permutation(rng.permutation(2**m))
+
+def _compose(P, Q, n):
+    for _ in range(n):
+        P = P*Q
+    return P
+
+#case: (setup(m) -> argument (untimed), run(argument, m) -> output, items(output, argument, m), largest m)
+#Grm returns dense int64 rows (1.3 GB at m = 14), so its ladder stops at 12
+CASES = {
+    'Grm': (lambda m: None,
+            lambda _, m: Grm(m//2, m),
+            lambda out, _, m: len(out)*2**m,
+            12),
+    'canonical_CSS': (lambda m: std_generators(m//2, m),
+                      lambda G, m: canonical_CSS(G, 2**m, circ_type='native'),
+                      lambda out, G, m: _gates(out),
+                      14),
+    'QRM_rec_circuit': (lambda m: None,
+                        lambda _, m: QRM_rec_circuit(m//2, m, circ_type='native'),
+                        lambda out, _, m: _gates(out),
+                        14),
+    'QRM_rec_punc_circuit': (lambda m: None,
+                             lambda _, m: QRM_rec_punc_circuit(m//2, m, circ_type='native'),
+                             lambda out, _, m: _gates(out),
+                             14),
+    'QRM_rec_assym_circuit': (lambda m: None,
+                              lambda _, m: QRM_rec_assym_circuit(m - (m+1)//2 - 1, m, (m+1)//2, m, circ_type='native'),
+                              lambda out, _, m: _gates(out),
+                              14),
+    'RecursiveQRM': (lambda m: None,
+                     lambda _, m: RecursiveQRM(m//2, m, circ_type='native'),
+                     lambda out, _, m: _gates(out),
+                     14),
+    'connectivity': (_cx_arrays,
+                     lambda cx, m: connectivity(cx, 2**m, as_bitsets=True),
+                     lambda out, cx, m: len(cx[0]),
+                     14),
+    'Permutation_compose': (_permutations,
+                            lambda PQ, m: _compose(PQ[0], PQ[1], 100),
+                            lambda out, PQ, m: 100*2**m,
+                            14),
+}
+
+def clear_caches():
+    qrm_circuits.clear_sub_encoder_cache()
+    encoder_stream.clear_stream_cache()
+    rm_generators.clear_cache()
+
+def measure(case, m, repeats = 3, min_time = 0.2, memory = True):
+    '''
+    {'time_s', 'peak_bytes', 'items', 'items_per_s', 'repeats'} of one case at m.
+    Repeats until repeats runs and min_time seconds are done, time_s is the best run.
+    '''
+    setup, run, items, _ = CASES[case]
+    argument = setup(m)
+    times = []
+    while len(times) < repeats or sum(times) < min_time:
+        clear_caches()
+        t = time.perf_counter()
+        out = run(argument, m)
+        times.append(time.perf_counter() - t)
+        if times[-1] > 10*min_time:
+            break
+    n_items = items(out, argument, m)
+    del out
+    peak = None
+    if memory:
+        clear_caches()
+        tracemalloc.start()
+        run(argument, m)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    best = min(times)
+    return {'time_s': best, 'peak_bytes': peak, 'items': n_items, 'items_per_s': n_items/best if best else None,
+            'repeats': len(times)}
+
+def machine_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count(),
+            'commit': commit, 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+def run_suite(cases = None, m_min = 4, m_max = 14, budget = 60.0, memory = True, verbose = True):
+    '''
+    {'machine', 'results': {case: {m: measurement}}}. A ladder stops after the first size whose run takes
+    longer than budget seconds (larger sizes are skipped).
+    '''
+    sys.setrecursionlimit(10000)
+    results = {}
+    for case in cases or CASES:
+        results[case] = {}
+        for m in range(m_min, min(m_max, CASES[case][3]) + 1):
+            res = measure(case, m, memory=memory)
+            results[case][str(m)] = res
+            if verbose:
+                print('{:>22} m = {:>2}: {:>9.4f} s {:>9} MB {:>12.0f} items/s'.format(
+                    case, m, res['time_s'], '-' if res['peak_bytes'] is None else '{:.1f}'.format(res['peak_bytes']/2**20),
+                    res['items_per_s'] or 0))
+            if res['time_s'] > budget:
+                break
+    return {'machine': machine_info(), 'results': results}
+
+def compare(old, new, threshold = 0.25, min_time = 0.01):
+    '''
+    [(case, m, old time, new time, ratio, regression)] of the sizes in both runs, a regression is a time
+    (or peak memory) ratio above 1 + threshold. Times below min_time in both runs are not flagged (noise).
+    '''
+    rows = []
+    for case, ladder in new['results'].items():
+        for m, res in ladder.items():
+            base = old['results'].get(case, {}).get(m)
+            if base is None:
+                continue
+            ratio = res['time_s']/base['time_s'] if base['time_s'] else float('inf')
+            slow = ratio > 1 + threshold and max(res['time_s'], base['time_s']) >= min_time
+            if base.get('peak_bytes') and res.get('peak_bytes'):
+                slow = slow or res['peak_bytes']/base['peak_bytes'] > 1 + threshold
+            rows.append((case, int(m), base['time_s'], res['time_s'], ratio, slow))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='QRM benchmark suite.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_parser = sub.add_parser('run')
+    run_parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES))
+    run_parser.add_argument('--m-min', type=int, default=4)
+    run_parser.add_argument('--m-max', type=int, default=14)
+    run_parser.add_argument('--budget', type=float, default=60.0, help='skip larger sizes after a run this long (s)')
+    run_parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run')
+    run_parser.add_argument('--out', default='benchmarks.json')
+    compare_parser = sub.add_parser('compare')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        result = run_suite(args.cases, args.m_min, args.m_max, args.budget, memory=not args.no_memory)
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=1)
+    else:
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare(old, new, args.threshold)
+        for case, m, t_old, t_new, ratio, slow in rows:
+            print('{:>22} m = {:>2}: {:>9.4f} -> {:>9.4f} s ({:.2f}x){}'.format(case, m, t_old, t_new, ratio,
+                                                                             '  REGRESSION' if slow else ''))
+        regressions = sum(row[5] for row in rows)
+        print('{} regressions of {} sizes (threshold {:.0%})'.format(regressions, len(rows), args.threshold))
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,306 @@
+#GF(2) verification of CNOT encoders without a statevector
+#a CNOT circuit maps X on qubit q to X on the qubits of row q of its linear map A. The rows for a set of inputs are
+#propagated together, bit-packed along the inputs as qrm_decoder ((n_qubits, words), bit j of word [q, w] is qubit q
+#of the image of input 64 w + j), so a CX(c, t) is the word XOR v[t] ^= v[c] and a layer of CXs is one numpy step.
+#an encoder of the CSS code with X stabilizers Gperp = RM(m-r2-1, m) and code G = RM(r1, m) (get_QRM_generator)
+#is correct iff the images of its stabilizer inputs lie in Gperp, the image of the input of logical row x is
+#Eval(x) mod Gperp (or, without row labels, lies in G) and the input counts are dim Gperp and dim G - dim Gperp:
+#A is invertible, so containment with the right counts gives equal spans. The Z side follows, as the Z images are
+#the rows of A^-T. Classical encoders are the case without stabilizer inputs (exact rows). An H gate on a fresh
+#qubit (RecursiveQRM) makes it a stabilizer input.
+#exact=True propagates every input separately, otherwise samples random combinations of the inputs: a wrong
+#image is missed with probability at most 2^-samples.
+#membership in RM(rho, m) is tested with the parities of qrm_decoder.monomial_parities, punctured codes (coordinate
+#0 dropped, get_QRM_punc_generator) are tested on the shortened Gperp and the punctured G. The asymmetric encoders
+#(QRM_rec_assym_circuit, QRM_rec_assym_punc_circuit at (r, m, r_in)) are the codes with r1 = r_in, r2 = m-r-1.
+
+import io
+import contextlib
+import numpy as np
+
+from qrm_gates import QRMcircuit, CX_GATE, qubit_map_array
+from qrm_utils import cnot_arrays
+from qrm_decoder import monomial_parities, unpack_shots
+from rm_generators import rm_monomials
+from rm_encoder import rm_encode_packed
+from qrm_circuits import get_qubit_partition
+from encoder_stream import BATCH_SIZE, stream_QRM_rec_classical_circuit, stream_QRM_rec_circuit, stream_RecursiveQRM, \
+    stream_QRM_rec_punc_circuit, stream_QRM_rec_assym_circuit, stream_QRM_rec_assym_punc_circuit, encoder_permutation, \
+    punc_positions, assym_punc_positions
+
+### propagation
+
+def as_circuit(circuit):
+    #QRMcircuit of a QRMcircuit, tequila circuit or (controls, targets) pair, one moment per gate unless known
+    if isinstance(circuit, QRMcircuit):
+        return circuit
+    controls, targets = cnot_arrays(circuit)
+    return QRMcircuit(np.full(len(controls), CX_GATE), controls, targets, moments=range(len(controls)))
+
+def gate_layers(circuit):
+    '''
+    (H targets, CX controls, CX targets) arrays of circuit by as soon as possible layer,
+    gates of a layer act on distinct qubits
+    '''
+    circuit = as_circuit(circuit)
+    layer = circuit.layers()
+    order = np.argsort(layer, kind='stable')
+    bounds = np.flatnonzero(np.diff(layer[order])) + 1
+    opcodes, controls, targets = [np.split(a[order], bounds) for a in [circuit.opcodes, circuit.controls, circuit.targets]]
+    for op, c, t in zip(opcodes, controls, targets):
+        is_cx = op == CX_GATE
+        yield t[~is_cx], c[is_cx], t[is_cx]
+
+def batches(circuit):
+    #circuit as a sequence of QRMcircuits: a circuit (QRMcircuit, tequila, (controls, targets)) or its batches
+    if isinstance(circuit, QRMcircuit) or isinstance(circuit, tuple) or hasattr(circuit, 'gates'):
+        return [as_circuit(circuit)]
+    return circuit
+
+def propagate(circuit, v, start = None):
+    '''
+    Images v (n_qubits, words) of the packed inputs under the CNOTs of circuit (or of a sequence of QRMcircuit
+    batches, as encoder_stream), in place.
+    H gates are skipped, or with start(qubits) -> rows they start their qubits as new X inputs v[qubits] = rows,
+    the qubits must not be inputs or have been used before.
+    '''
+    touched = v.any(axis=1) if start is not None else None
+    for batch in batches(circuit):
+        for h, controls, targets in gate_layers(batch):
+            if start is not None and len(h):
+                if touched[h].any():
+                    raise ValueError('H gates on used qubits {}, the circuit is not a CNOT map of its H qubits'.format(
+                        h[touched[h]][:8].tolist()))
+                v[h] = start(h)
+                touched[h] = True
+            v[targets] ^= v[controls]
+            if start is not None:
+                touched[controls] = True
+                touched[targets] = True
+    return v
+
+def linear_map(circuit, n_qubits, inputs = None):
+    '''
+    Dense GF(2) rows (len(inputs), n_qubits) of the images of X on the inputs (default all qubits), row i is the
+    row inputs[i] of the linear map of the CNOTs of circuit
+    '''
+    inputs = np.arange(n_qubits) if inputs is None else np.asarray(inputs, dtype=np.int64)
+    v = np.zeros((n_qubits, max(1, -(-len(inputs)//64))), dtype=np.uint64)
+    _unit_rows(v, inputs, 0)
+    return unpack_shots(propagate(circuit, v), len(inputs))
+
+def _unit_rows(v, qubits, first):
+    #v[qubits[i]] = bit first + i
+    j = first + np.arange(len(qubits))
+    v[qubits, j//64] = np.uint64(1) << (j % 64).astype(np.uint64)
+
+### code membership
+
+def rm_violations(y, rho, m, fill = None):
+    '''
+    Packed mask (words,) of the columns of y (2^m or 2^m - 1 coordinates, words) outside RM(rho, m).
+    Punctured words (2^m - 1 rows, coordinate 0 dropped) get coordinate 0 = fill: 0 (shortened code) or
+    'parity' (punctured code, rho < m).
+    '''
+    n = 1 << m
+    if rho >= m:
+        return np.zeros(y.shape[-1], dtype=np.uint64)
+    if len(y) == n - 1:
+        full = np.empty((n, y.shape[-1]), dtype=np.uint64)
+        full[1:] = y
+        full[0] = np.bitwise_xor.reduce(y, axis=0) if fill == 'parity' else 0
+        y = full
+    if rho < 0:
+        return np.bitwise_or.reduce(y, axis=0)
+    return np.bitwise_or.reduce(monomial_parities(y, rm_monomials(0, m-rho-1, m), m), axis=0)
+
+### verification
+
+def verify_linear_map(circuit, r1, r2, m, stabilizer_inputs, logical_inputs, logical_monomials = None,
+                      coordinates = None, punctured = False, samples = 128, exact = False, seed = None):
+    '''
+    Checks the CNOTs of circuit as an encoder of the CSS code (Gperp, G1q) = get_QRM_generator((r1, m), (r2, m))
+    (get_QRM_punc_generator with punctured = True), r2 = m for the classical code RM(r1, m) (no Gperp).
+    stabilizer_inputs: qubits of the rows of Gperp (None: the H qubits of circuit, taken when their H is reached),
+    logical_inputs: qubits of the rows of G1q, with logical_monomials[i] the monomial of logical_inputs[i]
+    (rows Eval(x) mod Gperp, None: only G is checked).
+    coordinates[j]: qubit of code coordinate j (default j, coordinates 1..2^m-1 on qubits 0.. when punctured).
+    circuit may be a sequence of QRMcircuit batches (encoder_stream), its qubits are then the coordinates.
+    Returns {'ok', 'stabilizers', 'logicals', 'dimensions', 'samples'}, with 'error' and everything False if an H
+    gate acts on a used qubit.
+    '''
+    n = (1 << m) - (1 if punctured else 0)
+    logical_inputs = np.asarray(logical_inputs, dtype=np.int64).reshape(-1)
+    coordinates = np.arange(n) if coordinates is None else qubit_map_array(coordinates)[:n]
+    rho = m - r2 - 1
+    #dimensions of Gperp and G1q (the punctured all ones row moves to G1q)
+    n_stabilizers = len(rm_monomials(0, rho, m)) - (1 if punctured and rho >= 0 else 0)
+    n_logicals = len(rm_monomials(0, r1, m)) - n_stabilizers
+    n_qubits = int(max(coordinates.max(initial=0), logical_inputs.max(initial=0))) + 1
+    if isinstance(circuit, QRMcircuit):
+        n_qubits = max(n_qubits, circuit.n_qubits)
+
+    rng = np.random.default_rng(seed)
+    if exact:
+        #one input per column, stabilizers first
+        samples = n_stabilizers + n_logicals
+        words = max(1, -(-samples//64))
+        rows = lambda qubits, first: _unit_rows(v, qubits, first)
+    else:
+        #first half of the words: stabilizer inputs only, second half: all inputs
+        words = 2*max(1, -(-samples//64))
+        def rows(qubits, first):
+            v[qubits] = rng.integers(0, 2**64, (len(qubits), words), dtype=np.uint64)
+    v = np.zeros((n_qubits, words), dtype=np.uint64)
+    if exact:
+        _unit_rows(v, logical_inputs, n_stabilizers)
+    else:
+        v[logical_inputs, words//2:] = rng.integers(0, 2**64, (len(logical_inputs), words//2), dtype=np.uint64)
+    a = v[logical_inputs].copy()
+
+    started = []
+    def start(qubits):
+        #H qubits as stabilizer inputs, in the order they are reached
+        first = sum(len(q) for q in started)
+        started.append(qubits)
+        if exact and first + len(qubits) > n_stabilizers:
+            return np.zeros((len(qubits), words), dtype=np.uint64)
+        rows(qubits, first)
+        return v[qubits]
+    if stabilizer_inputs is None:
+        try:
+            propagate(circuit, v, start)
+        except ValueError as e:
+            #an H on a used qubit: not a CNOT map of its H qubits, so no encoder of Gperp
+            return {'ok': False, 'stabilizers': False, 'logicals': False, 'dimensions': False, 'samples': samples,
+                    'error': str(e)}
+        stabilizer_inputs = np.concatenate(started) if started else np.zeros(0, dtype=np.int64)
+    else:
+        stabilizer_inputs = np.asarray(stabilizer_inputs, dtype=np.int64).reshape(-1)
+        if not exact or len(stabilizer_inputs) <= n_stabilizers:
+            rows(stabilizer_inputs, 0)
+        propagate(circuit, v)
+    inputs = np.concatenate([stabilizer_inputs, logical_inputs])
+    dimensions = (len(stabilizer_inputs) == n_stabilizers and len(logical_inputs) == n_logicals
+                  and len(np.unique(inputs)) == len(inputs) and len(np.unique(coordinates)) == n)
+
+    y = v[coordinates]
+    has_logical = np.bitwise_or.reduce(a, axis=0) if len(a) else np.zeros(words, dtype=np.uint64)
+    if logical_monomials is not None:
+        #remove Eval(x) of the logical inputs, the rest has to lie in Gperp
+        full = rm_encode_packed(a, r1, m, monomials=logical_monomials)
+        y ^= full[1:] if punctured else full
+        violations = rm_violations(y, rho, m, fill=0)
+        stabilizers, logicals = violations & ~has_logical, violations & has_logical
+    else:
+        stabilizers = rm_violations(y, rho, m, fill=0) & ~has_logical
+        logicals = rm_violations(y, r1, m, fill='parity') & has_logical
+    stabilizers, logicals = not stabilizers.any(), not logicals.any()
+    return {'ok': bool(stabilizers and logicals and dimensions), 'stabilizers': stabilizers, 'logicals': logicals,
+            'dimensions': dimensions, 'samples': samples}
+
+def partition_layout(m, partitions = [], qubit_list = None):
+    '''
+    Qubit of every code coordinate of the recursive encoders with partitions, coordinates of the first half of
+    the Plotkin split first (as get_qubit_partition)
+    '''
+    if qubit_list is None:
+        qubit_list = list(range(2**m))
+    if m == 0:
+        return list(qubit_list)
+    ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    return partition_layout(m-1, p1, ql_1) + partition_layout(m-1, p2, ql_2)
+
+def encoder_inputs(name, r, m, out, partitions = [], r_in = None, m_in = None, classical = False, state_prep = False,
+                   **flags):
+    '''
+    (stabilizer inputs, logical inputs, logical monomials, coordinates, r1, r2, punctured) of the output out of
+    the encoder called name at (r, m) (and r_in, m_in, classical, state_prep as passed to the encoder)
+    '''
+    if state_prep:
+        raise ValueError('state_prep circuits leave out the all ones logical, they are not encoders of the code')
+    stabilizers, logicals = rm_monomials(0, m-r-1, m), rm_monomials(m-r, r, m)
+    if name == 'QRM_rec_classical_circuit':
+        pos = out[1]
+        monomials = rm_monomials(0, r, m)
+        return [], [pos[x] for x in monomials.tolist()], monomials, None, r, m, False
+    if name == 'QRM_rec_circuit':
+        pos = out[1]
+        return ([pos[x] for x in stabilizers.tolist()], [pos[x] for x in logicals.tolist()], logicals, None,
+                r, r, False)
+    if name in ['QRM_std_circuit', 'QRM_punc_std_circuit']:
+        msg, ent = out[1]
+        return ent, msg, None, None, r, r, name == 'QRM_punc_std_circuit'
+    if name == 'RecursiveQRM':
+        P, M = qubit_map_array(out[1]), out[2]
+        return None, [P[M[x]] for x in logicals.tolist()], logicals, partition_layout(m, partitions), r, r, False
+    if name == 'QRM_rec_assym_circuit':
+        #X stabilizers RM(r, m) inside RM(r_in, m), r2 = m-r-1
+        pos = out[1]
+        stabilizers, logicals = rm_monomials(0, r, m), rm_monomials(r+1, r_in, m)
+        return ([pos[x] for x in stabilizers.tolist()], [pos[x] for x in logicals.tolist()], logicals, None,
+                r_in, m-r-1, False)
+    #punctured codes: the shortened Gperp are the stabilizers, the punctured all ones row is a logical
+    if name == 'QRM_rec_punc_circuit' and classical:
+        pos, logicals = out[1], rm_monomials(0, r, m)
+        return [], [pos[x] for x in logicals.tolist()], logicals, None, r, m, True
+    if name == 'QRM_rec_punc_circuit':
+        pos = out[1]
+        stabilizers, logicals = stabilizers[1:], np.concatenate([[0], logicals]).astype(np.int64)
+        return [pos[x] for x in stabilizers.tolist()], [pos[x] for x in logicals.tolist()], logicals, None, r, r, True
+    if name == 'QRM_rec_assym_punc_circuit':
+        pos = out[1]
+        stabilizers, logicals = rm_monomials(1, r, m), np.concatenate([[0], rm_monomials(r+1, r_in, m)]).astype(np.int64)
+        return ([pos[x] for x in stabilizers.tolist()], [pos[x] for x in logicals.tolist()], logicals, None,
+                r_in, m-r-1, True)
+    raise ValueError('Unknown encoder {}'.format(name))
+
+def verify_encoder(encoder, r, m, samples = 128, exact = False, seed = None, **encoder_kwargs):
+    '''
+    Builds encoder(r, m, **encoder_kwargs) (QRM_rec_classical_circuit, QRM_rec_circuit, QRM_rec_punc_circuit,
+    QRM_rec_assym_circuit and QRM_rec_assym_punc_circuit with r_in and m_in, QRM_std_circuit,
+    QRM_punc_std_circuit or RecursiveQRM) and checks it with verify_linear_map, up to its position dict,
+    qubit lists or Permutation. Hadamards start their qubits as stabilizer inputs.
+    '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = encoder(r, m, circ_type='native', **encoder_kwargs)
+    if out[1] is None:
+        raise ValueError('{} is not defined at r, m = {}, {}'.format(encoder.__name__, r, m))
+    stabilizer_inputs, logical_inputs, monomials, coordinates, r1, r2, punctured = encoder_inputs(
+        encoder.__name__, r, m, out, **encoder_kwargs)
+    return verify_linear_map(out[0], r1, r2, m, stabilizer_inputs, logical_inputs, monomials, coordinates,
+                             punctured=punctured, samples=samples, exact=exact, seed=seed)
+
+def verify_stream(name, r, m, partitions = [], samples = 128, exact = False, seed = None, batch_size = BATCH_SIZE,
+                  r_in = None, m_in = None, classical = False):
+    '''
+    verify_encoder on the gates streamed by encoder_stream, without building the encoder, for name
+    'QRM_rec_classical_circuit', 'QRM_rec_circuit', 'QRM_rec_assym_circuit' (only_cnots, position dicts are the
+    identity), 'QRM_rec_punc_circuit', 'QRM_rec_assym_punc_circuit' (only_cnots, position arrays of encoder_stream)
+    or 'RecursiveQRM'
+    '''
+    m_in = m if m_in is None else m_in
+    if name == 'RecursiveQRM':
+        P, M = encoder_permutation('qrm', r, m, partitions)
+        out = (stream_RecursiveQRM(r, m, partitions=partitions, batch_size=batch_size), P, M)
+    elif name == 'QRM_rec_circuit':
+        out = (stream_QRM_rec_circuit(r, m, partitions, only_cnots=True, batch_size=batch_size), range(2**m))
+    elif name == 'QRM_rec_classical_circuit':
+        out = (stream_QRM_rec_classical_circuit(r, m, partitions, batch_size=batch_size), range(2**m))
+    elif name == 'QRM_rec_assym_circuit':
+        out = (stream_QRM_rec_assym_circuit(r, m, r_in, m_in, partitions, only_cnots=True, batch_size=batch_size),
+               range(2**m))
+    elif name == 'QRM_rec_punc_circuit':
+        out = (stream_QRM_rec_punc_circuit(r, m, partitions, only_cnots=True, classical=classical, batch_size=batch_size),
+               punc_positions(r, m, classical=classical))
+    elif name == 'QRM_rec_assym_punc_circuit':
+        out = (stream_QRM_rec_assym_punc_circuit(r, m, r_in, m_in, partitions, only_cnots=True, batch_size=batch_size),
+               assym_punc_positions(r, m, r_in, m_in))
+    else:
+        raise ValueError('No stream for encoder {}'.format(name))
+    if out[1] is None:
+        raise ValueError('{} is not defined at r, m = {}, {}'.format(name, r, m))
+    stabilizer_inputs, logical_inputs, monomials, coordinates, r1, r2, punctured = encoder_inputs(
+        name, r, m, out, partitions, r_in=r_in, m_in=m_in, classical=classical)
+    return verify_linear_map(out[0], r1, r2, m, stabilizer_inputs, logical_inputs, monomials, coordinates,
+                             punctured=punctured, samples=samples, exact=exact, seed=seed)
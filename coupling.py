@@ -0,0 +1,303 @@
+#hardware coupling maps and a greedy SWAP router for the encoders
+#a layout maps the encoder (logical) qubit q to the physical qubit layout[q]. The router walks the flat gate list,
+#moving the two qubits of a CX together along shortest paths by SWAPs until they are coupled, and schedules every
+#gate as soon as possible on the physical qubits (a SWAP counts as swap_depth CX layers).
+
+import io
+import os
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from qrm_gates import QRMcircuit, H_GATE, CX_GATE, qubit_map_array
+from permutations import Permutation
+
+class CouplingMap:
+    '''
+    Undirected coupling graph on physical qubits 0..n-1, with all pairs distances computed on first use
+    '''
+    def __init__(self, edges, n = None, name = ''):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        self.n = int(edges.max()) + 1 if n is None else n
+        self.edges = edges
+        self.name = name
+        self.neighbors = [[] for _ in range(self.n)]
+        for a, b in edges.tolist():
+            self.neighbors[a].append(b)
+            self.neighbors[b].append(a)
+        self._distances = None
+        self._distance_rows = None
+
+    @classmethod
+    def grid(cls, rows, cols):
+        #rows x cols square lattice, qubit (i, j) is i*cols + j
+        idx = np.arange(rows*cols).reshape(rows, cols)
+        edges = np.concatenate([np.stack([idx[:, :-1].ravel(), idx[:, 1:].ravel()], axis=1),
+                                np.stack([idx[:-1, :].ravel(), idx[1:, :].ravel()], axis=1)])
+        return cls(edges, rows*cols, name='grid {}x{}'.format(rows, cols))
+
+    @classmethod
+    def heavy_hex(cls, rows, cols):
+        '''
+        Heavy hexagon lattice: rows lines of cols qubits, consecutive lines joined by bridge qubits at every
+        4th column (columns 0, 4, .. below even lines and 2, 6, .. below odd lines), degree at most 3.
+        Every pair of lines needs two bridges to close a hexagon, cols >= 5 for 2 lines and cols >= 7 otherwise
+        (the IBM lattices have cols = 4k + 3, with k + 1 bridges below every line).
+        '''
+        if rows > 1 and cols < (5 if rows == 2 else 7):
+            raise ValueError('Heavy hex {}x{} has one bridge between lines, not a lattice: need cols >= {}'.format(
+                rows, cols, 5 if rows == 2 else 7))
+        edges = []
+        n = rows*cols
+        for i in range(rows):
+            edges += [(i*cols + j, i*cols + j + 1) for j in range(cols - 1)]
+        for i in range(rows - 1):
+            for j in range(2*(i % 2), cols, 4):
+                edges += [(i*cols + j, n), (n, (i+1)*cols + j)]
+                n += 1
+        return cls(edges, n, name='heavy hex {}x{}'.format(rows, cols))
+
+    @classmethod
+    def from_file(cls, path):
+        '''
+        Edge list file, one 'a b' (or 'a,b') pair of physical qubits per line, '#' comments
+        '''
+        edges = []
+        with open(path) as f:
+            for line in f:
+                line = line.split('#')[0].replace(',', ' ').split()
+                if line:
+                    edges.append((int(line[0]), int(line[1])))
+        return cls(edges, name=os.path.basename(path))
+
+    @property
+    def distances(self):
+        '''
+        (n, n) int32 matrix of shortest path lengths, by a breadth first search from all sources at once
+        '''
+        if self._distances is None:
+            n = self.n
+            a, b = np.concatenate([self.edges[:, 0], self.edges[:, 1]]), np.concatenate([self.edges[:, 1], self.edges[:, 0]])
+            order = np.argsort(a, kind='stable')
+            starts = np.searchsorted(a[order], np.arange(n + 1))
+            adjacent = b[order]
+            degree = np.diff(starts)
+            D = np.full((n, n), -1, dtype=np.int32)
+            sources = np.arange(n)
+            D[sources, sources] = 0
+            frontier = (sources, sources) #(source, vertex) pairs at the current distance
+            level = 0
+            while len(frontier[0]):
+                level += 1
+                s, v = frontier
+                k = degree[v]
+                s = np.repeat(s, k)
+                w = adjacent[np.repeat(starts[v], k) + np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)]
+                new = D[s, w] < 0
+                s, w = s[new], w[new]
+                D[s, w] = level
+                keep = np.unique(s*n + w)
+                frontier = (keep//n, keep % n)
+            if (D < 0).any():
+                raise ValueError('The coupling graph {} is not connected.'.format(self.name))
+            self._distances = D
+        return self._distances
+
+    def distance_rows(self):
+        #distances as nested lists, for the router loop
+        if self._distance_rows is None:
+            self._distance_rows = self.distances.tolist()
+        return self._distance_rows
+
+    def __repr__(self):
+        return 'CouplingMap({}, {} qubits, {} edges)'.format(self.name, self.n, len(self.edges))
+
+def smallest(kind, n_qubits):
+    '''
+    Smallest near square 'grid' or 'heavy_hex' coupling map with at least n_qubits qubits
+    (heavy hex lines of cols = 4k + 3 qubits, rows <= cols)
+    '''
+    if kind == 'grid':
+        rows = int(np.ceil(np.sqrt(n_qubits)))
+        return CouplingMap.grid(rows, -(-n_qubits//rows))
+    if kind == 'heavy_hex':
+        cols = 7
+        while True:
+            for rows in range(1, cols + 1):
+                c = CouplingMap.heavy_hex(rows, cols)
+                if c.n >= n_qubits:
+                    return c
+            cols += 4
+    raise ValueError('Unknown coupling map kind {}'.format(kind))
+
+### layouts
+
+def layout_from_positions(positions, n_qubits = None, sites = None):
+    '''
+    Layout placing the qubit holding code position j (positions: dict, Permutation or array, j -> qubit, as the
+    position dicts and Permutations returned by the encoders) on physical qubit sites[j] (default j).
+    Qubits not holding a code position take the remaining sites in order.
+    '''
+    pos = qubit_map_array(positions)
+    n = max(len(pos), int(pos.max(initial=-1)) + 1) if n_qubits is None else n_qubits
+    sites = np.arange(max(n, len(pos))) if sites is None else np.asarray(sites)
+    layout = np.full(n, -1, dtype=np.int64)
+    held = pos >= 0
+    layout[pos[held]] = sites[np.flatnonzero(held)]
+    free = np.setdiff1d(sites, layout[layout >= 0], assume_unique=False)
+    layout[layout < 0] = free[:(layout < 0).sum()]
+    return layout
+
+def bit_permutation_layout(bits, m, sites = None):
+    #qubit q on site number q' where bit i of q is bit bits[i] of q' (relabels the Plotkin recursion axes)
+    q = np.arange(2**m)
+    qp = np.zeros(2**m, dtype=np.int64)
+    for i, b in enumerate(bits):
+        qp |= ((q >> i) & 1) << b
+    return qp if sites is None else np.asarray(sites)[qp]
+
+def candidate_layouts(n_qubits, m = None, n_random = 8, seed = 0, sites = None):
+    '''
+    {name: layout}: identity, every or n_random random permutations of the m index bits (for 2^m qubits)
+    and n_random random layouts, on the physical sites (default 0..)
+    '''
+    rng = np.random.default_rng(seed)
+    sites = np.arange(n_qubits) if sites is None else np.asarray(sites)
+    layouts = {'identity': sites[:n_qubits].copy()}
+    if m is not None and 2**m == n_qubits and m > 1:
+        perms = [tuple(rng.permutation(m).tolist()) for _ in range(n_random)]
+        for bits in dict.fromkeys(perms):
+            layouts['bits {}'.format(list(bits))] = bit_permutation_layout(bits, m, sites)
+    for k in range(n_random):
+        layouts['random {}'.format(k)] = sites[rng.permutation(n_qubits)]
+    return layouts
+
+### routing
+
+def route(circuit, coupling, layout = None, swap_depth = 3, routed = False):
+    '''
+    Greedy routing of the QRMcircuit on the CouplingMap from the layout (array or dict, qubit -> physical qubit,
+    default identity). Each CX moves one of its qubits (the one that can start the SWAP earliest) one step along a
+    shortest path until the pair is coupled.
+    Returns {'swaps', 'depth' (routed, SWAP = swap_depth layers), 'cx' (routed CX count, SWAP = 3 CX), 'layout'
+    (final layout)}, with routed = True also 'circuit', the routed QRMcircuit on the physical qubits
+    (SWAP as 3 CX, one gate per moment)
+    '''
+    n_logical = circuit.n_qubits
+    layout = np.arange(n_logical) if layout is None else qubit_map_array(layout)
+    if len(layout) < n_logical or (layout[:n_logical] < 0).any():
+        raise ValueError('The layout does not place all {} qubits.'.format(n_logical))
+    if len(layout) and int(layout.max()) >= coupling.n:
+        raise ValueError('The layout uses qubits outside the coupling map.')
+    D = coupling.distance_rows()
+    neighbors = coupling.neighbors
+    phys = layout.tolist()
+    occupant = [-1]*coupling.n
+    for q, p in enumerate(phys):
+        occupant[p] = q
+    time = [0]*coupling.n
+    swaps = 0
+    n_cx = 0
+    gates = [] if routed else None
+    for op, c, t in zip(circuit.opcodes.tolist(), circuit.controls.tolist(), circuit.targets.tolist()):
+        if op == H_GATE:
+            time[phys[t]] += 1
+            if routed:
+                gates.append((H_GATE, -1, phys[t]))
+            continue
+        a, b = phys[c], phys[t]
+        while D[a][b] > 1:
+            d = D[a][b] - 1
+            best = None
+            for x, y in [(a, b), (b, a)]:
+                row = D[y]
+                for z in neighbors[x]:
+                    if row[z] == d:
+                        start = max(time[x], time[z])
+                        if best is None or start < best[0]:
+                            best = (start, x, z)
+            start, x, z = best
+            qx, qz = occupant[x], occupant[z]
+            occupant[x], occupant[z] = qz, qx
+            if qx >= 0:
+                phys[qx] = z
+            if qz >= 0:
+                phys[qz] = x
+            time[x] = time[z] = start + swap_depth
+            swaps += 1
+            if routed:
+                gates += [(CX_GATE, x, z), (CX_GATE, z, x), (CX_GATE, x, z)]
+            a, b = phys[c], phys[t]
+        start = max(time[a], time[b]) + 1
+        time[a] = time[b] = start
+        n_cx += 1
+        if routed:
+            gates.append((CX_GATE, a, b))
+    result = {'swaps': swaps, 'depth': max(time, default=0), 'cx': n_cx + 3*swaps, 'layout': np.array(phys)}
+    if routed:
+        op, ctrl, tgt = np.array(gates, dtype=np.int64).reshape(-1, 3).T
+        result['circuit'] = QRMcircuit(op, ctrl, tgt, list(range(len(gates))))
+    return result
+
+### parallel layout search
+
+_WORKER = {}
+
+def _init_worker(arrays, moments, coupling, swap_depth):
+    _WORKER['circuit'] = QRMcircuit(*arrays, moments, copy=False)
+    _WORKER['coupling'] = coupling
+    _WORKER['swap_depth'] = swap_depth
+
+def _route_job(item):
+    name, layout = item
+    res = route(_WORKER['circuit'], _WORKER['coupling'], layout, _WORKER['swap_depth'])
+    res.pop('layout')
+    return name, res
+
+def search_layouts(circuit, coupling, layouts, key = 'swaps', processes = 1, swap_depth = 3):
+    '''
+    Routes the circuit from every layout of {name: layout} (in a process pool with processes > 1) and returns
+    [(name, result)] sorted by result[key] ('swaps', 'depth' or 'cx'), then by the other two
+    '''
+    args = ((circuit.opcodes, circuit.controls, circuit.targets), circuit.moments.tolist(), coupling, swap_depth)
+    coupling.distance_rows()
+    items = list(layouts.items())
+    if processes == 1:
+        _init_worker(*args)
+        results = [_route_job(item) for item in items]
+    else:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=args) as pool:
+            results = list(pool.map(_route_job, items, chunksize=max(1, len(items)//(4*(processes or os.cpu_count() or 1)))))
+    order = [key] + [k for k in ['swaps', 'depth', 'cx'] if k != key]
+    return sorted(results, key=lambda item: tuple(item[1][k] for k in order))
+
+def routed_cost(encoder, r, m, coupling, layouts = None, key = 'swaps', processes = 1, swap_depth = 3, **encoder_kwargs):
+    '''
+    Best routed cost of encoder(r, m, circ_type='native', **encoder_kwargs) on the coupling map over the layouts
+    (default: the position dict / Permutation layout of the encoder and candidate_layouts).
+    Returns (best layout name, result, all [(name, result)])
+    '''
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = encoder(r, m, circ_type='native', **encoder_kwargs)
+    U = out[0] if isinstance(out, tuple) else out
+    n = max(U.n_qubits, 2**m - 1)
+    if layouts is None:
+        layouts = candidate_layouts(n, m if n == 2**m else None)
+        positions = out[1] if isinstance(out, tuple) and len(out) > 1 else None
+        if isinstance(positions, (dict, Permutation)):
+            layouts['positions'] = layout_from_positions(positions, n)
+    ranked = search_layouts(U, coupling, layouts, key=key, processes=processes, swap_depth=swap_depth)
+    return ranked[0][0], ranked[0][1], ranked
+
+class RoutedCost:
+    '''
+    Cost function routed(circuit, n_qubits) = route(circuit, coupling, layout)[key], e.g. for
+    partition_search.optimize_partitions(..., cost=RoutedCost(CouplingMap.grid(8, 8)))
+    '''
+    def __init__(self, coupling, key = 'swaps', layout = None, swap_depth = 3):
+        self.coupling, self.key, self.layout, self.swap_depth = coupling, key, layout, swap_depth
+
+    def __call__(self, circuit, n_qubits):
+        return route(circuit, self.coupling, self.layout, self.swap_depth)[self.key]
@@ -0,0 +1,291 @@
+#analytic design space of the QRM codes, rate, CNOT count, qubit count and predicted depth over the grid of
+#(r1, r2, m1, m2) without building circuits. Three families:
+#   'tpc': tensor product code of the (r1, m1) and (r2, m2) codes (qrm_tpc), 2^{m1+m2} qubits, catalytic or EA rate.
+#          The cost is the recursive (Plotkin) encoder of ker(H1 x H2) = RM(r1, m1) x F^{n2} + F^{n1} x RM(r2, m2),
+#          the CNOT part of the TPC encoder: the butterfly of rm_encoder restricted to the support of the inputs,
+#          monomials (x1, x2) with |x1| <= r1 or |x2| <= r2. Splitting a variable of either factor costs one CX per
+#          supported coordinate of the lower half and leaves two halves of the same form, so the best split order
+#          is a dynamic program over the (a, b) variables left,
+#          C(a, b) = min(|T(a-1, b)| + 2 C(a-1, b), |T(a, b-1)| + 2 C(a, b-1)).
+#          Depth is one CX layer per variable, m1 + m2.
+#   'assym': CSS code get_QRM_generator((r1, m), (r2, m)) (m1 = m2 = m), X stabilizers RM(m-r2-1, m) inside RM(r1, m),
+#          encoded by QRM_rec_assym_circuit(m-r2-1, m, r1, m) (qrm_counts.rec_CX_count_assym), depth m + 1.
+#          Only the regime 2 r1 + 1 <= m is explored, where that encoder is exact.
+#   'assym_punc': the punctured 'assym' code, punctured RM(r1, m) over the shortened RM(r, m), r = m-r2-1, on
+#          2^m - 1 qubits, encoded by QRM_rec_assym_punc_circuit(r, m, r1, m) (qrm_counts.rec_CX_count_assym_punc),
+#          depth T(r1+2) + m - r1 - 3, T(n) = n(n+1)/2. Only the regime 2 r1 + 2 <= m, 1 <= r <= r1 and
+#          m - r <= 2 r1 + 1 is explored, where that encoder builds and matches the count (at r = 0 or below
+#          m - r = 2 r1 + 1 the classical base QRM_rec_punc_circuit(r1, m-r) is out of its range).
+#infeasible regions are never built: r < m per factor (by default the regime of qrm_tpc.positive_rate_points),
+#m1 = m2 for 'assym' and 'assym_punc', one of the mirrored (r1, m1), (r2, m2) TPC points, and costs are only
+#evaluated where the rate is positive. Counts come from tables over the shared cumulative binomials of qrm_tpc.cumulative_table,
+#float64 by default (exact = True for python ints).
+#the grid is split by m1 over a process pool, every worker returns its Pareto front (rate up, cost down) or all points.
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+
+from qrm_tpc import cumulative_table, catalytic_rate_assym, EA_rate
+
+COLUMNS = ['r1', 'r2', 'm1', 'm2', 'rate', 'cx', 'qubits', 'depth', 'cost']
+
+RATES = {'catalytic': catalytic_rate_assym, 'EA': EA_rate}
+
+def cx_cost(points):
+    return points['cx']
+
+def cx_per_qubit_cost(points):
+    return points['cx']/points['qubits']
+
+def depth_cost(points):
+    return points['depth']
+
+def qubits_cost(points):
+    return points['qubits']
+
+COSTS = {'cx': cx_cost, 'cx_per_qubit': cx_per_qubit_cost, 'depth': depth_cost, 'qubits': qubits_cost}
+
+### count tables
+
+def pow2(e, exact = False):
+    #2^e at an array of exponents, float64 or python ints
+    e = np.asarray(e, dtype=np.int64)
+    if not exact:
+        return np.exp2(e)
+    return np.array([2**int(x) for x in e.ravel()], dtype=object).reshape(e.shape)
+
+def partial_sums(m_max, exact = False):
+    '''
+    A[m, j] = sum_{i < j} comb(m, i) for 0 <= m <= m_max, 0 <= j <= m_max + 1 (j > m + 1 holds 2^m),
+    float64 or python ints, from qrm_tpc.cumulative_table
+    '''
+    T = cumulative_table(m_max, exact)[:m_max + 1, :m_max + 2]
+    if exact:
+        return T
+    return T*np.exp2(np.arange(m_max + 1))[:, None]
+
+def tpc_cx_rows(m_max, exact = False):
+    '''
+    Yields (a, C) for a = 0..m_max, C[b, r1, r2] the CNOTs of the Plotkin encoder of the monomials (x1, x2) of
+    a + b variables with |x1| <= r1 or |x2| <= r2 (0 <= b, r1, r2 <= m_max), best split order
+    '''
+    A = partial_sums(m_max, exact)[:, 1:] #A[m, r] = sum_{i <= r} comb(m, i)
+    dtype = object if exact else np.float64
+    one = 1 if exact else 1.0
+    def size(a, b):
+        #|T(a, b)| for every (r1, r2)
+        Aa, Ab = A[a][:, None], A[b][None, :]
+        return Aa*(one*2**b) + (one*2**a)*Ab - Aa*Ab
+    prev = None
+    for a in range(m_max + 1):
+        row = np.zeros((m_max + 1, m_max + 1, m_max + 1), dtype=dtype)
+        for b in range(m_max + 1):
+            if a and b:
+                row[b] = np.minimum(size(a-1, b) + 2*prev[b], size(a, b-1) + 2*row[b-1])
+            elif a:
+                row[b] = size(a-1, b) + 2*prev[b]
+            elif b:
+                row[b] = size(a, b-1) + 2*row[b-1]
+        prev = row
+        yield a, row
+
+def urm_table(m_max, exact = False):
+    #U[r, m] = Urm_CX_count(r, m) for r <= m <= m_max: U[r, r] = r 2^{r-1}, U[r, m] = A(m-1, r+1) + 2 U[r, m-1]
+    A = partial_sums(m_max, exact)
+    one = 1 if exact else 1.0
+    U = np.zeros((m_max + 1, m_max + 1), dtype=object if exact else np.float64)
+    for k in range(1, m_max + 1):
+        U[:k, k] = A[k-1, 1:k + 1] + 2*U[:k, k-1]
+        U[k, k] = one*k*2**(k-1)
+    return U
+
+def punc_urm_table(m_max, exact = False):
+    #P[r, m] = punc_Urm_CX_count(r, m) for r < m <= m_max: P[0, m] = 2^m - 2,
+    #P[r, r+1] = 2^r + P[r-1, r] + U[r, r], P[r, m] = A(m-1, r+1) + P[r, m-1] + U[r, m-1]
+    A, U = partial_sums(m_max, exact), urm_table(m_max, exact)
+    P = np.zeros((m_max + 1, m_max + 1), dtype=object if exact else np.float64)
+    for k in range(1, m_max + 1):
+        P[0, k] = pow2(k, exact) - 2
+        if k > 1:
+            P[k-1, k] = pow2(k-1, exact) + P[k-2, k-1] + U[k-1, k-1]
+            P[1:k-1, k] = A[k-1, 2:k] + P[1:k-1, k-1] + U[1:k-1, k-1]
+    return P
+
+def assym_cx(r, m, r_in, exact = False):
+    '''
+    qrm_counts.rec_CX_count_assym(r, m, r_in, m) at broadcast arrays, 2 r_in + 1 <= m, -1 <= r <= r_in,
+    unrolled to sum_{j <= r} 2^j binom_sum(m-1-j, r-j, r_in) + 2^{r+1} Urm_CX_count(r_in, m-r-1)
+    '''
+    r, m, r_in = np.broadcast_arrays(*[np.asarray(a, dtype=np.int64) for a in [r, m, r_in]])
+    m_max = int(m.max(initial=0))
+    A = partial_sums(m_max, exact)
+    one = 1 if exact else 1.0
+    cx = urm_table(m_max, exact)[r_in, m - r - 1]*pow2(r + 1, exact)
+    for j in range(int(r.max(initial=-1)) + 1):
+        on = j <= r
+        mj = np.where(on, m - 1 - j, 0)
+        term = A[mj, r_in + 1] - A[mj, np.clip(r - j, 0, None)]
+        cx = cx + np.where(on, term*(one*2**j), 0)
+    return cx
+
+def assym_punc_cx(r, m, r_in, exact = False):
+    '''
+    qrm_counts.rec_CX_count_assym_punc(r, m, r_in, m) at broadcast arrays, 2 r_in + 1 < m, 0 <= r <= r_in,
+    unrolled to sum_{j < r} (binom_sum(m-1-j, r-j, r_in) + rec_CX_count_assym(r-j-1, m-j-1, r_in, m))
+    + punc_Urm_CX_count(r_in, m-r)
+    '''
+    r, m, r_in = np.broadcast_arrays(*[np.asarray(a, dtype=np.int64) for a in [r, m, r_in]])
+    A = partial_sums(int(m.max(initial=0)), exact)
+    cx = punc_urm_table(int(m.max(initial=0)), exact)[r_in, m - r]
+    for j in range(int(r.max(initial=0))):
+        on = j < r
+        mj = np.where(on, m - 1 - j, r_in + 2)
+        term = A[mj, r_in + 1] - A[mj, np.clip(r - j, 0, None)] + assym_cx(np.where(on, r - j - 1, -1), mj, r_in, exact)
+        cx = cx + np.where(on, term, 0)
+    return cx
+
+### grid blocks
+
+def _columns(r1, r2, m1, m2, rate, cx, qubits, depth):
+    return {'r1': r1, 'r2': r2, 'm1': m1, 'm2': m2, 'rate': np.asarray(rate, dtype=np.float64), 'cx': cx,
+            'qubits': qubits, 'depth': depth}
+
+def factor_orders(m, r_max, scan_regime):
+    #number of orders r = 0, 1, .. of a TPC factor of m variables: r < m, r <= r_max and with scan_regime
+    #r <= (m-1)/2, m-r-1 >= m/2 (qrm_tpc.positive_rate_points)
+    return max(0, min(m, r_max + 1, m//2 if scan_regime else m))
+
+def _second_factors(m_min, m_max, r_max, scan_regime):
+    ms = range(max(m_min, 1), m_max + 1)
+    m2 = np.concatenate([np.full(factor_orders(m, r_max, scan_regime), m) for m in ms]).astype(np.int64)
+    r2 = np.concatenate([np.arange(factor_orders(m, r_max, scan_regime)) for m in ms]).astype(np.int64)
+    return r2, m2
+
+def _tpc_block(ms, m_min, m_max, r_max, rate, exact, symmetric, scan_regime):
+    r2_all, m2_all = _second_factors(m_min, m_max, r_max, scan_regime)
+    blocks, candidates = [], 0
+    for a, C in tpc_cx_rows(m_max, exact):
+        if a > max(ms):
+            break
+        if a not in ms:
+            continue
+        r1 = np.arange(factor_orders(a, r_max, scan_regime), dtype=np.int64)
+        r1, r2, m2 = np.repeat(r1, len(r2_all)), np.tile(r2_all, len(r1)), np.tile(m2_all, len(r1))
+        if symmetric:
+            keep = (m2 > a) | ((m2 == a) & (r2 >= r1))
+            r1, r2, m2 = r1[keep], r2[keep], m2[keep]
+        m1 = np.full(len(r1), a, dtype=np.int64)
+        candidates += len(r1)
+        rates = np.asarray(RATES[rate](r1, r2, m1, m2, exact=exact), dtype=np.float64).reshape(-1)
+        pos = rates > 0
+        r1, r2, m1, m2 = r1[pos], r2[pos], m1[pos], m2[pos]
+        blocks.append(_columns(r1, r2, m1, m2, rates[pos], C[m2, r1, r2], pow2(m1 + m2, exact), m1 + m2))
+    return blocks, candidates
+
+def _assym_block(ms, r_max, exact):
+    blocks, candidates = [], 0
+    F = partial_sums(max(ms), exact)
+    for m in ms:
+        #2 r1 + 1 <= m and at least one logical qubit, m - r1 <= r2 <= m - 1
+        pairs = [(r1, r2) for r1 in range(min((m - 1)//2, r_max) + 1) for r2 in range(m - r1, min(m - 1, r_max) + 1)]
+        r1, r2 = np.array(pairs, dtype=np.int64).reshape(-1, 2).T
+        mm = np.full(len(r1), m, dtype=np.int64)
+        candidates += len(r1)
+        k = F[mm, r1 + 1] - F[mm, m - r2]
+        rates = np.array([x/2**m for x in k], dtype=np.float64) if exact else k/np.exp2(m)
+        blocks.append(_columns(r1, r2, mm, mm, rates, assym_cx(m - r2 - 1, mm, r1, exact), pow2(mm, exact), mm + 1))
+    return blocks, candidates
+
+def _assym_punc_block(ms, r_max, exact):
+    blocks, candidates = [], 0
+    F = partial_sums(max(ms), exact)
+    for m in ms:
+        #2 r1 + 2 <= m, r = m - r2 - 1 in 1..r1 and m - r <= 2 r1 + 1 (m - r1 - 1 <= r2 <= min(m - 2, 2 r1))
+        pairs = [(r1, r2) for r1 in range(min((m - 2)//2, r_max) + 1) for r2 in range(m - r1 - 1, min(m - 2, 2*r1, r_max) + 1)]
+        r1, r2 = np.array(pairs, dtype=np.int64).reshape(-1, 2).T
+        mm = np.full(len(r1), m, dtype=np.int64)
+        candidates += len(r1)
+        #punctured RM(r1, m) over shortened RM(m - r2 - 1, m), the all ones word becomes logical
+        k = F[mm, r1 + 1] - F[mm, m - r2] + 1
+        n = 2**m - 1
+        rates = np.array([x/n for x in k], dtype=np.float64) if exact else k/(np.exp2(m) - 1)
+        depth = (r1 + 2)*(r1 + 3)//2 + m - r1 - 3
+        blocks.append(_columns(r1, r2, mm, mm, rates, assym_punc_cx(m - r2 - 1, mm, r1, exact),
+                               pow2(mm, exact) - 1, depth))
+    return blocks, candidates
+
+def concat(blocks):
+    #one set of columns from a list of column blocks
+    if not blocks:
+        return {c: np.zeros(0) for c in COLUMNS}
+    return {c: np.concatenate([b[c] for b in blocks]) for c in blocks[0]}
+
+def take(points, index):
+    return {c: v[index] for c, v in points.items()}
+
+def pareto_front(rate, cost):
+    '''
+    Indices of the points not dominated in (rate up, cost down), by increasing cost, ties keep the first point
+    '''
+    rate, cost = np.asarray(rate, dtype=np.float64), np.asarray(cost, dtype=np.float64)
+    order = np.lexsort((-rate, cost))
+    best = np.maximum.accumulate(rate[order])
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = best[1:] > best[:-1]
+    return order[keep]
+
+def evaluate(job):
+    '''
+    (points or front, candidates, feasible) of the block job = (family, ms, m_min, m_max, r_max, rate, cost,
+    exact, symmetric, scan_regime, front_only), ms the m1 of the block
+    '''
+    family, ms, m_min, m_max, r_max, rate, cost, exact, symmetric, scan_regime, front_only = job
+    if family == 'tpc':
+        blocks, candidates = _tpc_block(ms, m_min, m_max, r_max, rate, exact, symmetric, scan_regime)
+    elif family == 'assym':
+        blocks, candidates = _assym_block(ms, r_max, exact)
+    else:
+        blocks, candidates = _assym_punc_block(ms, r_max, exact)
+    points = concat(blocks)
+    points['cost'] = np.asarray(COSTS.get(cost, cost)(points), dtype=np.float64)
+    feasible = len(points['rate'])
+    if front_only:
+        points = take(points, pareto_front(points['rate'], points['cost']))
+    return points, candidates, feasible
+
+def explore(family = 'tpc', m_max = 20, m_min = 1, r_max = None, rate = 'catalytic', cost = 'cx', processes = 1,
+            exact = False, symmetric = True, scan_regime = True, front_only = True):
+    '''
+    Rate, CNOT count, qubits and depth of every feasible (r1, r2, m1, m2) with m_min <= m1, m2 <= m_max and
+    r1, r2 <= r_max, for family 'tpc' (rate 'catalytic' or 'EA'), 'assym' or 'assym_punc' (m1 = m2), and their Pareto front
+    of rate against cost ('cx', 'cx_per_qubit', 'depth', 'qubits' or a picklable cost(points) -> array).
+    symmetric drops the mirrored TPC point (r2, r1, m2, m1), scan_regime keeps the TPC factors of
+    qrm_tpc.positive_rate_points (r <= (m-1)/2, m-r-1 >= m/2, otherwise any r < m: r = m-1 factors have the all
+    ones row as only check and rate close to 1). The m1 are split over processes workers (None uses all cores).
+    Returns {'points': columns (None with front_only), 'front': columns by increasing cost,
+    'stats': {'candidates', 'feasible', 'front'}}, columns a dict of arrays keyed by COLUMNS.
+    '''
+    if family not in ['tpc', 'assym', 'assym_punc']:
+        raise ValueError('Unknown family {}, one of tpc, assym, assym_punc'.format(family))
+    if family == 'tpc' and rate not in RATES:
+        raise ValueError('Unknown rate {}, one of {}'.format(rate, list(RATES)))
+    if cost not in COSTS and not callable(cost):
+        raise ValueError('Unknown cost {}, one of {}'.format(cost, list(COSTS)))
+    m_min = max(m_min, 1)
+    r_max = m_max if r_max is None else r_max
+    ms = list(range(m_min, m_max + 1))
+    #one block of interleaved m1 per worker (small and large m1 alike), each walks the TPC table rows once
+    n_blocks = max(1, min(len(ms), (os.cpu_count() or 1) if processes is None else processes))
+    jobs = [(family, ms[i::n_blocks], m_min, m_max, r_max, rate, cost, exact, symmetric, scan_regime, front_only)
+            for i in range(n_blocks) if ms[i::n_blocks]]
+    if processes == 1:
+        results = list(map(evaluate, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            results = list(pool.map(evaluate, jobs))
+    points = concat([p for p, c, f in results])
+    front = take(points, pareto_front(points['rate'], points['cost']))
+    stats = {'candidates': sum(c for p, c, f in results), 'feasible': sum(f for p, c, f in results),
+             'front': len(front['rate'])}
+    return {'points': None if front_only else points, 'front': front, 'stats': stats}
@@ -0,0 +1,189 @@
+#persistent on-disk cache of constructed encoders
+#each entry is a directory with the gate arrays as .npy files (memory mapped on load) and meta.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import tempfile
+import numpy as np
+from qrm_gates import QRMcircuit
+from permutations import Permutation
+from rm_generators import MonomialIndex
+
+CACHE_DIR = os.environ.get('QRM_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'qrm'))
+MAX_CACHE_BYTES = int(os.environ.get('QRM_CACHE_BYTES', 2**30))
+
+#modules whose source enters the code version, a change in any of them invalidates the cache
+CODE_MODULES = ['qrm_circuits', 'qrm_circuits_new', 'qrm_matrices', 'qrm_gates', 'qrm_utils',
+                'rm_generators', 'permutations', 'gf2']
+GATE_ARRAYS = {'opcodes': np.int8, 'controls': np.int32, 'targets': np.int32, 'moments': np.int64}
+
+_code_version = None
+
+def code_version():
+    '''
+    sha256 of the source of CODE_MODULES
+    '''
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        for name in CODE_MODULES:
+            module = sys.modules.get(name) or __import__(name)
+            with open(module.__file__, 'rb') as f:
+                h.update(name.encode() + b'\0' + f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+def _jsonable(x):
+    if isinstance(x, (list, tuple, np.ndarray)):
+        return [_jsonable(v) for v in x]
+    if isinstance(x, dict):
+        return {str(k): _jsonable(v) for k, v in x.items()}
+    if isinstance(x, (np.integer, np.bool_)):
+        return x.item()
+    return x
+
+def encoder_key(function, *args, **kwargs):
+    '''
+    (hash, key) of a call, with the arguments bound to the signature (defaults filled in, circ_type dropped)
+    '''
+    bound = inspect.signature(function).bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = {k: _jsonable(v) for k, v in bound.arguments.items() if k != 'circ_type'}
+    key = {'function': '{}.{}'.format(function.__module__, function.__qualname__),
+           'arguments': arguments,
+           'version': code_version()}
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()[:32]
+    return digest, key
+
+def _dump(obj, path, name):
+    #json description of an encoder output, arrays saved next to it
+    if obj is None:
+        return None
+    if isinstance(obj, QRMcircuit):
+        arrays = {'opcodes': obj.opcodes, 'controls': obj.controls, 'targets': obj.targets, 'moments': obj.moments}
+        for a, values in arrays.items():
+            np.save(os.path.join(path, '{}_{}.npy'.format(name, a)), np.asarray(values, dtype=GATE_ARRAYS[a]))
+        return {'type': 'circuit', 'name': name}
+    if isinstance(obj, Permutation):
+        np.save(os.path.join(path, name + '.npy'), obj.array)
+        return {'type': 'permutation', 'name': name}
+    if isinstance(obj, MonomialIndex):
+        return {'type': 'monomial_index', 'm': obj.m, 'blocks': [list(b) for b in obj.blocks]}
+    if isinstance(obj, dict):
+        keys = np.fromiter(obj.keys(), dtype=np.int64, count=len(obj))
+        values = np.fromiter(obj.values(), dtype=np.int64, count=len(obj))
+        np.save(os.path.join(path, name + '.npy'), np.stack([keys, values]))
+        return {'type': 'dict', 'name': name}
+    if isinstance(obj, (tuple, list)):
+        if len(obj) and all(isinstance(o, (int, np.integer)) for o in obj):
+            np.save(os.path.join(path, name + '.npy'), np.asarray(obj, dtype=np.int64))
+            return {'type': 'int_' + type(obj).__name__, 'name': name}
+        return {'type': type(obj).__name__, 'items': [_dump(o, path, '{}_{}'.format(name, i)) for i, o in enumerate(obj)]}
+    return {'type': 'json', 'value': _jsonable(obj)}
+
+def _load(desc, path):
+    if desc is None:
+        return None
+    kind = desc['type']
+    if kind == 'circuit':
+        arrays = {a: np.load(os.path.join(path, '{}_{}.npy'.format(desc['name'], a)), mmap_mode='c') for a in GATE_ARRAYS}
+        return QRMcircuit(arrays['opcodes'], arrays['controls'], arrays['targets'], arrays['moments'].tolist(), copy=False)
+    if kind == 'permutation':
+        return Permutation(np.load(os.path.join(path, desc['name'] + '.npy')))
+    if kind == 'monomial_index':
+        return MonomialIndex(desc['m'], desc['blocks'])
+    if kind == 'dict':
+        keys, values = np.load(os.path.join(path, desc['name'] + '.npy'))
+        return dict(zip(keys.tolist(), values.tolist()))
+    if kind in ['int_tuple', 'int_list']:
+        values = np.load(os.path.join(path, desc['name'] + '.npy')).tolist()
+        return tuple(values) if kind == 'int_tuple' else values
+    if kind in ['tuple', 'list']:
+        items = [_load(d, path) for d in desc['items']]
+        return tuple(items) if kind == 'tuple' else items
+    return desc['value']
+
+def entry_size(path):
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+def cache_entries(cache_dir = None):
+    '''
+    [(hash, size in bytes, last access time)] of the cached encoders, least recently used first
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        meta = os.path.join(path, 'meta.json')
+        if os.path.isfile(meta):
+            entries.append((name, entry_size(path), os.path.getmtime(meta)))
+    return sorted(entries, key=lambda e: e[2])
+
+def evict(max_bytes = None, cache_dir = None):
+    '''
+    Removes least recently used entries until the cache holds at most max_bytes
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = cache_entries(cache_dir)
+    total = sum(e[1] for e in entries)
+    for name, size, _ in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+        total -= size
+    return total
+
+def clear_encoder_cache(cache_dir = None):
+    evict(max_bytes=0, cache_dir=cache_dir)
+
+def cached_encoder(function, *args, cache_dir = None, max_bytes = None, **kwargs):
+    '''
+    function(*args, **kwargs) for an encoder function (QRM_rec_circuit, RecursiveQRM, ...), read from the on-disk
+    cache if present, else built with circ_type = 'native' and stored.
+
+    The circuit is returned as circ_type (default 'tequila'), native circuits are memory mapped (copy on write).
+    The other outputs (position dict, Permutation, MonomialIndex, qubit lists) are returned as built.
+    '''
+    cache_dir = cache_dir or CACHE_DIR
+    circ_type = kwargs.pop('circ_type', 'tequila')
+    digest, key = encoder_key(function, *args, **kwargs)
+    path = os.path.join(cache_dir, digest)
+    meta_file = os.path.join(path, 'meta.json')
+
+    if os.path.isfile(meta_file):
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta['key'] == key:
+            out = _load(meta['output'], path)
+            os.utime(meta_file) #last access, for eviction
+            return _convert(out, circ_type)
+
+    out = function(*args, circ_type='native', **kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp_')
+    try:
+        meta = {'key': key, 'output': _dump(out, tmp, 'out'), 'created': time.time()}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True) #another process stored the entry first
+    evict(max_bytes=max_bytes, cache_dir=cache_dir)
+    return _convert(out, circ_type)
+
+def _convert(out, circ_type):
+    if isinstance(out, QRMcircuit):
+        return out.get_circuit(circ_type)
+    if isinstance(out, tuple) and len(out) and isinstance(out[0], QRMcircuit):
+        return (out[0].get_circuit(circ_type),) + out[1:]
+    return out
@@ -0,0 +1,252 @@
+#writers and readers for encoder circuits: compact binary, stim text and OpenQASM 2
+#writers stream chunks straight from the gate arrays (a QRMcircuit or the batches of encoder_stream),
+#readers memory map the file, the binary gate arrays are used in place
+
+import os
+import re
+import mmap
+import shutil
+import struct
+import tempfile
+import numpy as np
+from qrm_gates import QRMcircuit, H_GATE, CX_GATE
+from permutations import Permutation
+
+CHUNK_SIZE = 2**16
+
+#binary layout: header, opcodes int8 (padded to 8 bytes), controls int32, targets int32, moments int64, permutation int32
+MAGIC = b'QRMENC\x00\x01'
+HEADER = struct.Struct('<8sqqqq') #magic, gates, moments, permutation length, qubits
+
+def _pad8(n):
+    return (-n) % 8
+
+def gate_chunks(circuit, chunk_size = CHUNK_SIZE):
+    '''
+    (opcodes, controls, targets, moments) chunks of a QRMcircuit or an iterable of QRMcircuit batches,
+    moments are the moment starts inside the chunk as indices into the chunk (a continuing batch has no moment
+    start at its first gate)
+    '''
+    if isinstance(circuit, QRMcircuit):
+        moments = circuit.moments[1:] if circuit.continues else circuit.moments
+        n = len(circuit)
+        for a in range(0, n, chunk_size):
+            b = min(a + chunk_size, n)
+            yield (circuit.opcodes[a:b], circuit.controls[a:b], circuit.targets[a:b],
+                   moments[np.searchsorted(moments, a):np.searchsorted(moments, b)] - a)
+        return
+    for batch in circuit:
+        yield from gate_chunks(batch, chunk_size)
+
+def _permutation_array(permutation):
+    if permutation is None:
+        return np.zeros(0, dtype=np.int32)
+    if isinstance(permutation, dict):
+        permutation = Permutation(permutation)
+    return np.asarray(getattr(permutation, 'array', permutation), dtype=np.int32)
+
+### binary
+
+def write_binary(path, circuit, permutation = None, chunk_size = CHUNK_SIZE):
+    '''
+    Writes the gates (QRMcircuit or iterable of batches) and an optional Permutation to path.
+    The sections are written through temporary files next to path, so streams of unknown length use bounded memory.
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    names = ['opcodes', 'controls', 'targets', 'moments']
+    dtypes = [np.int8, np.int32, np.int32, np.int64]
+    parts = {name: tempfile.TemporaryFile(dir=directory) for name in names}
+    n_gates, n_moments, n_qubits = 0, 0, 0
+    try:
+        for chunk in gate_chunks(circuit, chunk_size):
+            chunk = chunk[:3] + (chunk[3] + n_gates,)
+            for name, dtype, values in zip(names, dtypes, chunk):
+                parts[name].write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            n_gates += len(chunk[0])
+            n_moments += len(chunk[3])
+            if len(chunk[0]):
+                n_qubits = max(n_qubits, int(chunk[1].max()) + 1, int(chunk[2].max()) + 1)
+        perm = _permutation_array(permutation)
+
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, n_gates, n_moments, len(perm), n_qubits))
+            for name in names:
+                parts[name].seek(0)
+                shutil.copyfileobj(parts[name], f, 2**22)
+                if name == 'opcodes':
+                    f.write(b'\0'*_pad8(n_gates))
+            f.write(perm.tobytes())
+    finally:
+        for part in parts.values():
+            part.close()
+    return n_gates
+
+def read_binary(path):
+    '''
+    (QRMcircuit, Permutation or None) of a file from write_binary, the gate arrays are memory mapped (copy on write)
+    '''
+    with open(path, 'rb') as f:
+        magic, n_gates, n_moments, n_perm, _ = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('{} is not a QRM encoder file.'.format(path))
+    offset = HEADER.size
+    arrays = []
+    for dtype, count in [(np.int8, n_gates), (np.int32, n_gates), (np.int32, n_gates), (np.int64, n_moments), (np.int32, n_perm)]:
+        if count:
+            arrays.append(np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=(count,)))
+        else:
+            arrays.append(np.zeros(0, dtype=dtype))
+        offset += count*np.dtype(dtype).itemsize
+        if dtype == np.int8:
+            offset += _pad8(n_gates)
+    opcodes, controls, targets, moments, perm = arrays
+    circuit = QRMcircuit(opcodes, controls, targets, moments.tolist(), copy=False)
+    return circuit, (Permutation(perm) if n_perm else None)
+
+### stim text
+
+def _runs(op, cuts):
+    #[a, b) ranges of equal opcodes, also cut at cuts
+    cuts = np.union1d(np.flatnonzero(np.diff(op)) + 1, cuts)
+    cuts = cuts[(cuts > 0) & (cuts < len(op))].tolist()
+    return zip([0] + cuts, cuts + [len(op)])
+
+def _numbers(values):
+    return ' '.join(map(str, values.tolist()))
+
+def write_stim(path, circuit, permutation = None, tick = True, chunk_size = CHUNK_SIZE):
+    '''
+    Writes the gates as a stim circuit, one H / CX instruction per run of equal gates.
+    tick: TICK between moments, read_stim restores the moments from them.
+    The permutation is kept in a '#permutation' comment line.
+    '''
+    with open(path, 'w') as f:
+        perm = _permutation_array(permutation)
+        if len(perm):
+            f.write('#permutation ' + _numbers(perm) + '\n')
+        first = True
+        for op, ctrl, tgt, moments in gate_chunks(circuit, chunk_size):
+            starts = set(moments.tolist()) if tick else set()
+            lines = []
+            for a, b in _runs(op, moments if tick else []):
+                if a in starts and not first:
+                    lines.append('TICK')
+                first = False
+                if op[a] == H_GATE:
+                    lines.append('H ' + _numbers(tgt[a:b]))
+                else:
+                    lines.append('CX ' + _numbers(np.stack([ctrl[a:b], tgt[a:b]], axis=1).reshape(-1)))
+            if lines:
+                f.write('\n'.join(lines) + '\n')
+
+def _mapped_lines(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b'')
+
+def _moments(n, cuts):
+    #moment starts from the gate indices of the TICK / barrier lines, every gate is a moment without them
+    if len(cuts) == 0:
+        return list(range(n))
+    return sorted(set([0] + [c for c in cuts if c < n])) if n else []
+
+def read_stim(path):
+    '''
+    (QRMcircuit, Permutation or None) of a stim file with H and CX instructions (as from write_stim).
+    TICK starts a new moment, without TICKs every gate is its own moment.
+    '''
+    ops, ctrls, tgts, cuts = [], [], [], []
+    n = 0
+    perm = None
+    for line in _mapped_lines(path):
+        line = line.strip()
+        if line.startswith(b'#permutation'):
+            perm = Permutation(np.fromstring(line[len(b'#permutation'):], dtype=np.int32, sep=' '))
+            continue
+        if not line or line.startswith(b'#'):
+            continue
+        name, _, rest = line.partition(b' ')
+        if name == b'TICK':
+            cuts.append(n)
+            continue
+        values = np.fromstring(rest, dtype=np.int32, sep=' ')
+        if name == b'H':
+            op, c, t = H_GATE, np.full(len(values), -1, dtype=np.int32), values
+        elif name in [b'CX', b'CNOT', b'ZCX']:
+            op, c, t = CX_GATE, values[0::2], values[1::2]
+        else:
+            raise ValueError('Unsupported stim instruction {}'.format(line[:40].decode()))
+        ops.append(np.full(len(t), op, dtype=np.int8))
+        ctrls.append(c)
+        tgts.append(t)
+        n += len(t)
+    if n == 0:
+        return QRMcircuit(), perm
+    circuit = QRMcircuit(np.concatenate(ops), np.concatenate(ctrls), np.concatenate(tgts), _moments(n, cuts), copy=False)
+    return circuit, perm
+
+### OpenQASM 2
+
+QASM_GATE = re.compile(rb'(h|cx)\s+q\[(\d+)\]\s*(?:,\s*q\[(\d+)\])?\s*;')
+
+def write_qasm(path, circuit, n_qubits = None, permutation = None, barrier = True, chunk_size = CHUNK_SIZE):
+    '''
+    Writes the gates as OpenQASM 2 on the register q[n_qubits] (n_qubits needed for streamed batches).
+    barrier: 'barrier q;' between moments, read_qasm restores the moments from them.
+    The permutation is kept in a '//permutation' comment line.
+    '''
+    if n_qubits is None:
+        if not isinstance(circuit, QRMcircuit):
+            raise ValueError('n_qubits is needed to write a stream of batches.')
+        n_qubits = circuit.n_qubits
+    with open(path, 'w') as f:
+        f.write('OPENQASM 2.0;\ninclude "qelib1.inc";\n')
+        perm = _permutation_array(permutation)
+        if len(perm):
+            f.write('//permutation ' + _numbers(perm) + '\n')
+        f.write('qreg q[{}];\n'.format(max(n_qubits, 1)))
+        first = True
+        for op, ctrl, tgt, moments in gate_chunks(circuit, chunk_size):
+            before = np.zeros(len(op), dtype=bool)
+            if barrier:
+                before[moments] = True
+                before[0] &= not first
+            first = False
+            f.write(''.join([('barrier q;\n' if bb else '') + ('h q[%d];\n' % t if o == H_GATE else 'cx q[%d],q[%d];\n' % (c, t))
+                             for bb, o, c, t in zip(before.tolist(), op.tolist(), ctrl.tolist(), tgt.tolist())]))
+
+def read_qasm(path):
+    '''
+    (QRMcircuit, Permutation or None) of an OpenQASM 2 file with h and cx gates on one register (as from write_qasm).
+    barrier starts a new moment, without barriers every gate is its own moment.
+    '''
+    ops, ctrls, tgts, cuts = [], [], [], []
+    perm = None
+    for line in _mapped_lines(path):
+        line = line.strip()
+        if line.startswith(b'//permutation'):
+            perm = Permutation(np.fromstring(line[len(b'//permutation'):], dtype=np.int32, sep=' '))
+            continue
+        if not line or line.startswith(b'//') or line.startswith((b'OPENQASM', b'include', b'qreg', b'creg')):
+            continue
+        if line.startswith(b'barrier'):
+            cuts.append(len(ops))
+            continue
+        match = QASM_GATE.fullmatch(line)
+        if match is None:
+            raise ValueError('Unsupported OpenQASM statement {}'.format(line[:40].decode()))
+        name, a, b = match.groups()
+        if name == b'h':
+            ops.append(H_GATE)
+            ctrls.append(-1)
+            tgts.append(int(a))
+        else:
+            ops.append(CX_GATE)
+            ctrls.append(int(a))
+            tgts.append(int(b))
+    n = len(ops)
+    if n == 0:
+        return QRMcircuit(), perm
+    return QRMcircuit(ops, ctrls, tgts, _moments(n, cuts)), perm
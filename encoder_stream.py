@@ -0,0 +1,406 @@
+#streaming versions of the recursive encoders, gates are yielded in circuit order as QRMcircuit batches
+#the Plotkin recursion U = (gates of this level) + U1 + U2 is walked depth first, so only the gates of one
+#level and the qubit lists of the current branch are held at a time (the punctured encoders also keep the position
+#arrays of their sub-encoders, one int array per (r, m) of the recursion)
+
+from functools import lru_cache
+import numpy as np
+from qrm_gates import QRMcircuit
+from permutations import Permutation, concatenate_permutations
+import qrm_circuits
+from qrm_circuits import QRM_rec_circuit, QRM_rec_classical_circuit, QRM_rec_assym_circuit, QRM_rec_punc_circuit, \
+    QRM_rec_assym_punc_circuit, get_qubit_partition, get_punc_qubit_partition, add_entanglers, add_punc_entanglers, \
+    add_hadamards, sub_encoder, freeze_partitions, thaw_partitions, SUB_ENCODER_CACHE_SIZE
+from qrm_matrices import get_leading_bits_r1r2
+from qrm_circuits_new import RecursiveQRM, RecursiveBasisQRM, RecursiveBasisQRM_m, RecursiveQRM_head, RecursiveBasisQRM_head, RecursiveBasisQRM_m_head, \
+    BasisIndex
+
+BATCH_SIZE = 2**16
+
+def batched(pieces, batch_size = BATCH_SIZE):
+    '''
+    Regroups a sequence of QRMcircuits into circuits of batch_size gates (the last one may be shorter).
+    A batch cut inside a moment is marked continues, so collect and the encoder_io writers keep the moments.
+    '''
+    buffer = QRMcircuit()
+    for piece in pieces:
+        a, n = 0, len(piece)
+        while a < n:
+            b = min(n, a + batch_size - len(buffer))
+            buffer += piece if (a, b) == (0, n) else piece.slice(a, b)
+            a = b
+            if len(buffer) == batch_size:
+                yield buffer
+                buffer = QRMcircuit()
+    if len(buffer):
+        yield buffer
+
+def collect(batches):
+    '''
+    Joins streamed batches into one QRMcircuit
+    '''
+    circuit = QRMcircuit()
+    for batch in batches:
+        circuit += batch
+    return circuit
+
+def iter_gates(batches):
+    #(name, control, target) of every gate, control is None for H
+    for batch in batches:
+        yield from batch.gates()
+
+#levels are memoized on canonical qubits and relabelled (as qrm_circuits.sub_encoder), sub-encoders on at most
+#LEAF_QUBITS qubits are emitted whole through sub_encoder
+LEAF_QUBITS = 2**8
+
+@lru_cache(maxsize=SUB_ENCODER_CACHE_SIZE)
+def _canonical_level(level, args, partitions, punctured):
+    return level(*args, thaw_partitions(partitions), list(range(2**args[1] - punctured)))
+
+def _level(level, qubit_list, *args, partitions = [], punctured = False):
+    #gates of one recursion level, level(r, m, ..., partitions, qubit_list) -> QRMcircuit, on 2^m (- 1) qubits
+    ql = np.asarray(qubit_list, dtype=np.int64)
+    if not qrm_circuits.MEMOIZE_SUB_ENCODERS or (np.diff(ql) <= 0).any():
+        return level(*args, partitions, qubit_list)
+    return _canonical_level(level, args, freeze_partitions(partitions), int(punctured)).map_qubits(ql)
+
+### qrm_circuits encoders, the position dicts of the recursion are the identity (the leaves are {0: 0} and the
+### halves are concatenated in order), so the leading bits index the qubit lists directly
+
+def _rec_classical_level(r, m, partitions, qubit_list):
+    ql_1, ql_2, _, _ = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    return add_entanglers(0, r-1 if r == m else r, m-1, ql_1=ql_1, ql_2=ql_2, only_cnots=True, circ_type='native')
+
+def _rec_level(r, m, only_cnots, partitions, qubit_list):
+    ql_1, ql_2, _, _ = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    U = QRMcircuit()
+    if r > m-r-1:
+        U += add_entanglers(m-r, r, m-1, ql_1=ql_1, ql_2=ql_2, only_cnots=True, circ_type='native')
+    U += add_entanglers(m-r-1, m-r-1, m-1, ql_1=ql_1, ql_2=ql_2, only_cnots=only_cnots, circ_type='native')
+    return U
+
+def _rec_classical_pieces(r, m, partitions, qubit_list):
+    if qubit_list is None:
+        qubit_list = list(range(2**m))
+    if 2**m <= LEAF_QUBITS or r > m or m < 0 or r < -1:
+        yield sub_encoder(QRM_rec_classical_circuit, qubit_list, r, m, partitions=partitions)[0]
+        return
+    if r == -1:
+        return
+    ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    yield _level(_rec_classical_level, qubit_list, r, m, partitions=partitions)
+    r_sub = r-1 if r == m else r
+    yield from _rec_classical_pieces(r_sub, m-1, p1, ql_1)
+    yield from _rec_classical_pieces(r_sub, m-1, p2, ql_2)
+
+def _rec_pieces(r, m, partitions, qubit_list, only_cnots):
+    if qubit_list is None:
+        qubit_list = list(range(2**m))
+    if 2**m <= LEAF_QUBITS or r > m or r < m-r-1:
+        yield sub_encoder(QRM_rec_circuit, qubit_list, r, m, partitions=partitions, only_cnots=only_cnots)[0]
+        return
+    if r == m:
+        yield from _rec_classical_pieces(r, m, partitions, qubit_list)
+        return
+    ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    yield _level(_rec_level, qubit_list, r, m, only_cnots, partitions=partitions)
+    yield from _rec_pieces(r, m-1, p1, ql_1, only_cnots)
+    yield from _rec_pieces(r, m-1, p2, ql_2, only_cnots)
+
+def stream_QRM_rec_classical_circuit(r, m, partitions = [], qubit_list = None, batch_size = BATCH_SIZE):
+    '''
+    Gates of QRM_rec_classical_circuit(r, m) as QRMcircuit batches of batch_size gates
+    '''
+    return batched(_rec_classical_pieces(r, m, partitions, qubit_list), batch_size)
+
+def stream_QRM_rec_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False, classical = False, batch_size = BATCH_SIZE):
+    '''
+    Gates of QRM_rec_circuit(r, m) as QRMcircuit batches of batch_size gates.
+    The position dict of QRM_rec_circuit is the identity on range(2^m) and is not built.
+    '''
+    if classical:
+        return stream_QRM_rec_classical_circuit(r, m, partitions=partitions, qubit_list=qubit_list, batch_size=batch_size)
+    return batched(_rec_pieces(r, m, partitions, qubit_list, only_cnots), batch_size)
+
+def _assym_level(r, m, r_in, m_in, only_cnots, partitions, qubit_list):
+    ql_1, ql_2, _, _ = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    if r != r_in:
+        U = add_entanglers(r+1, r_in, m-1, ql_1=ql_1, ql_2=ql_2, only_cnots=True, circ_type='native')
+        U += add_entanglers(r, r, m-1, ql_1=ql_1, ql_2=ql_2, only_cnots=only_cnots, circ_type='native')
+        return U
+    return add_entanglers(r, r_in, m-1, ql_1=ql_1, ql_2=ql_2, only_cnots=only_cnots, circ_type='native')
+
+def _assym_pieces(r, m, r_in, m_in, partitions, qubit_list, only_cnots):
+    #the position dicts of QRM_rec_assym_circuit are the identity as well
+    if qubit_list is None:
+        qubit_list = list(range(2**m))
+    if 2**m <= LEAF_QUBITS or r > m or r < -1:
+        yield sub_encoder(QRM_rec_assym_circuit, qubit_list, r, m, r_in, m_in, partitions=partitions, only_cnots=only_cnots)[0]
+        return
+    if 2*r_in + 1 <= m_in and r == -1:
+        yield from _rec_classical_pieces(r_in, m, partitions, qubit_list)
+        return
+    if 2*r_in + 1 > m_in and m == r_in:
+        if not only_cnots:
+            yield add_hadamards(0, 2*r_in - m_in, m, qubit_list=qubit_list, circ_type='native')
+        yield from _rec_classical_pieces(r_in, r_in, partitions, qubit_list)
+        return
+    ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    yield _level(_assym_level, qubit_list, r, m, r_in, m_in, only_cnots, partitions=partitions)
+    yield from _assym_pieces(r-1, m-1, r_in, m_in, p1, ql_1, only_cnots)
+    yield from _assym_pieces(r-1, m-1, r_in, m_in, p2, ql_2, only_cnots)
+
+def stream_QRM_rec_assym_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None, only_cnots = False, batch_size = BATCH_SIZE):
+    '''
+    Gates of QRM_rec_assym_circuit(r, m, r_in, m_in) as QRMcircuit batches of batch_size gates.
+    The position dict of QRM_rec_assym_circuit is the identity on range(2^m) and is not built.
+    '''
+    return batched(_assym_pieces(r, m, r_in, m_in, partitions, qubit_list, only_cnots), batch_size)
+
+### punctured encoders, the position dicts are not the identity: they are computed without the gates as arrays
+### (pos[key] = position, -1 for keys not in the dict) and index the qubit lists as the dicts do
+
+def _join_positions(pos1, m):
+    #position dict of (U1 on the first half, an identity position dict on the 2^(m-1) qubits of the second half)
+    pos = np.full(2**m, -1, dtype=np.int64)
+    pos[:len(pos1)] = pos1
+    pos[2**(m-1):] = np.arange(2**(m-1)) + np.count_nonzero(pos1 >= 0)
+    return pos
+
+@lru_cache(maxsize=None)
+def punc_positions(r, m, state_prep = False, classical = False):
+    '''
+    Position dict of QRM_rec_punc_circuit(r, m) as a read-only array, pos[key] = position, -1 for keys not in the
+    dict (None for invalid parameters)
+    '''
+    if r > m - (0 if state_prep else 1) or r < m-r-1:
+        return None
+    if state_prep and (m == r+1 or m == r):
+        if r == 1 and m == 1:
+            pos = np.array([-1, 0])
+        else:
+            pos = _join_positions(punc_positions(m-1, m-1, state_prep, classical), m)
+    elif not state_prep and m == r+1:
+        if r == 0:
+            pos = np.array([0])
+        else:
+            pos1 = punc_positions(r-1, r, state_prep, classical)
+            pos = np.full(2**m, -1, dtype=np.int64)
+            pos[:len(pos1)] = pos1
+            targets = np.asarray(get_leading_bits_r1r2(0, r-1, r), dtype=np.int64)
+            pos[2**r + targets] = np.arange(len(targets)) + np.count_nonzero(pos1 >= 0)
+            pos[2**r - 1] = 2**(r+1) - 2
+    else:
+        pos = _join_positions(punc_positions(r, m-1, state_prep, classical), m)
+    pos.flags.writeable = False
+    return pos
+
+@lru_cache(maxsize=None)
+def assym_punc_positions(r, m, r_in, m_in, state_prep = False):
+    '''
+    Position dict of QRM_rec_assym_punc_circuit(r, m, r_in, m_in) as a read-only array, as punc_positions
+    '''
+    if m == 0:
+        return np.zeros(1, dtype=np.int64)
+    if r >= m or r < 0:
+        return None
+    if 2*r_in + 1 < m_in and r == 0:
+        return punc_positions(r_in, m, state_prep, True)
+    if 2*r_in + 1 >= m_in and m == r_in + 1:
+        return punc_positions(r_in, r_in + 1, state_prep)
+    pos = _join_positions(assym_punc_positions(r-1, m-1, r_in, m_in, state_prep), m)
+    pos.flags.writeable = False
+    return pos
+
+def _punc_level(r, m, only_cnots, state_prep, classical, partitions, qubit_list):
+    ql_1, ql_2, _, _ = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    pos1 = punc_positions(r, m-1, state_prep, classical)
+    if classical:
+        only_cnots = True
+        r1 = 1 if state_prep else 0
+    else:
+        r1 = m-r-1
+    U = QRMcircuit()
+    if r > m-r-1:
+        U += add_punc_entanglers(m-r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=pos1, only_cnots=True, circ_type='native')
+    U += add_punc_entanglers(r1, m-r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=pos1, only_cnots=only_cnots, circ_type='native')
+    return U
+
+def _punc_base_level(r, m, state_prep, classical, partitions, qubit_list):
+    #entanglers of the base cases U^*(r, r+1) (and with state_prep U^*(m-1, m), U^*(m, m)), before their U1
+    ql_1, ql_2, _, _ = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    if state_prep:
+        targets = get_leading_bits_r1r2(0, m-1, m-1)[1:]
+        pos1 = punc_positions(m-1, m-1, state_prep, classical)
+    else:
+        targets = get_leading_bits_r1r2(0, r-1, r)
+        pos1 = punc_positions(r-1, m-1, state_prep, classical)
+    U = QRMcircuit()
+    U.CX_layer([ql_1[a] for a in pos1[targets]], [ql_2[a] for a in targets])
+    return U
+
+def _punc_pieces(r, m, partitions, qubit_list, only_cnots, state_prep, classical):
+    if qubit_list is None:
+        qubit_list = list(range(2**m - 1))
+    if 2**m - 1 <= LEAF_QUBITS or punc_positions(r, m, state_prep, classical) is None:
+        yield sub_encoder(QRM_rec_punc_circuit, qubit_list, r, m, partitions=partitions, only_cnots=only_cnots,
+                          state_prep=state_prep, classical=classical)[0]
+        return
+    ql_1, ql_2, p1, p2 = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    if state_prep and (m == r+1 or m == r):
+        yield _level(_punc_base_level, qubit_list, r, m, state_prep, classical, partitions=partitions, punctured=True)
+        yield from _punc_pieces(m-1, m-1, p1, ql_1, True, state_prep, classical)
+        yield from _rec_classical_pieces(m-1, m-1, p2, ql_2)
+        return
+    if not state_prep and m == r+1:
+        yield _level(_punc_base_level, qubit_list, r, m, state_prep, classical, partitions=partitions, punctured=True)
+        yield from _punc_pieces(r-1, m-1, p1, ql_1, True, state_prep, classical)
+        U = QRMcircuit()
+        U.CX(control=ql_2[-1], target=ql_1[-1])
+        yield U
+        yield from _rec_classical_pieces(r-1, r, p2, ql_2)
+        return
+    yield _level(_punc_level, qubit_list, r, m, only_cnots, state_prep, classical, partitions=partitions, punctured=True)
+    yield from _punc_pieces(r, m-1, p1, ql_1, only_cnots, state_prep, classical)
+    if classical:
+        yield from _rec_classical_pieces(r, m-1, p2, ql_2)
+    else:
+        yield from _rec_pieces(r, m-1, p2, ql_2, only_cnots)
+
+def stream_QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False, state_prep = False,
+                                classical = False, batch_size = BATCH_SIZE):
+    '''
+    Gates of QRM_rec_punc_circuit(r, m) as QRMcircuit batches of batch_size gates,
+    its position dict is given by punc_positions(r, m, state_prep, classical)
+    '''
+    return batched(_punc_pieces(r, m, partitions, qubit_list, only_cnots, state_prep, classical), batch_size)
+
+def _assym_punc_level(r, m, r_in, m_in, only_cnots, state_prep, partitions, qubit_list):
+    ql_1, ql_2, _, _ = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    pos1 = assym_punc_positions(r-1, m-1, r_in, m_in, state_prep)
+    if r != r_in:
+        U = add_punc_entanglers(r+1, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=pos1, only_cnots=True, circ_type='native')
+        U += add_punc_entanglers(r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=pos1, only_cnots=only_cnots, circ_type='native')
+        return U
+    return add_punc_entanglers(r, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=pos1, only_cnots=only_cnots, circ_type='native')
+
+def _assym_punc_pieces(r, m, r_in, m_in, partitions, qubit_list, only_cnots, state_prep):
+    if qubit_list is None:
+        qubit_list = list(range(2**m - 1))
+    if 2**m - 1 <= LEAF_QUBITS or r >= m or r < 0:
+        yield sub_encoder(QRM_rec_assym_punc_circuit, qubit_list, r, m, r_in, m_in, partitions=partitions,
+                          only_cnots=only_cnots, state_prep=state_prep)[0]
+        return
+    if 2*r_in + 1 < m_in and r == 0:
+        yield from _punc_pieces(r_in, m, partitions, qubit_list, only_cnots, state_prep, True)
+        return
+    if 2*r_in + 1 >= m_in and m == r_in + 1:
+        if 2*r_in + 1 > m_in and not only_cnots:
+            yield add_hadamards(1, 2*r_in - m_in + 1, m, qubit_list=qubit_list,
+                                pos_dict=punc_positions(r_in, r_in + 1, state_prep), circ_type='native')
+        yield from _punc_pieces(r_in, r_in + 1, partitions, qubit_list, only_cnots, state_prep, False)
+        return
+    ql_1, ql_2, p1, p2 = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
+    yield _level(_assym_punc_level, qubit_list, r, m, r_in, m_in, only_cnots, state_prep, partitions=partitions, punctured=True)
+    yield from _assym_punc_pieces(r-1, m-1, r_in, m_in, p1, ql_1, only_cnots, state_prep)
+    yield from _assym_pieces(r-1, m-1, r_in, m_in, p2, ql_2, only_cnots)
+
+def stream_QRM_rec_assym_punc_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None, only_cnots = False,
+                                      state_prep = False, batch_size = BATCH_SIZE):
+    '''
+    Gates of QRM_rec_assym_punc_circuit(r, m, r_in, m_in) as QRMcircuit batches of batch_size gates,
+    its position dict is given by assym_punc_positions(r, m, r_in, m_in, state_prep)
+    '''
+    return batched(_assym_punc_pieces(r, m, r_in, m_in, partitions, qubit_list, only_cnots, state_prep), batch_size)
+
+### qrm_circuits_new encoders, the gates of a level need the permutations of its sub-encoders, which are
+### computed on demand by a pass over the levels without their sub-encoder gates
+
+HEADS = {
+    'qrm': RecursiveQRM_head,
+    'basis': RecursiveBasisQRM_head,
+    'basis_m': lambda r, m, *args: RecursiveBasisQRM_m_head(m, *args),
+}
+
+def _resolve(kind, r, m):
+    #the encoder RecursiveQRM / RecursiveBasisQRM dispatch to at (r, m)
+    if kind == 'qrm' and r > m:
+        raise ValueError("Incorrect parameters r>m!")
+    if kind == 'qrm' and r == m:
+        kind = 'basis'
+    if kind == 'basis' and r == m:
+        kind = 'basis_m'
+    if kind == 'basis_m':
+        r = m
+    return kind, r
+
+def _head(kind, r, m, partitions, ql):
+    #(gates, Permutation, MonomialIndex) of one level, kind and r as resolved
+    ql1, ql2, par1, par2 = get_qubit_partition(m, ql, partitions)
+    P1, M1 = encoder_permutation(kind, r, m-1, par1, ql1)
+    P2, M2 = encoder_permutation(kind, r, m-1, par2, ql2)
+    return HEADS[kind](r, m, ql, ql1, ql2, P1, P2, M1, M2)
+
+@lru_cache(maxsize=SUB_ENCODER_CACHE_SIZE)
+def _canonical_head(kind, r, m, partitions):
+    return _head(kind, r, m, thaw_partitions(partitions), list(range(2**m)))
+
+def _memoized(ql):
+    return qrm_circuits.MEMOIZE_SUB_ENCODERS and not (np.diff(np.asarray(ql)) <= 0).any()
+
+def encoder_permutation(kind, r, m, partitions = [], ql = []):
+    '''
+    (Permutation, MonomialIndex) returned by the encoder kind ('qrm': RecursiveQRM, 'basis': RecursiveBasisQRM,
+    'basis_m': RecursiveBasisQRM_m) on the qubits ql, without building its gates
+    '''
+    if len(ql) == 0:
+        ql = list(range(2**m))
+    kind, r = _resolve(kind, r, m)
+    if m == 0:
+        return Permutation({ql[0]: ql[0]}), BasisIndex(0, 0)
+    if not _memoized(ql):
+        return _head(kind, r, m, partitions, ql)[1:]
+    _, P, M = _canonical_head(kind, r, m, freeze_partitions(partitions))
+    return concatenate_permutations([P], [ql]), M
+
+def _recursive_pieces(kind, r, m, partitions, ql):
+    kind, r = _resolve(kind, r, m)
+    if 2**m <= LEAF_QUBITS:
+        if kind == 'basis_m':
+            yield sub_encoder(RecursiveBasisQRM_m, ql, m, partitions=partitions, qubit_arg='ql')[0]
+        else:
+            builder = RecursiveQRM if kind == 'qrm' else RecursiveBasisQRM
+            yield sub_encoder(builder, ql, r, m, partitions=partitions, qubit_arg='ql')[0]
+        return
+    if _memoized(ql):
+        yield _canonical_head(kind, r, m, freeze_partitions(partitions))[0].map_qubits(ql)
+    else:
+        yield _head(kind, r, m, partitions, ql)[0]
+    ql1, ql2, par1, par2 = get_qubit_partition(m, ql, partitions)
+    yield from _recursive_pieces(kind, r, m-1, par1, ql1)
+    yield from _recursive_pieces(kind, r, m-1, par2, ql2)
+
+def stream_RecursiveQRM(r, m, ql = [], partitions = [], batch_size = BATCH_SIZE):
+    '''
+    Gates of RecursiveQRM(r, m) as QRMcircuit batches of batch_size gates,
+    the permutation and row index are given by encoder_permutation('qrm', r, m, partitions, ql)
+    '''
+    if len(ql) == 0:
+        ql = list(range(2**m))
+    _resolve('qrm', r, m)
+    return batched(_recursive_pieces('qrm', r, m, partitions, ql), batch_size)
+
+def stream_RecursiveBasisQRM(r, m, ql = [], partitions = [], batch_size = BATCH_SIZE):
+    '''
+    Gates of RecursiveBasisQRM(r, m) as QRMcircuit batches of batch_size gates,
+    the permutation and row index are given by encoder_permutation('basis', r, m, partitions, ql)
+    '''
+    if len(ql) == 0:
+        ql = list(range(2**m))
+    return batched(_recursive_pieces('basis', r, m, partitions, ql), batch_size)
+
+def clear_stream_cache():
+    _canonical_head.cache_clear()
+    _canonical_level.cache_clear()
+    punc_positions.cache_clear()
+    assym_punc_positions.cache_clear()
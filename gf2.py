@@ -0,0 +1,184 @@
+#GF(2) linear algebra on bit-packed rows
+#rows are packed as in rm_generators, column j is bit j%64 of word j//64
+
+import numpy as np
+from rm_generators import popcounts
+
+def n_words_cols(n_cols):
+    return max(1, (n_cols + 63) >> 6)
+
+class GF2Matrix:
+    '''
+    Binary matrix stored as bit-packed uint64 rows of shape (k, n_words_cols(n_cols)).
+    Row operations (XOR) act on whole words, the dense form is only built on request.
+    '''
+    def __init__(self, words, n_cols):
+        self.n_cols = int(n_cols)
+        self.words = np.ascontiguousarray(words, dtype=np.uint64).reshape(-1, n_words_cols(self.n_cols))
+
+    @classmethod
+    def from_dense(cls, M, n_cols = None):
+        M = np.asarray(M)
+        if n_cols is None:
+            n_cols = M.shape[1] if M.ndim == 2 else 0
+        M = M.reshape(-1, n_cols)
+        nw = n_words_cols(n_cols)
+        bits = np.zeros((len(M), 64*nw), dtype=np.uint8)
+        bits[:, :n_cols] = M % 2
+        packed = np.packbits(bits, axis=1, bitorder='little')
+        return cls(packed.view('<u8'), n_cols)
+
+    def to_dense(self, dtype = np.int64):
+        bits = np.unpackbits(self.words.astype('<u8').view(np.uint8), axis=1, bitorder='little')
+        return bits[:, :self.n_cols].astype(dtype)
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def shape(self):
+        return (len(self.words), self.n_cols)
+
+    def __getitem__(self, rows):
+        return GF2Matrix(self.words[rows], self.n_cols)
+
+    def copy(self):
+        return GF2Matrix(self.words.copy(), self.n_cols)
+
+    def vstack(self, other):
+        assert self.n_cols == other.n_cols, 'Different number of columns.'
+        return GF2Matrix(np.concatenate([self.words, other.words]), self.n_cols)
+
+    def __repr__(self) -> str:
+        return 'GF2Matrix with {} rows and {} columns'.format(*self.shape)
+
+    def leading_bits(self):
+        '''
+        Index of the first non-zero column of every row, -1 for zero rows
+        '''
+        nonzero = self.words != 0
+        w = np.argmax(nonzero, axis=1)
+        word = self.words[np.arange(len(self.words)), w]
+        low = word & (~word + np.uint64(1))
+        lead = 64*w + np.log2(np.maximum(low, np.uint64(1)).astype(np.float64)).astype(np.int64)
+        lead[~nonzero.any(axis=1)] = -1
+        return lead
+
+    def supports(self):
+        '''
+        List of arrays with the non-zero columns of every row, in increasing order
+        '''
+        rows, cols = np.nonzero(self.to_dense(dtype=bool))
+        return np.split(cols, np.searchsorted(rows, np.arange(1, len(self.words))))
+
+    def puncture(self, columns = [0]):
+        '''
+        Removes the listed columns
+        '''
+        keep = np.ones(self.n_cols, dtype=bool)
+        keep[list(columns)] = False
+        return GF2Matrix.from_dense(self.to_dense(dtype=np.uint8)[:, keep])
+
+    def row_reduce(self, priority = None, reduced = False):
+        '''
+        Gaussian elimination, columns scanned from the left.
+
+        priority: per row, lower values are preferred as pivot rows, and a pivot row is only added to rows
+        with priority >= its own. With priority [0]*len(A) + [1]*len(B) the rows from A keep spanning A while
+        the rows from B are reduced modulo A.
+        reduced: also clears the pivot columns above the pivots (reduced row echelon form)
+
+        Returns (E, pivots, rows): the non-zero echelon rows sorted by pivot column, their pivot columns and
+        the original row index of every echelon row.
+        '''
+        W = self.words.copy()
+        k = len(W)
+        priority = np.zeros(k, dtype=np.int64) if priority is None else np.asarray(priority, dtype=np.int64)
+        pivoted = np.zeros(k, dtype=bool)
+        pivots, rows = [], []
+        for c in range(self.n_cols):
+            if len(rows) == k:
+                break
+            has = (W[:, c >> 6] >> np.uint64(c & 63)) & np.uint64(1) != 0
+            candidates = np.flatnonzero(has & ~pivoted)
+            if len(candidates) == 0:
+                continue
+            p = candidates[np.argmin(priority[candidates])]
+            pivoted[p] = True
+            clear = has & (priority >= priority[p])
+            if not reduced:
+                clear &= ~pivoted
+            clear[p] = False
+            W[clear] ^= W[p]
+            pivots.append(c)
+            rows.append(p)
+        rows = np.array(rows, dtype=np.int64)
+        return GF2Matrix(W[rows], self.n_cols), np.array(pivots, dtype=np.int64), rows
+
+    def rank(self):
+        return len(self.row_reduce()[1])
+
+    def same_rowspace(self, other):
+        r = self.rank()
+        return r == other.rank() and r == self.vstack(other).rank()
+
+def monomial_r_transform(monomials, m, r = None):
+    '''
+    Rows of R G for G the evaluation vectors of monomials (as in qrm_matrices.get_R), without building R.
+
+    Row i of R is the sum of the rows x_i | T, T a subset of A_i, the r - |x_i| lowest zero bits of x_i,
+    so row i of R G is the indicator of the columns c with x_i in c and c disjoint from A_i:
+    weight 2^{m-r} and the same leading bit x_i. r defaults to the maximum degree of the monomials.
+    '''
+    x = np.asarray(monomials, dtype=np.int64)
+    deg = popcounts(m)[x] if len(x) else x
+    if r is None:
+        r = int(deg.max(initial=0))
+    need = r - deg
+    A = np.zeros(len(x), dtype=np.int64)
+    for j in range(m):
+        zero = ((x >> j) & 1 == 0) & (need > 0)
+        A |= zero.astype(np.int64) << j
+        need -= zero
+    free = ((1 << m) - 1) & ~(x | A)
+
+    #columns x | deposit(t, free) for t < 2^{m-r}
+    t = np.arange(1 << (m - r), dtype=np.int64)[None, :]
+    cols = np.repeat(x[:, None], t.shape[1], axis=1)
+    seen = np.zeros((len(x), 1), dtype=np.int64)
+    for j in range(m):
+        f = ((free >> j) & 1)[:, None]
+        cols |= ((t >> seen) & 1 & f) << j
+        seen += f
+    nw = n_words_cols(1 << m)
+    words = np.zeros(len(x)*nw, dtype=np.uint64)
+    rows = np.repeat(np.arange(len(x), dtype=np.int64), cols.shape[1])
+    cols = cols.reshape(-1)
+    np.bitwise_or.at(words, rows*nw + (cols >> 6), np.uint64(1) << (cols & 63).astype(np.uint64))
+    return GF2Matrix(words, 1 << m)
+
+def monomial_r_matrix(monomials, m, r = None):
+    '''
+    Dense R of monomial_r_transform, R[i, j] = 1 iff x_i <= x_j <= x_i | A_i (as bit sets)
+    '''
+    x = np.asarray(monomials, dtype=np.int64)
+    deg = popcounts(m)[x] if len(x) else x
+    if r is None:
+        r = int(deg.max(initial=0))
+    need = r - deg
+    A = np.zeros(len(x), dtype=np.int64)
+    for j in range(m):
+        zero = ((x >> j) & 1 == 0) & (need > 0)
+        A |= zero.astype(np.int64) << j
+        need -= zero
+    xi, xj = x[:, None], x[None, :]
+    return (((xj & xi) == xi) & ((xj & ~(xi | A[:, None])) == 0)).astype(np.int64)
+
+def echelon_pair(A, B):
+    '''
+    Echelon rows (A', B') with distinct leading bits, A' spanning A and A' + B' spanning A + B
+    '''
+    priority = np.concatenate([np.zeros(len(A), dtype=np.int64), np.ones(len(B), dtype=np.int64)])
+    E, pivots, rows = A.vstack(B).row_reduce(priority=priority)
+    in_A = rows < len(A)
+    return E[np.flatnonzero(in_A)], E[np.flatnonzero(~in_A)]
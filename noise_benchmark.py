@@ -0,0 +1,188 @@
+#noisy Monte Carlo benchmark of the QRM encoders with stim
+#the encoder prepares |0_L> (all inputs |0>), stabilized by X and Z of the rows of Hrm(r, m) (the Hqrm checks) and by
+#the logical Z of the rows of G(r, m)\Hrm(r, m) (punctured encoders: shortened checks, punctured logicals).
+#Circuit level noise is added to the encoder, the checks are measured ideally (MPP) as detectors and the logical Z
+#as observables.
+
+import math
+import numpy as np
+import stim
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from statistics import NormalDist
+from stim_utils import tequila_to_stim
+from qrm_gates import qubit_map_array
+from rm_generators import rm_monomials
+
+BATCH_SIZE = 2**16
+METRICS = ['detected', 'logical', 'undetected_logical', 'decoded_logical']
+
+def monomial_supports(monomials, m, punctured = False):
+    #qubits of the evaluation vector of every monomial (columns c containing x), column 0 removed if punctured
+    cols = np.arange(2**m, dtype=np.int64)
+    supports = []
+    for x in np.asarray(monomials, dtype=np.int64).tolist():
+        s = np.flatnonzero((cols & x) == x)
+        supports.append(s[s > 0] - 1 if punctured else s)
+    return supports
+
+def qrm_checks(r, m, punctured = False):
+    '''
+    (X checks, Z checks, logical Z) qubit supports of QRM(r, m): the rows of Hrm(r, m) (Hqrm in (X|Z) form)
+    and the rows of G(r, m)\Hrm(r, m).
+    punctured: QRM(r, m)^* on 2^m - 1 qubits (get_QRM_punc_generator), checks of the shortened Hrm(r, m)
+    (monomials of degree 1 to m-r-1) and logicals of the punctured G(r, m)\Hrm(r, m) and all ones row
+    '''
+    if not punctured:
+        H = monomial_supports(rm_monomials(0, m-r-1, m), m)
+        L = monomial_supports(rm_monomials(m-r, r, m), m)
+        return H, H, L
+    H = monomial_supports(rm_monomials(1, m-r-1, m), m, punctured=True)
+    L = monomial_supports(np.concatenate([[0], rm_monomials(m-r, r, m)]), m, punctured=True)
+    return H, H, L
+
+def _pauli_product(pauli, qubits):
+    targets = []
+    for q in qubits:
+        targets += [stim.target_x(int(q)) if pauli == 'X' else stim.target_z(int(q)), stim.target_combiner()]
+    return targets[:-1]
+
+def syndrome_circuit(encoder_circuit, r, m, noises = [], noise_after = 'gate', checks = None, qubit_map = None):
+    '''
+    stim circuit: the encoder (QRMcircuit or tequila circuit) with noises (see stim_utils.tequila_to_stim), then
+    ideal MPP measurements of the X checks and Z checks (detectors, in this order) and of the logical Z (observables).
+    checks: (X checks, Z checks, logicals) as qubit supports, default qrm_checks(r, m)
+    qubit_map: relabels the encoder qubits and the checks, qubit q becomes qubit_map[q] (see tequila_to_stim)
+    '''
+    X, Z, L = qrm_checks(r, m) if checks is None else checks
+    qmap = None if qubit_map is None else qubit_map_array(qubit_map)
+    circuit = tequila_to_stim(encoder_circuit, noises=noises, noise_after=noise_after, qubit_map=qubit_map)
+    circuit.append('TICK')
+    for pauli, rows in [('X', X), ('Z', Z)]:
+        for row in rows:
+            circuit.append('MPP', _pauli_product(pauli, row if qmap is None else qmap[row]))
+            circuit.append('DETECTOR', [stim.target_rec(-1)])
+    for k, row in enumerate(L):
+        circuit.append('MPP', _pauli_product('Z', row if qmap is None else qmap[row]))
+        circuit.append('OBSERVABLE_INCLUDE', [stim.target_rec(-1)], k)
+    return circuit
+
+def check_deterministic(circuit):
+    '''
+    Raises ValueError unless every detector and observable of the stim circuit is deterministic without noise,
+    i.e. the checks and logicals are stabilizers of the encoded state
+    '''
+    try:
+        circuit.without_noise().detector_error_model()
+    except ValueError as e:
+        raise ValueError('Checks or logicals are not stabilizers of the encoder output: {}'.format(str(e).splitlines()[0]))
+
+def sample_batch(circuit_text, shots, seed, decoder = None):
+    '''
+    Failure counts of one batch of shots: any detector fired, any observable flipped, observable flipped without
+    detection, and (with decoder) observable flipped after decoding.
+    decoder(detectors) takes the bit-packed detector array (shots, bytes) and returns the predicted bit-packed
+    observable flips.
+    '''
+    circuit = stim.Circuit(circuit_text)
+    sampler = circuit.compile_detector_sampler(seed=seed)
+    detectors, observables = sampler.sample(shots, separate_observables=True, bit_packed=True)
+    detected = detectors.any(axis=1)
+    logical = observables.any(axis=1)
+    counts = {'shots': shots,
+              'detected': int(detected.sum()),
+              'logical': int(logical.sum()),
+              'undetected_logical': int((logical & ~detected).sum())}
+    if decoder is not None:
+        predicted = np.asarray(decoder(detectors), dtype=np.uint8).reshape(observables.shape)
+        counts['decoded_logical'] = int((predicted ^ observables).any(axis=1).sum())
+    return counts
+
+def wilson_interval(k, n, confidence = 0.95):
+    #Wilson score interval of a binomial proportion k/n
+    if n == 0:
+        return (0.0, 1.0)
+    z = NormalDist().inv_cdf(0.5 + confidence/2)
+    p = k/n
+    centre = (p + z*z/(2*n))/(1 + z*z/n)
+    half = z*math.sqrt(p*(1 - p)/n + z*z/(4*n*n))/(1 + z*z/n)
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+def _precise(counts, metric, target_rse, confidence):
+    #interval half width relative to the rate is below target_rse (needs at least one failure)
+    k, n = counts.get(metric, 0), counts['shots']
+    if k == 0:
+        return False
+    lo, hi = wilson_interval(k, n, confidence)
+    return (hi - lo)/2 <= target_rse*k/n
+
+def _summary(counts, confidence):
+    n = counts['shots']
+    result = {'shots': n, 'counts': dict(counts), 'rates': {}, 'intervals': {}}
+    for metric in METRICS:
+        if metric in counts:
+            result['rates'][metric] = counts[metric]/n if n else float('nan')
+            result['intervals'][metric] = wilson_interval(counts[metric], n, confidence)
+    return result
+
+def monte_carlo(circuit, shots = 10**6, batch_size = BATCH_SIZE, processes = None, target_rse = None,
+                metric = 'logical', decoder = None, seed = None, confidence = 0.95):
+    '''
+    Samples the stim circuit (from syndrome_circuit) in batches over a process pool (processes = 1 samples here).
+    Stops after shots, or earlier once the confidence interval of metric has half width <= target_rse * rate.
+    decoder: picklable function for sample_batch.
+    Returns {'shots', 'counts', 'rates', 'intervals'} with Wilson intervals at confidence.
+    '''
+    text = str(circuit)
+    seeds = np.random.SeedSequence(seed)
+    counts = {'shots': 0}
+    sizes = [min(batch_size, shots - a) for a in range(0, shots, batch_size)]
+
+    def add(c):
+        for k, v in c.items():
+            counts[k] = counts.get(k, 0) + v
+
+    def done():
+        return target_rse is not None and _precise(counts, metric, target_rse, confidence)
+
+    if processes == 1:
+        for size, s in zip(sizes, seeds.spawn(len(sizes))):
+            add(sample_batch(text, size, int(s.generate_state(1)[0]), decoder))
+            if done():
+                break
+        return _summary(counts, confidence)
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        batches = list(zip(sizes, seeds.spawn(len(sizes))))[::-1]
+        running = set()
+        n_workers = pool._max_workers
+        while batches or running:
+            while batches and len(running) < 2*n_workers and not done():
+                size, s = batches.pop()
+                running.add(pool.submit(sample_batch, text, size, int(s.generate_state(1)[0]), decoder))
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                add(future.result())
+            if done():
+                for future in running:
+                    future.cancel()
+                for future in running:
+                    if not future.cancelled():
+                        add(future.result())
+                break
+    return _summary(counts, confidence)
+
+def benchmark_encoder(encoder, r, m, noises, encoder_kwargs = {}, noise_after = 'gate', **kwargs):
+    '''
+    Builds encoder(r, m, circ_type='native', **encoder_kwargs) (any encoder of qrm_circuits / qrm_circuits_new),
+    adds the noises and ideal QRM(r, m) syndrome extraction and runs monte_carlo(**kwargs).
+    Encoders on 2^m - 1 qubits are measured with the checks of the punctured code (qrm_checks(punctured=True)).
+    Raises ValueError if the checks are not deterministic without noise.
+    '''
+    out = encoder(r, m, circ_type='native', **encoder_kwargs)
+    U = out[0] if isinstance(out, tuple) else out
+    checks = qrm_checks(r, m, punctured=U.n_qubits == 2**m - 1)
+    circuit = syndrome_circuit(U, r, m, noises=noises, noise_after=noise_after, checks=checks)
+    check_deterministic(circuit)
+    result = monte_carlo(circuit, **kwargs)
+    result.update(gates=len(U), depth=U.depth)
+    return result
@@ -0,0 +1,189 @@
+#search over the nested partitions argument of the recursive encoders, [i, p1, p2] picks the Plotkin-i split of
+#the 2^k qubits of a recursion node (0 <= i < k) and the partitions p1, p2 of its two halves ([] = Plotkin-0 below).
+#every candidate is built and scored whole, by depth, connectivity Ed or a user cost(circuit, n_qubits); there is no
+#per subtree scoring. the qrm_circuits.sub_encoder cache (per process) only shortens the rebuild of unchanged subtrees.
+#the only pruning is deduplication: trees are normalized before scoring and identical circuits are scored once.
+#note: the partitions relabel qubits only for the unpunctured encoders (QRM_rec_circuit, RecursiveQRM), and for the
+#punctured one depth and Ed did not change either (m <= 7), so the search pays off for costs that depend on the
+#qubit labels (a coupling map, coupling.RoutedCost).
+
+import io
+import hashlib
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from qrm_gates import CX_GATE
+from qrm_utils import connectivity
+from qrm_circuits import QRM_rec_circuit, QRM_rec_punc_circuit
+from qrm_circuits_new import RecursiveQRM
+
+#family: (encoder(r, m, partitions, **flags) -> QRMcircuit, number of qubits at m)
+FAMILIES = {
+    'rec': (lambda r, m, partitions, **flags: QRM_rec_circuit(r, m, partitions=partitions, circ_type='native', **flags)[0],
+            lambda m: 2**m),
+    'rec_punc': (lambda r, m, partitions, **flags: QRM_rec_punc_circuit(r, m, partitions=partitions, circ_type='native', **flags)[0],
+                 lambda m: 2**m - 1),
+    'RecursiveQRM': (lambda r, m, partitions, **flags: RecursiveQRM(r, m, partitions=partitions, circ_type='native')[0],
+                     lambda m: 2**m),
+}
+
+def depth_cost(circuit, n_qubits):
+    return circuit.depth
+
+def Ed_cost(circuit, n_qubits):
+    is_cx = circuit.opcodes == CX_GATE
+    return float(connectivity((circuit.controls[is_cx], circuit.targets[is_cx]), n_qubits, as_bitsets=True)[1])
+
+def depth_Ed_cost(circuit, n_qubits):
+    #depth, then Ed
+    return (depth_cost(circuit, n_qubits), Ed_cost(circuit, n_qubits))
+
+COSTS = {'depth': depth_cost, 'Ed': Ed_cost, 'depth_Ed': depth_Ed_cost}
+
+### partition trees
+
+def normalize(partitions):
+    '''
+    Equivalent partitions with every all Plotkin-0 subtree written as []
+    '''
+    if not partitions:
+        return []
+    p1 = normalize(partitions[1]) if len(partitions) > 1 else []
+    p2 = normalize(partitions[2]) if len(partitions) > 2 else []
+    if partitions[0] == 0 and p1 == [] and p2 == []:
+        return []
+    return [partitions[0], p1, p2]
+
+def full_tree(m, levels, partitions = []):
+    #explicit tree of the top levels (missing entries Plotkin-0), so every searched node has a path
+    if levels == 0 or m <= 1:
+        return normalize(partitions)
+    p = list(partitions) + [0, [], []][len(partitions):]
+    return [p[0], full_tree(m-1, levels-1, p[1]), full_tree(m-1, levels-1, p[2])]
+
+def tree_nodes(m, levels):
+    '''
+    (path, size exponent k) of the nodes of the top levels, root first, path = [1 or 2, ...] child indices
+    '''
+    nodes = [([], m)]
+    for path, k in nodes:
+        if len(path) + 1 < levels and k > 2:
+            nodes += [(path + [1], k-1), (path + [2], k-1)]
+    return nodes
+
+def replace(tree, path, choice):
+    #copy of tree with the split at path set to choice
+    if not path:
+        return [choice] + [list(t) for t in tree[1:]]
+    tree = list(tree)
+    tree[path[0]] = replace(tree[path[0]], path[1:], choice)
+    return tree
+
+def all_trees(m, levels):
+    #every normalized tree of the top levels
+    if levels == 0 or m <= 1:
+        return [[]]
+    subtrees = all_trees(m-1, levels-1)
+    trees = [normalize([i, a, b]) for i in range(m) for a in subtrees for b in subtrees]
+    return [list(t) for t in {repr(t): t for t in trees}.values()]
+
+def count_trees(m, levels):
+    if levels == 0 or m <= 1:
+        return 1
+    return m*count_trees(m-1, levels-1)**2
+
+### scoring
+
+def fingerprint(circuit):
+    h = hashlib.blake2b(digest_size=16)
+    for a in [circuit.opcodes, circuit.controls, circuit.targets]:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+#cost per (circuit fingerprint, cost function) in this process, candidates with an identical circuit are scored once
+_COST_CACHE = {}
+
+def evaluate(job):
+    '''
+    (cost, fingerprint) of the candidate job = (family, r, m, partitions, cost function, flags)
+    '''
+    family, r, m, partitions, cost, flags = job
+    encoder, n_qubits = FAMILIES[family]
+    with contextlib.redirect_stdout(io.StringIO()):
+        U = encoder(r, m, partitions, **flags)
+    fp = fingerprint(U)
+    key = (fp, cost, m)
+    if key not in _COST_CACHE:
+        _COST_CACHE[key] = cost(U, n_qubits(m))
+    return _COST_CACHE[key], fp
+
+class _Scorer:
+    #scores candidate trees once each (by normalized tree), in a process pool or in this process
+    def __init__(self, family, r, m, cost, flags, processes):
+        self.job = (family, r, m)
+        self.cost, self.flags = cost, flags
+        self.pool = None if processes == 1 else ProcessPoolExecutor(max_workers=processes)
+        self.scores = {}
+        self.circuits = {} #fingerprint -> cost
+        self.evaluated = 0
+
+    def __call__(self, trees):
+        todo = [t for t in {repr(normalize(t)): normalize(t) for t in trees}.values() if repr(t) not in self.scores]
+        jobs = [self.job + (t, self.cost, self.flags) for t in todo]
+        results = self.pool.map(evaluate, jobs, chunksize=max(1, len(jobs)//32)) if self.pool else map(evaluate, jobs)
+        for t, (score, fp) in zip(todo, results):
+            self.evaluated += 1
+            self.circuits.setdefault(fp, score)
+            self.scores[repr(t)] = score
+        return [self.scores[repr(normalize(t))] for t in trees]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        _COST_CACHE.clear()
+
+def optimize_partitions(family, r, m, cost = 'depth', levels = None, sweeps = 3, processes = 1,
+                        exhaustive_limit = 512, start = [], flags = {}, verbose = False):
+    '''
+    Best partitions argument of the encoder family ('rec', 'rec_punc', 'RecursiveQRM') at (r, m) for cost
+    ('depth', 'Ed', 'depth_Ed' or a picklable cost(circuit, n_qubits), lower is better).
+    The splits of the top levels recursion levels are searched (default all), exhaustively if there are at most
+    exhaustive_limit trees, otherwise by sweeps of coordinate descent from start (one node at a time, all choices
+    of a node scored together, in parallel with processes > 1).
+    Returns (partitions, cost, {'evaluated', 'distinct_circuits', 'default_cost'}), ties keep the earlier tree.
+    '''
+    if family not in FAMILIES:
+        raise ValueError('Unknown family {}, one of {}'.format(family, list(FAMILIES)))
+    cost = COSTS.get(cost, cost)
+    if levels is None:
+        levels = m
+    score = _Scorer(family, r, m, cost, flags, processes)
+    try:
+        default = score([[]])[0]
+        best, best_cost = normalize(start), score([start])[0]
+        if count_trees(m, levels) <= exhaustive_limit:
+            trees = all_trees(m, levels)
+            costs = score(trees)
+            for t, c in zip(trees, costs):
+                if c < best_cost:
+                    best, best_cost = t, c
+        else:
+            tree = full_tree(m, levels, best)
+            for sweep in range(sweeps):
+                improved = False
+                for path, k in tree_nodes(m, levels):
+                    candidates = [replace(tree, path, i) for i in range(k)]
+                    costs = score(candidates)
+                    i = min(range(k), key=lambda j: costs[j])
+                    if costs[i] < best_cost:
+                        tree, best_cost, improved = candidates[i], costs[i], True
+                if verbose:
+                    print('sweep {}: cost {}, {} trees scored'.format(sweep, best_cost, score.evaluated))
+                if not improved:
+                    break
+            best = normalize(tree)
+        stats = {'evaluated': score.evaluated, 'distinct_circuits': len(score.circuits), 'default_cost': default}
+    finally:
+        score.close()
+    return best, best_cost, stats
@@ -1,100 +1,194 @@
+import types
+from collections.abc import Mapping
+import numpy as np
 from tequila import QCircuit
+from qrm_gates import QRMcircuit
 
 class Permutation:
     """
     Class to describe permutations.
 
-    Stored as dictionaries, with values indicating the positions that the keys are permuted to
+    Stored as an int32 array, with perm[k] the position that key k is permuted to.
+    Keys not in the permutation hold -1, so partial permutations (on a subset of qubits) are allowed.
+    The dict-style interface (mapping, keys, values, items, add_entry) is kept, in increasing key order
+    rather than insertion order. mapping is a read-only copy: change entries with add_entry or by assigning
+    P.mapping = {...}.
 
     """
     def __init__(self, mapping):
-        self._mapping = mapping
+        if isinstance(mapping, Mapping):
+            keys = np.fromiter(mapping.keys(), dtype=np.int64, count=len(mapping))
+            values = np.fromiter(mapping.values(), dtype=np.int64, count=len(mapping))
+            self._perm = np.full(keys.max() + 1 if len(keys) else 0, -1, dtype=np.int32)
+            self._perm[keys] = values
+        else:
+            self._perm = np.array(mapping, dtype=np.int32).reshape(-1)
+        self._inverse = None
         return
-    
+
     @classmethod
     def init_from_vector(cls, vec):
-        mapping = {i: vec[i] for i in range(len(vec))}
-        return Permutation(mapping)
-    
+        return Permutation(np.asarray(vec, dtype=np.int32))
+
+    @property
+    def array(self):
+        """
+        Read-only view of the underlying array, -1 for keys not in the permutation
+        """
+        a = self._perm.view()
+        a.flags.writeable = False
+        return a
+
+    def _dict(self):
+        keys = self.key_array()
+        return dict(zip(keys.tolist(), self._perm[keys].tolist()))
+
     @property
     def mapping(self):
-        return self._mapping
-    
+        """
+        Read-only {key: value} view in key order, rebuilt on every access
+        """
+        return types.MappingProxyType(self._dict())
+
     @mapping.setter
     def mapping(self, mapping):
-        self._mapping = mapping
-    
+        self.__init__(mapping)
+
     def get_matrix(self):
-        P = np.zeros((1, 1))
+        #P[v, k] = 1 for k -> v
+        n = max(len(self._perm), int(self._perm.max(initial=-1)) + 1)
+        P = np.zeros((n, n), dtype=int)
+        keys = self.key_array()
+        P[self._perm[keys], keys] = 1
         return P
-    
+
+    def key_array(self):
+        return np.flatnonzero(self._perm >= 0)
+
+    def value_array(self):
+        return self._perm[self._perm >= 0]
+
+    def inverse_array(self):
+        """
+        inv[v] = k for k -> v, -1 for positions not in the values
+        """
+        if self._inverse is None:
+            keys = self.key_array()
+            values = self._perm[keys]
+            inv = np.full(int(values.max(initial=-1)) + 1, -1, dtype=np.int32)
+            inv[values[::-1]] = keys[::-1] #first key wins on repeated values, as list.index
+            self._inverse = inv
+        return self._inverse
+
     def permute(self, i):
-        return self.mapping[i]
-    
+        if i < 0 or i >= len(self._perm) or self._perm[i] < 0:
+            raise KeyError(i)
+        return int(self._perm[i])
+
     def inv_permute(self, i):
-        return list(self.keys())[list(self.values()).index(i)]
-    
+        inv = self.inverse_array()
+        if i < 0 or i >= len(inv) or inv[i] < 0:
+            raise ValueError('{} is not in the permutation values'.format(i))
+        return int(inv[i])
+
     def get_inverse(self):
-        return Permutation({v: k for k, v in zip(self.keys(), self.values())})
-    
+        return Permutation(self.inverse_array().copy())
+
     def keys(self):
-        return self.mapping.keys()
-    
+        return self.key_array().tolist()
+
     def values(self):
-        return self.mapping.values()
-    
+        return self.value_array().tolist()
+
+    def items(self):
+        return zip(self.keys(), self.values())
+
+    def __len__(self):
+        return int(np.count_nonzero(self._perm >= 0))
+
+    def _resize(self, n):
+        if n > len(self._perm):
+            self._perm = np.concatenate([self._perm, np.full(n - len(self._perm), -1, dtype=np.int32)])
+
     def add_entry(self, k, v):
-        self.mapping[k] = v
+        self._resize(k + 1)
+        self._perm[k] = v
+        self._inverse = None
         return
-    
+
     def __repr__(self) -> str:
         string = "Qubit permutation defined by"
-        for k, v in zip(self.keys(), self.values()):
+        for k, v in self.items():
             string += '\n' + str(k) + ' -> ' + str(v)
         return string
-    
+
     def __add__(self, other):
         """
         Adds the permutations by combining the keys and values
         """
-        new_mapping = dict(self.mapping)
-        new_mapping.update(other.mapping)
-        return Permutation(new_mapping)
-    
+        new_perm = np.full(max(len(self._perm), len(other._perm)), -1, dtype=np.int32)
+        new_perm[:len(self._perm)] = self._perm
+        keys = other.key_array()
+        new_perm[keys] = other._perm[keys]
+        return Permutation(new_perm)
+
     def __mul__(self, other):
         """
         Combines permutations as self[other[.]]
         """
-        new_mapping = dict(other.mapping)
-        new_mapping = {k: self.permute(v) for k, v in zip(new_mapping.keys(), new_mapping.values())}
-        return Permutation(new_mapping)
-    
+        keys = other.key_array()
+        new_perm = np.full(len(other._perm), -1, dtype=np.int32)
+        new_perm[keys] = self._apply(other._perm[keys])
+        return Permutation(new_perm)
+
+    def _apply(self, keys):
+        #vectorized permute, raises KeyError on keys not in the permutation
+        keys = np.asarray(keys)
+        if len(keys) == 0:
+            return keys.astype(np.int32)
+        out_of_range = (keys < 0) | (keys >= len(self._perm))
+        if out_of_range.any():
+            raise KeyError(int(keys[out_of_range][0]))
+        values = self._perm[keys]
+        if (values < 0).any():
+            raise KeyError(int(keys[values < 0][0]))
+        return values
+
     def permute_circuit(self, circuit):
         """
         Returns circuit with permuted qubits
 
         P^{-1} C P
 
-        When written as unitaries: U_p U_c U_p^\dagger 
+        When written as unitaries: U_p U_c U_p^\\dagger
         """
         if isinstance(circuit, QCircuit):
-            return circuit.map_qubits(self.mapping)
+            return circuit.map_qubits(self._dict())
+        elif isinstance(circuit, QRMcircuit):
+            return circuit.map_qubits(self._perm)
         else:
-            raise "Unsupported circuit type!"
+            raise TypeError("Unsupported circuit type!")
         return
-    
+
     def fill(self, qubit_list):
-        ukeys, uvalues = [], []
-        for q in qubit_list:
-            if q not in self.keys():
-                ukeys.append(q)
-            if q not in self.values():
-                uvalues.append(q)
-        
-        ukeys = sorted(ukeys)
-        uvalues = sorted(uvalues)
-        for k, v in zip(ukeys, uvalues):
-            self.add_entry(k, v)
+        """
+        Maps the qubits of qubit_list that are not keys to those that are not values, in sorted order
+        """
+        ql = np.asarray(qubit_list, dtype=np.int64)
+        is_key = ql < len(self._perm)
+        is_key[is_key] = self._perm[ql[is_key]] >= 0
+        inv = self.inverse_array()
+        is_value = ql < len(inv)
+        is_value[is_value] = inv[ql[is_value]] >= 0
+
+        ukeys = np.sort(ql[~is_key])
+        uvalues = np.sort(ql[~is_value])
+        n = min(len(ukeys), len(uvalues))
+        if n == 0:
+            return
+        self._resize(int(ukeys[:n].max()) + 1)
+        self._perm[ukeys[:n]] = uvalues[:n]
+        self._inverse = None
         return
 
 def concatenate_permutations(perm_list, vec_list):
@@ -102,11 +196,19 @@ def concatenate_permutations(perm_list, vec_list):
     Concatenate disjoint permutations laterally in perm_list
     on qubits specified by vectors in qubit_vec_list
     """
-    new_dict = {}
+    keys, values = [], []
     for perm, vec in zip(perm_list, vec_list):
-        for k, v  in zip(perm.keys(), perm.values()):
-            new_dict[vec[k]] = vec[v]
-    return Permutation(new_dict)
+        vec = np.asarray(vec, dtype=np.int64)
+        k = perm.key_array()
+        keys.append(vec[k])
+        values.append(vec[perm._perm[k]])
+    if len(keys) == 0:
+        return Permutation({})
+    keys = np.concatenate(keys)
+    values = np.concatenate(values)
+    new_perm = np.full(int(keys.max(initial=-1)) + 1, -1, dtype=np.int32)
+    new_perm[keys] = values
+    return Permutation(new_perm)
 
 def combine_permutations(perm_list):
     """
@@ -114,24 +216,19 @@ def combine_permutations(perm_list):
     perm_list = [perm1, perm2, perm3], then
     return Permutation({i: perm3[perm2[perm1[i]]]})
     """
-    support = sorted(list(perm_list[0].keys()))
-    new_dict = {i: i for i in support}
+    support = perm_list[0].key_array()
+    values = support
     for perm in perm_list:
-        new_dict = {k: perm.permute(v) for k, v in zip(new_dict.keys(), new_dict.values())}
-    return Permutation(new_dict)
+        values = perm._apply(values)
+    new_perm = np.full(len(perm_list[0]._perm), -1, dtype=np.int32)
+    new_perm[support] = values
+    return Permutation(new_perm)
 
 def fill_permutation(perm):
     """
     Completes a permutation by adding empty elements upto max element
 
     """
-    n_qubits = len(perm.keys())
-    n_max = max(list(perm.keys()) + list(perm.values())) + 1
-    extra_keys = [i for i in range(n_max) if i not in perm.keys()]
-    extra_values = [i for i in range(n_max) if i not in perm.values()]
-    
-    mapping = perm.mapping
-    for k, v in zip(extra_keys, extra_values):
-        mapping[k] = v
-    
-    return mapping
\ No newline at end of file
+    n_max = max(int(perm.key_array().max(initial=-1)), int(perm._perm.max(initial=-1))) + 1
+    perm.fill(np.arange(n_max))
+    return perm._dict()
@@ -6,121 +6,93 @@ import stim
 from qrm_utils import *
 from qrm_matrices import *
 from stim_utils import stim_CNOT_list, stim_H_list, tequila_to_stim
+from qrm_gates import QRMcircuit
+from gf2 import GF2Matrix, monomial_r_transform, echelon_pair
+from rm_generators import pack_monomial_rows
+from permutations import Permutation, concatenate_permutations
+from functools import lru_cache
 
 ### normal constructions
 
-def canonical_CSS(G, n_qubits, qubit_list = None, only_cnots = False):
+def canonical_CSS(G, n_qubits, qubit_list = None, only_cnots = False, circ_type = 'tequila'):
     '''
     qubit_list is the qubit map. 
     Eg: qubit_list = [2, 3, 5, 6] - the circuits will be over these 4 qubits only
+    G = (Gperp, G1q), dense rows or gf2.GF2Matrix, with distinct leading bits
+    circ_type: 'tequila', 'qiskit', 'stim' or 'native' (QRMcircuit)
     '''
-    Gperp, G1q = G
+    Gperp, G1q = [g if isinstance(g, GF2Matrix) else GF2Matrix.from_dense(g, n_cols=n_qubits) for g in G]
     if qubit_list != None:
         if len(qubit_list) != n_qubits:
             print('Insufficient qubits provided.')
             return
     else:
         qubit_list = list(range(n_qubits))
-    circuit = tequila.QCircuit() #qubit indices?
+    qubit_list = np.asarray(qubit_list)
+    circuit = QRMcircuit() #qubit indices?
     #returns circuit and message qubit indexes
     cnots = []
     ent_qubits = []
     msg_qubit = []
-    for row in Gperp:
-        i = leading_bit_index(row)
-        ent_qubits.append(qubit_list[i])
-        if not only_cnots:
-            circuit += tequila.gates.H(target = qubit_list[i])
-        targets = [qubit_list[j] for j in get_indexes(row)][1:]
-        cnots.append([i, tequila.gates.CX(control = qubit_list[i], target = targets)])
-    
-    for row in G1q:
-        i = leading_bit_index(row)
-        msg_qubit.append(qubit_list[i])
-        targets = [qubit_list[j] for j in get_indexes(row)][1:]
-        cnots.append([i, tequila.gates.CX(control = qubit_list[i], target = targets)])
+    for rows, qubits in [(Gperp, ent_qubits), (G1q, msg_qubit)]:
+        leads = rows.leading_bits()
+        for i, support in zip(leads.tolist(), rows.supports()):
+            if i < 0:
+                i = n_qubits - 1
+            qubits.append(int(qubit_list[i]))
+            if qubits is ent_qubits and not only_cnots:
+                circuit.H(target = qubit_list[i])
+            cnots.append([i, qubit_list[i], qubit_list[support[1:]]])
     
     sorted_cnots = sorted(cnots, key=lambda a: a[0], reverse=True)
     for c in sorted_cnots:
-        circuit += c[1]
-    return circuit, (msg_qubit, ent_qubits)
+        circuit.CX(control = c[1], target = c[2])
+    return circuit.get_circuit(circ_type), (msg_qubit, ent_qubits)
 
-def QRM_std_circuit(r, m, qubit_list = None, transform_rows = True, only_cnots = False):
+def std_generators(r, m, transform_rows = True, punctured = False):
+    '''
+    (Gperp, G1q) of QRM(r, m) as GF2Matrix, rows transformed by R (weight 2^{m-r} rows, see get_R) if transform_rows.
+    punctured moves the all ones row to G1q (as get_QRM_punc_generator) and removes position 0.
+    '''
+    Gperp, G1q = rm_monomials(0, m-r-1, m), rm_monomials(m-r, r, m)
+    if punctured:
+        Gperp, G1q = Gperp[1:], np.concatenate([Gperp[:1], G1q])
+    Gs = []
+    for monomials in [Gperp, G1q]:
+        if transform_rows and len(monomials):
+            G = monomial_r_transform(monomials, m)
+        else:
+            G = GF2Matrix(pack_monomial_rows(monomials, m), 1 << m)
+        Gs.append(G.puncture([0]) if punctured else G)
+    return tuple(Gs)
+
+def QRM_std_circuit(r, m, qubit_list = None, transform_rows = True, only_cnots = False, circ_type = 'tequila'):
     '''
     set transform_rows = False for Naive encoder.
     '''
-    def R_G(G):
-        if len(G) == 0:
-            return G
-        R = get_R(G)
-        return np.einsum('ap, pb', R, G) % 2
-    params = (r, m)
-    Gs = get_QRM_generator(params, params)
-    Gperpnew = R_G(Gs[0])
-    G1qnew = R_G(Gs[1])
-    if transform_rows:
-        Gsnew = (Gperpnew, G1qnew)
-    else:
-        Gsnew = Gs
-    circuit, qubit_info = canonical_CSS(Gsnew, n_qubits = 2**m, only_cnots = only_cnots, qubit_list=qubit_list)
+    if m - r - 1 > r:
+        print('Incompatible code parameters r1, r2: {}, {}'.format(r, r))
+        return
+    Gsnew = std_generators(r, m, transform_rows=transform_rows)
+    circuit, qubit_info = canonical_CSS(Gsnew, n_qubits = 2**m, only_cnots = only_cnots, qubit_list=qubit_list, circ_type=circ_type)
     return circuit, qubit_info
 
-def QRM_punc_std_circuit(r, m, qubit_list = None, transform_rows = True, only_cnots = False):
+def QRM_punc_std_circuit(r, m, qubit_list = None, transform_rows = True, only_cnots = False, circ_type = 'tequila'):
     '''
-    set transform_rows = False for Naive encoder. #INCOMPLETE RIGHT NOW
+    Encoder of the punctured QRM(r, m)^* on 2^m - 1 qubits, set transform_rows = False for Naive encoder.
+
+    The generators of QRM(r, m) are punctured at position 0, with the all ones row moved from Gperp to G1q
+    (as get_QRM_punc_generator), and brought to distinct leading bits by gf2.echelon_pair.
     '''
-    def R_Gs(Gl):
-        
-        if len(G) == 0:
-            return G
-        R = get_R_punc(G)
-        return np.einsum('ap, pb', R, G) % 2
-    params = (r, m)
-    Gs = get_QRM_punc_generator(params, params)
-    Gs_transformed = R_Gs(Gs)
-    if transform_rows:
-        Gsnew = Gs_transformed
-    else:
-        Gsnew = Gs
-    circuit, qubit_info = canonical_CSS(Gsnew, n_qubits = 2**m, only_cnots = only_cnots, qubit_list=qubit_list)
+    if m - r - 1 > r or r >= m:
+        print('Invalid Parameters r, m: {}, {}\nRequire r < m'.format(r, m))
+        return
+    Gsnew = echelon_pair(*std_generators(r, m, transform_rows=transform_rows, punctured=True))
+    circuit, qubit_info = canonical_CSS(Gsnew, n_qubits = 2**m - 1, only_cnots = only_cnots, qubit_list=qubit_list, circ_type=circ_type)
     return circuit, qubit_info
 
 ### recursive constructions
 
-class QRMcircuit:
-    '''
-    Circuit object for recursive QRM encoders, complete when required!
-    '''
-    def __init__(self):
-        self.circuit = tequila.QCircuit()
-    
-    def CX(self, control=[], target=[]):
-        self.circuit += tequila.gates.CX(control=control, target=target)
-    
-    def H(self, target=[]):
-        self.circuit += tequila.gates.H(target=target)
-    
-    def get_circuit(self, circ_type ='tequila'):
-        if circ_type == 'tequila':
-            return self.circuit
-        elif circ_type == 'stim':
-            return tequila_to_stim(self.circuit)
-    
-    @property
-    def depth(self):
-        return self.circuit.depth
-    
-    @property
-    def gate_count(self):
-        return len(self.circuit.gates)
-    
-    def __add__(self, other):
-        result_circuit = self.circuit + other.circuit
-        return QRMcircuit(result_circuit)
-    
-    def __repr__(self) -> str:
-        return self.circuit.__repr__()
-
 def get_qubit_partition(m, qubit_list = None, partitions = []):
     if qubit_list == None:
         qubit_list = list(range(2**m))
@@ -159,20 +131,68 @@ def get_punc_qubit_partition(m, qubit_list=None, partitions=[], punc_bit_list=[0
         p1, p2 = [], []
     return ql_1, ql_2, p1, p2
 
-def add_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, pos_dict2 = None, only_cnots = True):
+#sub-encoders of the recursion branches are built once on the canonical qubits range(2^m) and relabelled
+MEMOIZE_SUB_ENCODERS = True
+SUB_ENCODER_CACHE_SIZE = 512
+
+def freeze_partitions(partitions):
+    #nested partition lists as nested tuples (hashable)
+    if isinstance(partitions, (list, tuple)):
+        return tuple(freeze_partitions(p) for p in partitions)
+    return int(partitions)
+
+def thaw_partitions(partitions):
+    if isinstance(partitions, tuple):
+        return [thaw_partitions(p) for p in partitions]
+    return partitions
+
+@lru_cache(maxsize=SUB_ENCODER_CACHE_SIZE)
+def canonical_sub_encoder(function, args, partitions, flags):
+    return function(*args, partitions=thaw_partitions(partitions), circ_type='native', **dict(flags))
+
+def sub_encoder(function, qubit_list, *args, partitions = [], qubit_arg = 'qubit_list', **flags):
+    '''
+    function(*args, partitions=partitions, qubit_arg=qubit_list, circ_type='native', **flags) for a recursion branch.
+
+    Each distinct (function, args, partitions, flags) is built once on the canonical qubits and every occurrence
+    is relabelled through the index array qubit_list: circuit qubit q -> qubit_list[q], a Permutation P by
+    concatenate_permutations, position dicts and MonomialIndex are label independent and returned as built.
+    Permutation.fill sorts the qubit labels, so only increasing qubit lists (as from get_qubit_partition)
+    are relabelled, others are built directly.
+    '''
+    ql = np.asarray(qubit_list, dtype=np.int64)
+    if not MEMOIZE_SUB_ENCODERS or (np.diff(ql) <= 0).any():
+        return function(*args, partitions=partitions, circ_type='native', **{qubit_arg: qubit_list}, **flags)
+
+    out = canonical_sub_encoder(function, args, freeze_partitions(partitions), tuple(sorted(flags.items())))
+    relabelled = []
+    for o in out:
+        if isinstance(o, QRMcircuit):
+            o = o.map_qubits(ql)
+        elif isinstance(o, Permutation):
+            o = concatenate_permutations([o], [ql])
+        elif isinstance(o, dict):
+            o = dict(o)
+        relabelled.append(o)
+    return tuple(relabelled)
+
+def clear_sub_encoder_cache():
+    canonical_sub_encoder.cache_clear()
+
+def add_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, pos_dict2 = None, only_cnots = True, circ_type = 'tequila'):
     '''
     Add entanglers from ql_1 to ql_2 depending on leading bits of Gm(r1, r2, m). Set only_cnots = False for Hadamard gates on the first set
     ql_1, ql_2 of length 2**m
     '''
-    U = tequila.QCircuit()
+    U = QRMcircuit()
     
     if ql_1 == None:
         ql_1 = list(range(2**m))
     if ql_2 == None:
         ql_2 = list(range(2**m, 2**(m+1)))
     
-    Gm = get_QRM_generators_r1r2(r1, r2, m)
-    lbs = [leading_bit_index(row) for row in Gm]
+    lbs = get_leading_bits_r1r2(r1, r2, m)
+    lb1, lb2 = lbs, lbs
     if pos_dict1 is not None:
         lb1 = get_dict_values(pos_dict1, keys = lbs)
     if pos_dict2 is not None:
@@ -181,13 +201,12 @@ def add_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, pos_di
     qm1 = [ql_1[i] for i in lb1]
     qm2 = [ql_2[i] for i in lb2]
     if not only_cnots:
-        U += tequila.gates.H(target=qm1)
-    for a, b in zip(qm1, qm2):
-        U += tequila.gates.CX(control=a, target=b)
+        U.H(target=qm1)
+    U.CX_layer(qm1, qm2)
     
-    return U
+    return U.get_circuit(circ_type)
 
-def add_punc_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, pos_dict2 = None, only_cnots = True, puncture_Gp = False):
+def add_punc_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, pos_dict2 = None, only_cnots = True, puncture_Gp = False, circ_type = 'tequila'):
     '''
     Add entanglers for punctured codes
     Currently defaulted to first bit
@@ -197,7 +216,7 @@ def add_punc_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, p
     puncture_Gp: to determine control indexes from punctured/unpunctured generator. Set False if index position already punctured.
     
     '''
-    U = tequila.QCircuit()
+    U = QRMcircuit()
 
     if ql_1 == None:
         ql_1 = list(range((2**m) - 1))
@@ -210,14 +229,12 @@ def add_punc_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, p
         print('Invalid parameter r1: {}'.format(r1))
         return
     
-    Gm = get_QRM_generators_r1r2(r1, r2, m)
+    lb2 = get_leading_bits_r1r2(r1, r2, m)
     if puncture_Gp:
-        Gp = puncture_matrix(Gm, remove_ind=[0])
+        #dropping column 0 shifts leading bits down by one, Eval(1) keeps leading bit 0
+        lb1 = [max(i - 1, 0) for i in lb2]
     else:
-        Gp = Gm
-    
-    lb1 = [leading_bit_index(row) for row in Gp]
-    lb2 = [leading_bit_index(row) for row in Gm]
+        lb1 = list(lb2)
     if pos_dict1 is not None:
         lb1 = get_dict_values(pos_dict1, keys = lb1)
     if pos_dict2 is not None:
@@ -226,87 +243,87 @@ def add_punc_entanglers(r1, r2, m, ql_1 = None, ql_2 = None, pos_dict1 = None, p
     qm1 = [ql_1[i] for i in lb1]
     qm2 = [ql_2[i] for i in lb2]
     if not only_cnots:
-        U += tequila.gates.H(target=qm1)
-    for a, b in zip(qm1, qm2):
-        U += tequila.gates.CX(control=a, target=b)
+        U.H(target=qm1)
+    U.CX_layer(qm1, qm2)
     
-    return U
+    return U.get_circuit(circ_type)
 
-def add_hadamards(r1, r2, m, qubit_list = None, pos_dict = None):
+def add_hadamards(r1, r2, m, qubit_list = None, pos_dict = None, circ_type = 'tequila'):
     if qubit_list == None:
         qubit_list = list(range(2**m))
 
-    Gm = get_QRM_generators_r1r2(r1, r2, m)
-    lbs = [leading_bit_index(row) for row in Gm]
+    lbs = get_leading_bits_r1r2(r1, r2, m)
     if pos_dict is not None:
         lbs = [pos_dict[i] for i in lbs]
     
     qm = [qubit_list[i] for i in lbs]
-    return tequila.gates.H(target=qm)
+    U = QRMcircuit()
+    U.H(target=qm)
+    return U.get_circuit(circ_type)
 
 
-def QRM_rec_classical_circuit(r, m, partitions = [], qubit_list = None):
-    U = tequila.QCircuit()
+def QRM_rec_classical_circuit(r, m, partitions = [], qubit_list = None, circ_type = 'tequila'):
+    U = QRMcircuit()
 
     if m == 0 or r == -1:
-        return U, {0 : 0}
+        return U.get_circuit(circ_type), {0 : 0}
 
     if r > m or m < 0 or r < -1:
         print('Invalid parameters r, m : {}, {}'.format(r, m))
-        return U, None
+        return U.get_circuit(circ_type), None
     
     
     ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
 
     if r == m:
-        U1, position_dict1 = QRM_rec_classical_circuit(r-1, m-1, partitions=p1, qubit_list=ql_1)
-        U2, position_dict2 = QRM_rec_classical_circuit(r-1, m-1, partitions=p2, qubit_list=ql_2)
+        U1, position_dict1 = sub_encoder(QRM_rec_classical_circuit, ql_1, r-1, m-1, partitions=p1)
+        U2, position_dict2 = sub_encoder(QRM_rec_classical_circuit, ql_2, r-1, m-1, partitions=p2)
 
-        U += add_entanglers(0, r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True)
+        U += add_entanglers(0, r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True, circ_type='native')
         U = U + U1 + U2
 
         position_dict2 = add_key_value_dict(position_dict2, 2**(m-1), len(position_dict1.keys()))
         position_dict_new = add_dict(position_dict1, position_dict2)
-        return U, position_dict_new
+        return U.get_circuit(circ_type), position_dict_new
         
-    U1, position_dict1 = QRM_rec_classical_circuit(r, m-1, partitions=p1, qubit_list=ql_1)
-    U2, position_dict2 = QRM_rec_classical_circuit(r, m-1, partitions=p2, qubit_list=ql_2)
+    U1, position_dict1 = sub_encoder(QRM_rec_classical_circuit, ql_1, r, m-1, partitions=p1)
+    U2, position_dict2 = sub_encoder(QRM_rec_classical_circuit, ql_2, r, m-1, partitions=p2)
     
-    U += add_entanglers(0, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True)
+    U += add_entanglers(0, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True, circ_type='native')
     U += U1
     U += U2
 
     position_dict2 = add_key_value_dict(position_dict2, 2**(m-1), len(position_dict1.keys()))
     position_dict_new = add_dict(position_dict1, position_dict2)
 
-    return U, position_dict_new 
+    return U.get_circuit(circ_type), position_dict_new 
 
-def QRM_rec_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False, classical=False):
+def QRM_rec_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False, classical=False, circ_type = 'tequila'):
     if classical:
-        return QRM_rec_classical_circuit(r, m, partitions=partitions, qubit_list=qubit_list)
+        return QRM_rec_classical_circuit(r, m, partitions=partitions, qubit_list=qubit_list, circ_type=circ_type)
 
-    U = tequila.QCircuit()
+    U = QRMcircuit()
     if m == 0:
-        return U, {0 : 0}
+        return U.get_circuit(circ_type), {0 : 0}
     
     if r > m or r < m-r-1:
         print('Invalid parameters r, m : {}, {}'.format(r, m))
-        return U, None
+        return U.get_circuit(circ_type), None
     
     if r == m:
-        return QRM_rec_classical_circuit(r, m, partitions=partitions, qubit_list=qubit_list)
+        return QRM_rec_classical_circuit(r, m, partitions=partitions, qubit_list=qubit_list, circ_type=circ_type)
     
     ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
 
-    U1, position_dict1 = QRM_rec_circuit(r, m-1, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots)
-    U2, position_dict2 = QRM_rec_circuit(r, m-1, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots)
+    U1, position_dict1 = sub_encoder(QRM_rec_circuit, ql_1, r, m-1, partitions=p1, only_cnots=only_cnots)
+    U2, position_dict2 = sub_encoder(QRM_rec_circuit, ql_2, r, m-1, partitions=p2, only_cnots=only_cnots)
 
     if r > m-r-1:
         #add message ents
-        U += add_entanglers(m-r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True)
+        U += add_entanglers(m-r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True, circ_type='native')
     
     #add entanglers
-    U += add_entanglers(m-r-1, m-r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots)
+    U += add_entanglers(m-r-1, m-r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots, circ_type='native')
 
     U += U1
     U += U2
@@ -314,39 +331,39 @@ def QRM_rec_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False
     position_dict2 = add_key_value_dict(position_dict2, to_add_key=2**(m-1), to_add_value=len(position_dict1.keys()))
     position_dict_new = add_dict(position_dict1, position_dict2)
 
-    return U, position_dict_new
+    return U.get_circuit(circ_type), position_dict_new
 
-def QRM_rec_assym_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None, only_cnots = False):
-    U = tequila.QCircuit()
+def QRM_rec_assym_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None, only_cnots = False, circ_type = 'tequila'):
+    U = QRMcircuit()
     
     if m == 0:
-        return U, {0: 0}
+        return U.get_circuit(circ_type), {0: 0}
     
     if r > m or r < -1:
         print('Invalid parameters r, m : {}, {}'.format(r, m))
-        return U, None
+        return U.get_circuit(circ_type), None
     
     if 2*r_in + 1 <= m_in:
         if r == -1:
-            return QRM_rec_classical_circuit(r_in, m, partitions=partitions, qubit_list=qubit_list)  
+            return QRM_rec_classical_circuit(r_in, m, partitions=partitions, qubit_list=qubit_list, circ_type=circ_type)
     if 2*r_in + 1 > m_in:
         if m == r_in:
             if not only_cnots:
-                U += add_hadamards(0, 2*r_in - m_in, m, qubit_list=qubit_list)
-            Uc, position_dict = QRM_rec_classical_circuit(r_in, r_in, partitions=partitions, qubit_list=qubit_list)
-            return U + Uc, position_dict
+                U += add_hadamards(0, 2*r_in - m_in, m, qubit_list=qubit_list, circ_type='native')
+            Uc, position_dict = QRM_rec_classical_circuit(r_in, r_in, partitions=partitions, qubit_list=qubit_list, circ_type='native')
+            return (U + Uc).get_circuit(circ_type), position_dict
     
     ql_1, ql_2, p1, p2 = get_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
     
-    U1, position_dict1 = QRM_rec_assym_circuit(r-1, m-1, r_in, m_in, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots)
-    U2, position_dict2 = QRM_rec_assym_circuit(r-1, m-1, r_in, m_in, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots)
+    U1, position_dict1 = QRM_rec_assym_circuit(r-1, m-1, r_in, m_in, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots, circ_type='native')
+    U2, position_dict2 = QRM_rec_assym_circuit(r-1, m-1, r_in, m_in, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots, circ_type='native')
 
     if r != r_in:
-        U += add_entanglers(r+1, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = True)
-        U += add_entanglers(r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots)
+        U += add_entanglers(r+1, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = True, circ_type='native')
+        U += add_entanglers(r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots, circ_type='native')
     else:
         #initial entanglers
-        U += add_entanglers(r, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = only_cnots)
+        U += add_entanglers(r, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = only_cnots, circ_type='native')
     
     U += U1
     U += U2
@@ -354,24 +371,24 @@ def QRM_rec_assym_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None,
     position_dict2 = add_key_value_dict(position_dict2, to_add_key=2**(m-1), to_add_value=len(position_dict1.keys()))
     position_dict_new = add_dict(position_dict1, position_dict2)
 
-    return U, position_dict_new
+    return U.get_circuit(circ_type), position_dict_new
 
-def QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False, state_prep = False, classical=False):
+def QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots = False, state_prep = False, classical=False, circ_type = 'tequila'):
     '''
     Punctured QRM encoder, currently defaulted to dropping first qubit q[0]
     
     '''
-    U = tequila.QCircuit()
+    U = QRMcircuit()
     punc_bit_list = [0]
 
     if not state_prep:
         if r >= m or r < m-r-1:
             print('Invalid parameters r, m : {}, {}'.format(r, m))
-            return U, None
+            return U.get_circuit(circ_type), None
     else:
         if r > m or r < m-r-1:
             print('Invalid parameters r, m : {}, {}'.format(r, m))
-            return U, None
+            return U.get_circuit(circ_type), None
     
     ql_1, ql_2, p1, p2 = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions, punc_bit_list=punc_bit_list)
 
@@ -379,21 +396,20 @@ def QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots =
         #no need 111..11, so can go till m = r + 1
         if (m == r+1) or (m == r):
             if r == 1 and m == 1: #[0 1]^* = [1]
-                return U, {1: 0}
+                return U.get_circuit(circ_type), {1: 0}
             
-            U1, position_dict1 = QRM_rec_punc_circuit(m-1, m-1, partitions=p1, qubit_list=ql_1, only_cnots=True, state_prep=state_prep, classical=classical)
-            U2, position_dict2 = QRM_rec_classical_circuit(m-1, m-1, partitions=p2, qubit_list=ql_2)
+            U1, position_dict1 = QRM_rec_punc_circuit(m-1, m-1, partitions=p1, qubit_list=ql_1, only_cnots=True, state_prep=state_prep, classical=classical, circ_type='native')
+            U2, position_dict2 = QRM_rec_classical_circuit(m-1, m-1, partitions=p2, qubit_list=ql_2, circ_type='native')
 
-            Gr = Grm(m-1, m-1)[1:]
-            targets = [get_set_int(get_eval_set(row, reversed=True)) for row in Gr]
+            #leading bits of Grm(m-1, m-1)[1:]
+            targets = get_leading_bits_r1r2(0, m-1, m-1)[1:]
             target_dict = {target: i for i, target in enumerate(targets)}
 
             #add entanglers, no hadamards
             controls = get_dict_values(position_dict1, targets)
             qm1 = [ql_1[a] for a in controls]
             qm2 = [ql_2[a] for a in targets]
-            for a, b in zip(qm1, qm2):
-                U += tequila.gates.CX(control=a, target=b)
+            U.CX_layer(qm1, qm2)
             #U += add_punc_entanglers(r1=1, r2=m-1, m=m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True, puncture_Gp=False)
 
             U += U1
@@ -401,38 +417,37 @@ def QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots =
 
             position_dict2 = add_key_value_dict(position_dict2, to_add_key=2**(m-1), to_add_value=len(position_dict1.keys()))
             position_dict_new = add_dict(position_dict1, position_dict2)
-            return U, position_dict_new
+            return U.get_circuit(circ_type), position_dict_new
     else:
         if m == r + 1: #U^*(r, r+1)
             if r == 0: #[1]
-                return U, {0: 0}
+                return U.get_circuit(circ_type), {0: 0}
             
-            U1, position_dict = QRM_rec_punc_circuit(r-1, m-1, partitions=p1, qubit_list=ql_1, only_cnots=True, state_prep=state_prep, classical=classical)
-            U2, position_dict2 = QRM_rec_classical_circuit(r-1, r, partitions=p2, qubit_list=ql_2)
+            U1, position_dict = QRM_rec_punc_circuit(r-1, m-1, partitions=p1, qubit_list=ql_1, only_cnots=True, state_prep=state_prep, classical=classical, circ_type='native')
+            U2, position_dict2 = QRM_rec_classical_circuit(r-1, r, partitions=p2, qubit_list=ql_2, circ_type='native')
 
-            Gr = Grm(r-1, r)
-            targets = [get_set_int(get_eval_set(row, reversed=True)) for row in Gr]
+            #leading bits of Grm(r-1, r)
+            targets = get_leading_bits_r1r2(0, r-1, r)
             target_dict = {target: i for i, target in enumerate(targets)}
 
             #add entanglers, no hadamards
             controls = get_dict_values(position_dict, targets)
             qm1 = [ql_1[a] for a in controls]
             qm2 = [ql_2[a] for a in targets]
-            for a, b in zip(qm1, qm2):
-                U += tequila.gates.CX(control=a, target=b)
+            U.CX_layer(qm1, qm2)
             
             U += U1
-            U += tequila.gates.CX(control=ql_2[-1], target=ql_1[-1])
+            U.CX(control=ql_2[-1], target=ql_1[-1])
             U += U2
 
             target_dict = add_key_value_dict(target_dict, to_add_key=2**r, to_add_value=len(position_dict.keys()))
             position_dict_new = add_dict(position_dict, target_dict)
             position_dict_new[2**r - 1] = 2**(r+1) - 2
 
-            return U, position_dict_new
+            return U.get_circuit(circ_type), position_dict_new
     
-    U1, position_dict1 = QRM_rec_punc_circuit(r, m-1, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots, state_prep=state_prep, classical=classical)
-    U2, position_dict2 = QRM_rec_circuit(r, m-1, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots, classical=classical)
+    U1, position_dict1 = QRM_rec_punc_circuit(r, m-1, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots, state_prep=state_prep, classical=classical, circ_type='native')
+    U2, position_dict2 = QRM_rec_circuit(r, m-1, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots, classical=classical, circ_type='native')
 
     if classical:
         only_cnots=True
@@ -444,10 +459,10 @@ def QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots =
         r1 = m-r-1
     if r > m-r-1:
         #add message ents
-        U += add_punc_entanglers(m-r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True, puncture_Gp=False)
+        U += add_punc_entanglers(m-r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=True, puncture_Gp=False, circ_type='native')
     
     #add entanglers
-    U += add_punc_entanglers(r1, m-r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots, puncture_Gp=False)
+    U += add_punc_entanglers(r1, m-r-1, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots, puncture_Gp=False, circ_type='native')
 
     U += U1
     U += U2
@@ -455,46 +470,46 @@ def QRM_rec_punc_circuit(r, m, partitions = [], qubit_list = None, only_cnots =
     position_dict2 = add_key_value_dict(position_dict2, to_add_key=2**(m-1), to_add_value=len(position_dict1.keys()))
     position_dict_new = add_dict(position_dict1, position_dict2)
     
-    return U, position_dict_new
+    return U.get_circuit(circ_type), position_dict_new
 
-def QRM_rec_assym_punc_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None, only_cnots = False, state_prep = False):
-    U = tequila.QCircuit()
+def QRM_rec_assym_punc_circuit(r, m, r_in, m_in, partitions = [], qubit_list = None, only_cnots = False, state_prep = False, circ_type = 'tequila'):
+    U = QRMcircuit()
 
     if m == 0:
-        return U, {0: 0}
+        return U.get_circuit(circ_type), {0: 0}
     
     if r >= m or r < 0:
         print('Invalid parameters r, m : {}, {}'.format(r, m))
-        return U, None
+        return U.get_circuit(circ_type), None
     
     ql_1, ql_2, p1, p2 = get_punc_qubit_partition(m, qubit_list=qubit_list, partitions=partitions)
 
     if 2*r_in + 1 < m_in:
         if r == 0:
             # need to change!!
-            return QRM_rec_punc_circuit(r_in, m, partitions=partitions, qubit_list=qubit_list, only_cnots=only_cnots, state_prep=state_prep, classical=True)
+            return QRM_rec_punc_circuit(r_in, m, partitions=partitions, qubit_list=qubit_list, only_cnots=only_cnots, state_prep=state_prep, classical=True, circ_type=circ_type)
     if 2*r_in + 1 >= m_in:
         if m == r_in + 1:
-            Uc, position_dict = QRM_rec_punc_circuit(r_in, r_in + 1, partitions=partitions, qubit_list=qubit_list, only_cnots=only_cnots, state_prep=state_prep)
+            Uc, position_dict = QRM_rec_punc_circuit(r_in, r_in + 1, partitions=partitions, qubit_list=qubit_list, only_cnots=only_cnots, state_prep=state_prep, circ_type='native')
 
             #add hadamards
             if 2*r_in + 1 > m_in:
                 if not only_cnots:
-                    U += add_hadamards(1, 2*r_in - m_in + 1, m, qubit_list=qubit_list, pos_dict=position_dict)
+                    U += add_hadamards(1, 2*r_in - m_in + 1, m, qubit_list=qubit_list, pos_dict=position_dict, circ_type='native')
             
             U += Uc
             
-            return U, position_dict
+            return U.get_circuit(circ_type), position_dict
     
-    U1, position_dict1 = QRM_rec_assym_punc_circuit(r-1, m-1, r_in, m_in, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots, state_prep=state_prep)
-    U2, position_dict2 = QRM_rec_assym_circuit(r-1, m-1, r_in, m_in, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots)
+    U1, position_dict1 = QRM_rec_assym_punc_circuit(r-1, m-1, r_in, m_in, partitions=p1, qubit_list=ql_1, only_cnots=only_cnots, state_prep=state_prep, circ_type='native')
+    U2, position_dict2 = QRM_rec_assym_circuit(r-1, m-1, r_in, m_in, partitions=p2, qubit_list=ql_2, only_cnots=only_cnots, circ_type='native')
 
     if r != r_in:
-        U += add_punc_entanglers(r+1, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = True, puncture_Gp=False)
-        U += add_punc_entanglers(r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots, puncture_Gp=False)
+        U += add_punc_entanglers(r+1, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = True, puncture_Gp=False, circ_type='native')
+        U += add_punc_entanglers(r, r, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots=only_cnots, puncture_Gp=False, circ_type='native')
     else:
         #initial entanglers
-        U += add_punc_entanglers(r, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = only_cnots, puncture_Gp=False)
+        U += add_punc_entanglers(r, r_in, m-1, ql_1=ql_1, ql_2=ql_2, pos_dict1=position_dict1, pos_dict2=position_dict2, only_cnots = only_cnots, puncture_Gp=False, circ_type='native')
     
     U += U1
     U += U2
@@ -502,4 +517,4 @@ def QRM_rec_assym_punc_circuit(r, m, r_in, m_in, partitions = [], qubit_list = N
     position_dict2 = add_key_value_dict(position_dict2, to_add_key=2**(m-1), to_add_value=len(position_dict1.keys()))
     position_dict_new = add_dict(position_dict1, position_dict2)
 
-    return U, position_dict_new
\ No newline at end of file
+    return U.get_circuit(circ_type), position_dict_new
\ No newline at end of file
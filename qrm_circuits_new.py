@@ -1,150 +1,164 @@
 ### Recursive circuits with new construction
 
-import tequila as tq
 from permutations import *
-from qrm_circuits import get_qubit_partition
-from qrm_matrices import Grm, GeneratorQuotient
-import numpy as np
+from qrm_circuits import get_qubit_partition, sub_encoder
+from rm_generators import MonomialIndex, rm_monomials
+from qrm_gates import QRMcircuit
 
 def RowIndexList(G):
     return {tuple(row): i for i, row in enumerate(G)}
 
-def RecursiveBasisQRM_m(m, ql = [], partitions=[]):
+def BasisIndex(r, m):
+    #row index of Grm(r, m)
+    return MonomialIndex(m, [(0, r, m)])
+
+def RecursiveBasisQRM_m_head(m, ql, ql1, ql2, P1, P2, M1, M2):
+    '''
+    Gates of RecursiveBasisQRM_m(m) ahead of the sub-encoders (on the qubits after P1 + P2),
+    with the final permutation and row index
+    '''
+    circuit = QRMcircuit()
+
+    #rows of Grm(m, m) and Grm(m-1, m-1) as monomial indices
+    M = BasisIndex(m, m)
+    G1 = rm_monomials(0, m-1, m-1).tolist()
+
+    P = {}
+    controls, targets = [], []
+    for u in G1:
+        P[ql[M.plotkin(u, 0)]] = ql1[M1[u]]
+        P[ql[M.plotkin(u, 1)]] = ql2[M2[u]]
+
+        controls.append(ql1[M1[u]])
+        targets.append(ql2[M2[u]])
+    circuit.CX_layer(controls, targets)
+    
+    P = Permutation(P)
+    P.fill(qubit_list=ql)
+    PP = P1 + P2
+
+    circuit.relabel(PP)
+    return circuit, PP * P, M
+
+def RecursiveBasisQRM_m(m, ql = [], partitions=[], circ_type = 'tequila'):
     if ql == []:
         ql = list(range(2**m))
     if m == 0:
-        return tq.QCircuit(), Permutation({ql[0]: ql[0]}), RowIndexList(Grm(0, 0))
+        return QRMcircuit().get_circuit(circ_type), Permutation({ql[0]: ql[0]}), BasisIndex(0, 0)
     
     ql1, ql2, par1, par2 = get_qubit_partition(m, ql, partitions=partitions)
     
-    U1, P1, M1 = RecursiveBasisQRM_m(m-1, ql1, par1)
-    U2, P2, M2 = RecursiveBasisQRM_m(m-1, ql2, par2)
-    circuit = tq.QCircuit()
-
-    G = Grm(m, m)
-    M = RowIndexList(G)
-    G1 = Grm(m-1, m-1)
+    U1, P1, M1 = sub_encoder(RecursiveBasisQRM_m, ql1, m-1, partitions=par1, qubit_arg='ql')
+    U2, P2, M2 = sub_encoder(RecursiveBasisQRM_m, ql2, m-1, partitions=par2, qubit_arg='ql')
+    circuit, P_final, M = RecursiveBasisQRM_m_head(m, ql, ql1, ql2, P1, P2, M1, M2)
+    circuit += U1
+    circuit += U2
+    
+    return circuit.get_circuit(circ_type), P_final, M
 
-    P = {}
-    for row in G1:
-        u = tuple(row)
-        uu = tuple(np.concatenate([u, u]))
-        z = np.zeros(2**(m-1), dtype=int)
-        zu = tuple(np.concatenate([z, u]))
+def RecursiveBasisQRM_head(r, m, ql, ql1, ql2, P1, P2, M1, M2):
+    '''
+    Gates of RecursiveBasisQRM(r, m) ahead of the sub-encoders (on the qubits after P1 + P2),
+    with the final permutation and row index
+    '''
+    circuit = QRMcircuit()
 
-        P[ql[M[uu]]] = ql1[M1[u]]
-        P[ql[M[zu]]] = ql2[M2[u]]
+    #rows of Grm(r, m), Grm(r, m-1) and Grm(r-1, m-1) as monomial indices
+    M = BasisIndex(r, m)
+    G1 = rm_monomials(0, r, m-1).tolist()
+    G2 = rm_monomials(0, r-1, m-1).tolist()
 
-        circuit += tq.gates.CNOT(control=ql1[M1[u]], target=ql2[M2[u]])
+    P = {}
+    controls, targets = [], []
+    for u in G1:
+        P[ql[M.plotkin(u, 0)]] = ql1[M1[u]]
+        controls.append(ql1[M1[u]])
+        targets.append(ql2[M2[u]])
+    circuit.CX_layer(controls, targets)
+    
+    for v in G2:
+        P[ql[M.plotkin(v, 1)]] = ql2[M2[v]]
     
     P = Permutation(P)
     P.fill(qubit_list=ql)
     PP = P1 + P2
 
-    circuit = PP.permute_circuit(circuit)
-    circuit = circuit + U1 + U2
-    P_final = PP * P
-    
-    return circuit, P_final, M
+    circuit.relabel(PP)
+    return circuit, PP * P, M
 
-def RecursiveBasisQRM(r, m, ql = [], partitions=[]):
+def RecursiveBasisQRM(r, m, ql = [], partitions=[], circ_type = 'tequila'):
     """
     Recursive encoder for computational basis states of RM(r, m)
     """
     if ql == []:
         ql = list(range(2**m))
     if r == m:
-        return RecursiveBasisQRM_m(m, ql = ql, partitions=partitions) 
+        return RecursiveBasisQRM_m(m, ql = ql, partitions=partitions, circ_type=circ_type) 
     if m == 0:
-        return tq.QCircuit(), Permutation({ql[0]: ql[0]}), RowIndexList(Grm(0, 0))
+        return QRMcircuit().get_circuit(circ_type), Permutation({ql[0]: ql[0]}), BasisIndex(0, 0)
     
     ql1, ql2, par1, par2 = get_qubit_partition(m, ql, partitions=partitions)
     
-    U1, P1, M1 = RecursiveBasisQRM(r, m-1, ql1, par1)
-    U2, P2, M2 = RecursiveBasisQRM(r, m-1, ql2, par2)
-    circuit = tq.QCircuit()
-
-    G = Grm(r, m)
-    M = RowIndexList(G)
-    G1 = Grm(r, m-1)
-    G2 = Grm(r-1, m-1)
-
+    U1, P1, M1 = sub_encoder(RecursiveBasisQRM, ql1, r, m-1, partitions=par1, qubit_arg='ql')
+    U2, P2, M2 = sub_encoder(RecursiveBasisQRM, ql2, r, m-1, partitions=par2, qubit_arg='ql')
+    circuit, P_final, M = RecursiveBasisQRM_head(r, m, ql, ql1, ql2, P1, P2, M1, M2)
+    circuit += U1
+    circuit += U2
+
+    return circuit.get_circuit(circ_type), P_final, M
+
+def RecursiveQRM_head(r, m, ql, ql1, ql2, P1, P2, M1, M2):
+    '''
+    Gates of RecursiveQRM(r, m) ahead of the sub-encoders (on the qubits after P1 + P2),
+    with the final permutation and row index
+    '''
+    circuit = QRMcircuit()
+
+    #form M, rows G(r, m)\G(m-r-1, m) followed by (u, u) for u in G(m-r-1, m-1)\G(m-r-2, m-1)
+    M = MonomialIndex(m, [(m-r, r, m), (m-r-1, m-r-1, m-1)])
+    G2 = rm_monomials(m-r-1, m-r-1, m-1).tolist()
+
+    #form permutation and circuit, G3 = G(r, m-1)\G(m-r-2, m-1), G4 = G(r-1, m-1)\G(m-r-2, m-1)
+    G3 = rm_monomials(m-r-1, r, m-1).tolist()
+    G4 = rm_monomials(m-r-1, r-1, m-1).tolist()
+    
     P = {}
-    for row in G1:
-        u = tuple(row)
-        uu = tuple(np.concatenate([u, u]))
-        P[ql[M[uu]]] = ql1[M1[u]]
-        circuit += tq.gates.CNOT(control=ql1[M1[u]], target=ql2[M2[u]])
+    circuit_H = QRMcircuit()
+    circuit_H.H([ql[M.plotkin(u, 0)] for u in G2])
     
-    for row in G2:
-        v = tuple(row)
-        z = np.zeros(2**(m-1), dtype=int)
-        zv = tuple(np.concatenate([z, v]))
-        P[ql[M[zv]]] = ql2[M2[v]]
+    controls, targets = [], []
+    for u in G3:
+        P[ql[M.plotkin(u, 0)]] = ql1[M1[u]]
+        controls.append(ql1[M1[u]])
+        targets.append(ql2[M2[u]])
+    circuit.CX_layer(controls, targets)
+
+    for v in G4:
+        P[ql[M.plotkin(v, 1)]] = ql2[M2[v]]
     
     P = Permutation(P)
     P.fill(qubit_list=ql)
     PP = P1 + P2
 
-    circuit = PP.permute_circuit(circuit)
-    circuit = circuit + U1 + U2
-    P_final = PP * P
-
-    return circuit, P_final, M
+    circuit_H.relabel(P)
+    circuit = circuit_H + circuit
+    circuit.relabel(PP)
+    return circuit, PP * P, M
 
-def RecursiveQRM(r, m, ql = [], partitions = []):
+def RecursiveQRM(r, m, ql = [], partitions = [], circ_type = 'tequila'):
     if ql == []:
         ql = list(range(2**m))
     if r > m:
         raise ValueError("Incorrect parameters r>m!")
     if r == m:
-        return RecursiveBasisQRM(r, m, partitions=partitions, ql=ql)
+        return RecursiveBasisQRM(r, m, partitions=partitions, ql=ql, circ_type=circ_type)
     
-    circuit = tq.QCircuit()
     ql1, ql2, par1, par2 = get_qubit_partition(m, ql, partitions)
 
-    U1, P1, M1 = RecursiveQRM(r, m-1, ql1, par1)
-    U2, P2, M2 = RecursiveQRM(r, m-1, ql2, par2)
-
-    #form generator matrix and M
-    G1 = GeneratorQuotient(r, m-r-1, m)
-    G2 = GeneratorQuotient(m-r-1, m-r-2, m-1)
-    G2G2 = [np.concatenate([row, row]) for row in G2]
-    G = G1 + G2G2
-    M = RowIndexList(G)
-
-    #form permutation and circuit
-    G3 = GeneratorQuotient(r, m-r-2, m-1)
-    G4 = GeneratorQuotient(r-1, m-r-2, m-1)
-    
-    P = {}
-    circuit_H = tq.QCircuit()
-    for row in G2G2:
-        uu = tuple(row)
-        circuit_H += tq.gates.H(ql[M[uu]])
-    
-    for row in G3:
-        u = tuple(row)
-        uu = tuple(np.concatenate([u, u]))
-        
-        P[ql[M[uu]]] = ql1[M1[u]]
-        circuit += tq.gates.CNOT(control=ql1[M1[u]], target=ql2[M2[u]])
-
-    for row in G4:
-        z = np.zeros(2**(m-1), dtype=int)
-        v = tuple(row)
-        zv = tuple(np.concatenate([z, v]))
-
-        P[ql[M[zv]]] = ql2[M2[v]]
-    
-    P = Permutation(P)
-    P.fill(qubit_list=ql)
-    PP = P1 + P2
-
-    circuit_H = P.permute_circuit(circuit_H)
-    circuit = circuit_H + circuit
-    circuit = PP.permute_circuit(circuit)
-    circuit = circuit + U1 + U2
-    P_final = PP * P
+    U1, P1, M1 = sub_encoder(RecursiveQRM, ql1, r, m-1, partitions=par1, qubit_arg='ql')
+    U2, P2, M2 = sub_encoder(RecursiveQRM, ql2, r, m-1, partitions=par2, qubit_arg='ql')
+    circuit, P_final, M = RecursiveQRM_head(r, m, ql, ql1, ql2, P1, P2, M1, M2)
+    circuit += U1
+    circuit += U2
     
-    return circuit, P_final, M
\ No newline at end of file
+    return circuit.get_circuit(circ_type), P_final, M
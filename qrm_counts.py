@@ -2,17 +2,23 @@
 #Praveen Jayakumar, July 2023
 
 #need to review counts
+#all counts are exact python ints, the recursions are memoized so tables up to m ~ 200 are cheap
 from qrm_utils import binom_sum
+from functools import lru_cache
 import math
 import numpy as np
 
+@lru_cache(maxsize=None)
 def naive_CX_count(r, m):
+    #sum_{i <= r} comb(m, i)*(2^{m-i} - 1), accumulated over r
     if r>m:
         print('Invalid parameters r = {} > m = {}'.format(r, m))
         return
     if r ==2 and m == 2:
         return 4
-    return np.sum([math.comb(m, i)*(2**(m-i) - 1) for i in range(r+1)])
+    if r < 0:
+        return 0
+    return naive_CX_count(r-1, m) + math.comb(m, r)*(2**(m-r) - 1)
 
 def std_CX_count(r, m):
     if r>m:
@@ -27,22 +33,31 @@ def std_CX_count(r, m):
 def Urr_CX_count(r):
     """
     Gate counts for recursive U_rr, quantum or classical
+
+    U_rr = 2^{r-1} + 2 U_{r-1, r-1}, U_11 = 1, so U_rr = r 2^{r-1}
     """
-    if r ==1:
-        return 1 
-    g = 2**(r-1)
-    return g + 2*Urr_CX_count(r-1)
+    if r < 0:
+        print('Invalid parameter r = {}'.format(r))
+        return
+    if r == 0:
+        return 0
+    return r*2**(r-1)
 
+@lru_cache(maxsize=None)
 def Urm_CX_count(r, m):
     '''
     Similar to Urr_CX_count(), for general G(r, m) encoding, quantum or classical
     '''
+    if r < 0 or r > m:
+        print('Invalid parameters r = {}, m = {}'.format(r, m))
+        return
     if r == 0:
         return 2**m - 1
     if r == m:
         return Urr_CX_count(m)
     return binom_sum(m-1, 0, r) + 2*Urm_CX_count(r, m-1)  # (u, u) + (0, v) -> (u, 0) + (0, u+v)
 
+@lru_cache(maxsize=None)
 def punc_Urm_CX_count(r, m, state_prep = False):
     '''
     punctured, classical code state encoder
@@ -66,7 +81,7 @@ def punc_Urm_CX_count(r, m, state_prep = False):
         return 2**(r-1) - 1 + punc_Urm_CX_count(r-1, r-1, state_prep=state_prep) + Urr_CX_count(r-1)
     return binom_sum(m-1, 0, r) + e + punc_Urm_CX_count(r, m-1, state_prep=state_prep) + Urm_CX_count(r, m-1)  # (u, u) + (0, v) -> (u, 0) + (0, u+v)
 
-
+@lru_cache(maxsize=None)
 def rec_CX_count(r, m):
     if r>m or r < (m-1)//2:
         print('Invalid parameters r = {}, m = {}'.format(r, m))
@@ -78,6 +93,7 @@ def rec_CX_count(r, m):
     else:
         return binom_sum(m-1, m-r, r) + math.comb(m-1, m-r-1) + 2*rec_CX_count(r, m-1)
 
+@lru_cache(maxsize=None)
 def rec_CX_count_assym(r, m, r_in, m_in):
     '''
     gate counts for assymmetric QRM code
@@ -94,6 +110,7 @@ def rec_CX_count_assym(r, m, r_in, m_in):
             return Urm_CX_count(r_in, m)
     return binom_sum(m-1, r, r_in) + 2*rec_CX_count_assym(r-1, m-1, r_in, m_in)
 
+@lru_cache(maxsize=None)
 def rec_CX_count_punc(r, m, classical=False, state_prep=False):
     '''
     CNOT gate counts for recursive encoder of punctured QRM(r, m)^*
@@ -109,9 +126,11 @@ def rec_CX_count_punc(r, m, classical=False, state_prep=False):
     if m-r-1 == r:
         return math.comb(m-1, m-r-1) + rec_CX_count_punc(r, m-1, state_prep=state_prep) + rec_CX_count(r, m-1)
     if m == r+1:
-        return 2**r + rec_CX_count_punc(r-1, r, state_prep=state_prep) + Urr_CX_count(r)
+        #as punc_Urm_CX_count, state preparation saves one CX per level
+        return 2**r - int(state_prep) + rec_CX_count_punc(r-1, r, state_prep=state_prep) + Urr_CX_count(r)
     return binom_sum(m-1, m-r, r) + math.comb(m-1, m-r-1) + rec_CX_count_punc(r, m-1, state_prep=state_prep) + rec_CX_count(r, m-1)
 
+@lru_cache(maxsize=None)
 def rec_CX_count_assym_punc(r, m, r_in, m_in, state_prep = False):
     
     #gate counts for assymmetric QRM code
@@ -121,4 +140,75 @@ def rec_CX_count_assym_punc(r, m, r_in, m_in, state_prep = False):
     if 2*r_in + 1 < m_in: #classical state
         if r == 0:
             return punc_Urm_CX_count(r_in, m, state_prep=state_prep)
-    return binom_sum(m-1, r, r_in) + rec_CX_count_assym_punc(r-1, m-1, r_in, m_in, state_prep=state_prep) + rec_CX_count_assym(r-1, m-1, r_in, m_in)
\ No newline at end of file
+    return binom_sum(m-1, r, r_in) + rec_CX_count_assym_punc(r-1, m-1, r_in, m_in, state_prep=state_prep) + rec_CX_count_assym(r-1, m-1, r_in, m_in)
+
+#valid (r, m) of each count, quantum codes need 2r >= m-1, i.e. r >= m//2
+COUNT_FAMILIES = {
+    'naive': (naive_CX_count, lambda r, m, **kw: 0 <= r <= m),
+    'std': (std_CX_count, lambda r, m, **kw: m//2 <= r <= m),
+    'Urm': (Urm_CX_count, lambda r, m, **kw: 0 <= r <= m),
+    'punc_Urm': (punc_Urm_CX_count, lambda r, m, state_prep=False, **kw: 0 <= r <= m if state_prep else r < m or r == m == 0),
+    'rec': (rec_CX_count, lambda r, m, **kw: max(m//2, 1) <= r <= m),
+    'rec_punc': (rec_CX_count_punc, lambda r, m, classical=False, state_prep=False, **kw:
+                 COUNT_FAMILIES['punc_Urm'][1](r, m, state_prep=state_prep) if classical else m//2 <= r < m),
+}
+
+def count_table(family, m_max, m_min = 0, **kwargs):
+    '''
+    Counts of family (key of COUNT_FAMILIES) for every valid (r, m) with m_min <= m <= m_max, in one call.
+    Returns an object array T of python ints with T[r, m] the count, None for invalid (r, m).
+    kwargs are passed to the count function, e.g. state_prep = True.
+    '''
+    count, valid = COUNT_FAMILIES[family]
+    T = np.full((m_max + 1, m_max + 1), None, dtype=object)
+    #increasing m, so the recursive calls are cache hits and the recursion stays shallow
+    for m in range(m_min, m_max + 1):
+        for r in range(m + 1):
+            if valid(r, m, **kwargs):
+                T[r, m] = count(r, m, **kwargs)
+    return T
+
+def clear_count_cache():
+    for f in [naive_CX_count, Urm_CX_count, punc_Urm_CX_count, rec_CX_count, rec_CX_count_assym, rec_CX_count_punc, rec_CX_count_assym_punc]:
+        f.cache_clear()
+
+
+#predicted ASAP depths (QRMcircuit.depth), the Plotkin halves U1, U2 act on disjoint qubits and run in parallel
+
+def Urm_depth(r, m):
+    '''
+    Depth of the recursive G(r, m) encoder (classical code states, RecursiveBasisQRM), one CX layer per level
+    '''
+    if r < 0 or r > m:
+        print('Invalid parameters r = {}, m = {}'.format(r, m))
+        return
+    return m
+
+def rec_depth(r, m, only_cnots = False, classical = False):
+    '''
+    Depth of QRM_rec_circuit and RecursiveQRM, one CX layer per level and all the H gates in the first layer
+    '''
+    if classical:
+        return Urm_depth(r, m)
+    if r>m or r < (m-1)//2:
+        print('Invalid parameters r = {}, m = {}'.format(r, m))
+        return
+    if r == m or only_cnots:
+        return m
+    return m + 1
+
+def rec_depth_punc(r, m, classical = False, state_prep = False):
+    '''
+    Depth of QRM_rec_punc_circuit.
+    With state_prep it is linear in m, otherwise the punctured half is chained after U_rr (see punc_Urm_CX_count)
+    and the depth grows as T(r+2) + m - r, T(n) = n(n+1)/2.
+    '''
+    if r >= m or r < 0:
+        print('Invalid Parameters r, m: {}, {}\nRequire r < m'.format(r, m))
+        return
+    if state_prep:
+        return m if r >= m - 1 else m + 1
+    T = (r + 2)*(r + 3)//2
+    if classical:
+        return T + (m - r) - 4
+    return T + (m - r) - 3 - (m - r == 1)
@@ -0,0 +1,198 @@
+#majority logic (Reed) decoding of RM(r, m) from syndromes, for both sides of the QRM CSS code
+#batches of shots are bit-packed along the shots: an array of shape (n, words) holds bit i of shot 64*w + t
+#in bit t of word [i, w], so every numpy operation acts on 64 shots per word.
+#rows are indexed by monomials / points of F_2^m as bit masks (as rm_generators): the check of monomial x
+#is the parity of the points z containing x, the syndrome of Hrm(r, m) is indexed by rm_monomials(0, m-r-1, m).
+
+import numpy as np
+from rm_generators import rm_monomials, popcounts
+
+### shot packing
+
+def pack_shots(bits):
+    '''
+    (shots, n) 0/1 array -> (n, words) uint64 array packed along the shots
+    '''
+    bits = np.asarray(bits, dtype=np.uint8)
+    shots, n = bits.shape
+    words = -(-shots//64)
+    padded = np.zeros((n, words*64), dtype=np.uint8)
+    padded[:, :shots] = bits.T
+    return np.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+def unpack_shots(packed, shots):
+    '''
+    (n, words) array packed along the shots -> (shots, n) uint8 array
+    '''
+    packed = np.ascontiguousarray(packed, dtype='<u8')
+    return np.unpackbits(packed.view(np.uint8), axis=1, bitorder='little')[:, :shots].T
+
+def from_stim(packed, n):
+    '''
+    (shots, ceil(n/8)) uint8 array of stim (bit_packed=True) -> (n, words) array packed along the shots
+    '''
+    return pack_shots(np.unpackbits(packed, axis=1, count=n, bitorder='little'))
+
+def to_stim(packed, shots):
+    #(n, words) array packed along the shots -> (shots, ceil(n/8)) uint8 array as stim
+    return np.packbits(unpack_shots(packed, shots), axis=1, bitorder='little')
+
+### transforms over the cube, on (2^m, words) arrays
+
+def _butterflies(a, m):
+    #views (high, 2, low, words) of a for every bit
+    for b in range(m):
+        v = a.reshape(1 << (m-b-1), 2, 1 << b, a.shape[-1])
+        yield v[:, 0], v[:, 1]
+
+def superset_sums(a, m):
+    #a[z] <- sum_{w containing z} a[w], in place
+    for lo, hi in _butterflies(a, m):
+        lo ^= hi
+    return a
+
+def subset_sums(a, m):
+    #a[z] <- sum_{w contained in z} a[w], in place
+    for lo, hi in _butterflies(a, m):
+        hi ^= lo
+    return a
+
+def monomial_parities(e, monomials, m):
+    '''
+    Parities of the packed words e (2^m, words) on the evaluation vectors of the monomials,
+    the syndrome of e for Hrm(r, m) with the monomials rm_monomials(0, m-r-1, m)
+    '''
+    return superset_sums(e.copy(), m)[np.asarray(monomials)]
+
+def coset_leader(syndrome, r, m):
+    '''
+    Word y (2^m, words) with Hrm(r, m) y = syndrome, supported on the points of weight <= m-r-1
+    (superset sums of the syndrome restricted to them)
+    '''
+    y = np.zeros((1 << m, syndrome.shape[-1]), dtype=np.uint64)
+    monomials = rm_monomials(0, m-r-1, m)
+    y[monomials] = syndrome
+    superset_sums(y, m)
+    y[popcounts(m) > m-r-1] = 0
+    return y
+
+### majority logic
+
+def _add(a, b):
+    #bit-sliced sum of two lists of planes, overwrites the planes of a and b
+    if len(a) < len(b):
+        a, b = b, a
+    out, carry = [], None
+    for i, x in enumerate(a):
+        if i < len(b):
+            c = x & b[i]
+            x ^= b[i]
+        elif carry is None:
+            out.append(x)
+            continue
+        else:
+            c = None
+        if carry is not None:
+            if c is None:
+                c = x & carry
+            else:
+                c |= x & carry
+            x ^= carry
+        out.append(x)
+        carry = c
+    if carry is not None:
+        out.append(carry)
+    return out
+
+def majority(votes):
+    '''
+    Per bit majority (more than half of the ones, ties give 0) of votes (..., n, words) along the n axis,
+    by a bit-sliced adder tree
+    '''
+    return _majority(votes.copy())
+
+def _majority(votes):
+    #majority overwriting votes
+    n = votes.shape[-2]
+    planes = [votes]
+    while planes[0].shape[-2] > 1:
+        k = planes[0].shape[-2]
+        if k % 2:
+            #zero votes keep the count
+            planes = [np.concatenate([p, np.zeros_like(p[..., :1, :])], axis=-2) for p in planes]
+            k += 1
+        planes = _add([p[..., :k//2, :] for p in planes], [p[..., k//2:, :] for p in planes])
+    #count > n/2, compared from the top bit down
+    t = n//2
+    greater = np.zeros_like(planes[0][..., 0, :])
+    equal = ~greater
+    for i in range(len(planes) - 1, -1, -1):
+        p = planes[i][..., 0, :]
+        if (t >> i) & 1:
+            equal &= p
+        else:
+            greater |= equal & p
+            equal &= ~p
+    return greater
+
+def reed_decode(y, r, m):
+    '''
+    Majority logic decoding of the packed words y (2^m, words) in RM(r, m).
+    Returns (the error estimate y + decoded codeword, the coefficients (k, words) of the codeword on the
+    monomials rm_monomials(0, r, m)). Corrects every error of weight < 2^(m-r-1).
+    '''
+    y = y.copy()
+    words = y.shape[-1]
+    pc = popcounts(m)
+    coefficients = np.zeros((1 << m, words), dtype=np.uint64)
+    cube = y.reshape((2,)*m + (words,))
+    for d in range(min(r, m), -1, -1):
+        monomials = np.flatnonzero(pc == d)
+        #votes of x: parities of y on the cosets of the subspace spanned by the variables of x
+        votes = np.empty((len(monomials), 1 << (m-d), words), dtype=np.uint64)
+        for i, x in enumerate(monomials.tolist()):
+            np.bitwise_xor.reduce(cube, axis=tuple(m-1-b for b in range(m) if (x >> b) & 1),
+                                  out=votes[i].reshape((2,)*(m-d) + (words,)))
+        c = np.zeros((1 << m, words), dtype=np.uint64)
+        c[monomials] = _majority(votes)
+        coefficients[monomials] = c[monomials]
+        y ^= subset_sums(c, m)
+    return y, coefficients[rm_monomials(0, r, m)]
+
+def decode_syndromes(syndrome, r, m):
+    '''
+    Error estimate (2^m, words) of the packed syndromes (rows rm_monomials(0, m-r-1, m)) of Hrm(r, m)
+    '''
+    return reed_decode(coset_leader(syndrome, r, m), r, m)[0]
+
+class QRMDecoder:
+    '''
+    Decoder of the QRM(r, m) CSS code with the checks of Hqrm(r, m) (X checks, then Z checks).
+    Both sides are decoded as RM(r, m) words. The logical Z (resp. X) flips predicted for a shot are
+    the parities of the X (resp. Z) error estimate on the rows of G(r, m)\\Hrm(r, m).
+    Called on stim detector samples (bit_packed, as noise_benchmark.syndrome_circuit) it returns the
+    predicted observable flips, so it can be passed as the decoder of noise_benchmark.monte_carlo.
+    '''
+    def __init__(self, r, m):
+        if r > m or m-r-1 > r:
+            raise ValueError('QRM codes need m-r-1 <= r <= m, got r, m = {}, {}'.format(r, m))
+        self.r, self.m = r, m
+        self.checks = rm_monomials(0, m-r-1, m)
+        self.logicals = rm_monomials(m-r, r, m)
+
+    def decode(self, x_syndromes, z_syndromes):
+        '''
+        (Z error, X error) estimates (2^m, words) from the packed syndromes of the X checks and Z checks
+        '''
+        return decode_syndromes(x_syndromes, self.r, self.m), decode_syndromes(z_syndromes, self.r, self.m)
+
+    def logical_flips(self, errors):
+        #predicted logical flips (k, words) of the packed error estimates
+        return monomial_parities(errors, self.logicals, self.m)
+
+    def __call__(self, detectors):
+        shots = len(detectors)
+        k = len(self.checks)
+        z_syndromes = from_stim(detectors, 2*k)[k:]
+        x_errors = decode_syndromes(z_syndromes, self.r, self.m)
+        return to_stim(self.logical_flips(x_errors), shots)
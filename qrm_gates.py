@@ -0,0 +1,323 @@
+#native gate list for the QRM encoders, converted to tequila/qiskit/stim only on request
+
+import numpy as np
+import tequila
+import stim
+from qiskit import QuantumCircuit
+
+H_GATE = 0
+CX_GATE = 1
+GATE_NAMES = {H_GATE: 'H', CX_GATE: 'CX'}
+
+def qubit_map_array(qubit_map):
+    '''
+    Array form of a qubit map given as a dict, a Permutation or a vector, -1 for unmapped qubits
+    '''
+    if hasattr(qubit_map, 'array'):
+        return np.asarray(qubit_map.array)
+    if isinstance(qubit_map, dict):
+        keys = np.fromiter(qubit_map.keys(), dtype=np.int64, count=len(qubit_map))
+        qmap = np.full(keys.max() + 1 if len(keys) else 0, -1, dtype=np.int64)
+        qmap[keys] = np.fromiter(qubit_map.values(), dtype=np.int64, count=len(qubit_map))
+        return qmap
+    return np.asarray(qubit_map)
+
+class QRMcircuit:
+    '''
+    Circuit object for recursive QRM encoders.
+
+    Gates are stored as parallel int arrays (opcode, control, target), with control = -1 for H gates.
+    moments holds the index of the first gate of each moment, gates in a moment act on distinct qubits.
+    continues: the first moment is the rest of the last moment of the circuit before (a batch cut inside a moment,
+    see slice), extend and the encoder_io writers join them.
+    get_circuit converts to tequila, qiskit or stim.
+    '''
+    def __init__(self, opcodes = None, controls = None, targets = None, moments = None, copy = True, continues = False):
+        #copy = False keeps arrays of the right dtype as they are (eg. memory mapped)
+        array = np.array if copy else np.asarray
+        self._op = array([] if opcodes is None else opcodes, dtype=np.int8)
+        self._ctrl = array([] if controls is None else controls, dtype=np.int32)
+        self._tgt = array([] if targets is None else targets, dtype=np.int32)
+        self._n = len(self._op)
+        assert len(self._ctrl) == self._n and len(self._tgt) == self._n, 'Gate arrays of different lengths.'
+        if moments is None:
+            moments = [0] if self._n else []
+        self._moments = list(moments)
+        self.continues = continues
+
+    def _reserve(self, k):
+        if self._n + k > len(self._op):
+            capacity = max(2*len(self._op), self._n + k, 16)
+            for name in ['_op', '_ctrl', '_tgt']:
+                old = getattr(self, name)
+                new = np.empty(capacity, dtype=old.dtype)
+                new[:self._n] = old[:self._n]
+                setattr(self, name, new)
+
+    def _append(self, op, controls, targets, new_moment = True):
+        k = len(targets)
+        if k == 0:
+            return
+        self._reserve(k)
+        if new_moment:
+            self._moments.append(self._n)
+        self._op[self._n:self._n + k] = op
+        self._ctrl[self._n:self._n + k] = controls
+        self._tgt[self._n:self._n + k] = targets
+        self._n += k
+
+    def H(self, target=[]):
+        #one moment of H gates
+        self._append(H_GATE, -1, np.atleast_1d(np.asarray(target, dtype=np.int64)).reshape(-1))
+
+    def CX(self, control=[], target=[]):
+        '''
+        CX with a single control, target may be a list (fan-out, one moment per gate)
+        '''
+        control = np.atleast_1d(np.asarray(control, dtype=np.int64)).reshape(-1)
+        if len(control) != 1:
+            raise ValueError('Only singly controlled CX gates are supported, got controls {}'.format(control.tolist()))
+        targets = np.atleast_1d(np.asarray(target, dtype=np.int64)).reshape(-1)
+        k = len(targets)
+        if k == 0:
+            return
+        self._reserve(k)
+        self._moments.extend(range(self._n, self._n + k))
+        self._append(CX_GATE, control[0], targets, new_moment=False)
+
+    def CX_layer(self, controls, targets):
+        '''
+        One moment of CX(controls[i], targets[i]), on distinct qubits
+        '''
+        controls = np.asarray(controls, dtype=np.int64).reshape(-1)
+        targets = np.asarray(targets, dtype=np.int64).reshape(-1)
+        assert len(controls) == len(targets), 'Mismatched controls and targets.'
+        self._append(CX_GATE, controls, targets)
+
+    @property
+    def opcodes(self):
+        return self._op[:self._n]
+
+    @property
+    def controls(self):
+        return self._ctrl[:self._n]
+
+    @property
+    def targets(self):
+        return self._tgt[:self._n]
+
+    @property
+    def moments(self):
+        return np.array(self._moments, dtype=np.int64)
+
+    @property
+    def gate_count(self):
+        return self._n
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def qubits(self):
+        return np.union1d(self.targets, self.controls[self.controls >= 0]).tolist()
+
+    @property
+    def n_qubits(self):
+        if self._n == 0:
+            return 0
+        return int(max(self.targets.max(), self.controls.max())) + 1
+
+    def layers(self, method = 'asap'):
+        '''
+        Layer (from 0) of every gate, as soon as possible ('asap') or as late as possible ('alap').
+        Gates of a moment act on distinct qubits, so every moment is placed with one vectorized step.
+        '''
+        if method not in ['asap', 'alap']:
+            raise ValueError('Unknown scheduling method {}'.format(method))
+        layer = np.zeros(self._n, dtype=np.int64)
+        if self._n == 0:
+            return layer
+        ctrl, tgt = self.controls, self.targets
+        bounds = self._moments + [self._n]
+        blocks = list(zip(bounds[:-1], bounds[1:]))
+        if method == 'alap':
+            blocks = blocks[::-1]
+        level = np.zeros(self.n_qubits + 1, dtype=np.int64) #level[-1] is a dummy for H controls
+        for a, b in blocks:
+            c, t = ctrl[a:b], tgt[a:b]
+            d = np.maximum(level[c], level[t]) + 1
+            level[t] = d
+            level[c] = d
+            level[-1] = 0
+            layer[a:b] = d
+        if method == 'alap':
+            return int(layer.max()) - layer
+        return layer - 1
+
+    @property
+    def depth(self):
+        #as soon as possible layering, as tequila's circuit.depth
+        if self._n == 0:
+            return 0
+        return int(self.layers().max()) + 1
+
+    def layer_widths(self, method = 'asap'):
+        '''
+        Number of gates, CX gates and H gates in every layer
+        '''
+        layer = self.layers(method)
+        n = int(layer.max()) + 1 if self._n else 0
+        is_cx = self.opcodes == CX_GATE
+        return {'gates': np.bincount(layer, minlength=n),
+                'CX': np.bincount(layer[is_cx], minlength=n),
+                'H': np.bincount(layer[~is_cx], minlength=n)}
+
+    def schedule(self, method = 'asap'):
+        '''
+        Equivalent circuit with one moment per layer, gates of a layer grouped by type
+        '''
+        layer = self.layers(method)
+        order = np.argsort(2*layer + self.opcodes, kind='stable')
+        starts = np.flatnonzero(np.diff(layer[order])) + 1
+        moments = [0] + starts.tolist() if self._n else []
+        return QRMcircuit(self.opcodes[order], self.controls[order], self.targets[order], moments)
+
+    def copy(self):
+        return QRMcircuit(self.opcodes, self.controls, self.targets, self._moments, continues=self.continues)
+
+    def slice(self, start, stop):
+        '''
+        Gates start:stop as a new circuit, a moment cut at start is its first moment and is marked as continuing
+        (continues), so that extend joins it back to the moment before
+        '''
+        stop = min(stop, self._n)
+        moments = np.array(self._moments, dtype=np.int64)
+        inner = moments[(moments > start) & (moments < stop)] - start
+        cut = start > 0 and start < self._n and not (moments == start).any()
+        moments = ([0] if stop > start else []) + inner.tolist()
+        return QRMcircuit(self._op[start:stop], self._ctrl[start:stop], self._tgt[start:stop], moments,
+                          continues=cut or (start == 0 and self.continues))
+
+    def extend(self, other):
+        '''
+        Appends the gates of other in place, other may be a QRMcircuit or a tequila circuit.
+        A continuing other (see slice) joins its first moment to the last moment of self.
+        '''
+        if isinstance(other, tequila.QCircuit):
+            other = QRMcircuit.from_tequila(other)
+        if other._n == 0:
+            return self
+        if self._n == 0:
+            self.continues = other.continues
+        self._reserve(other._n)
+        join = other.continues and self._n > 0
+        self._moments += [self._n + b for b in other._moments[1 if join else 0:]]
+        self._op[self._n:self._n + other._n] = other.opcodes
+        self._ctrl[self._n:self._n + other._n] = other.controls
+        self._tgt[self._n:self._n + other._n] = other.targets
+        self._n += other._n
+        return self
+
+    def __iadd__(self, other):
+        return self.extend(other)
+
+    def __add__(self, other):
+        return self.copy().extend(other)
+
+    def relabel(self, qubit_map):
+        '''
+        Maps qubit q to qubit_map[q] in place, qubit_map as dict, Permutation or array
+        '''
+        qmap = qubit_map_array(qubit_map)
+        if self._n == 0:
+            return self
+        ctrl, tgt = self.controls, self.targets
+        has_ctrl = ctrl >= 0
+        top = int(max(tgt.max(), ctrl.max()))
+        if top >= len(qmap):
+            raise KeyError(top)
+        new_tgt = qmap[tgt]
+        new_ctrl = qmap[ctrl[has_ctrl]]
+        if (new_tgt < 0).any():
+            raise KeyError(int(tgt[new_tgt < 0][0]))
+        if (new_ctrl < 0).any():
+            raise KeyError(int(ctrl[has_ctrl][new_ctrl < 0][0]))
+        tgt[:] = new_tgt
+        ctrl[has_ctrl] = new_ctrl
+        return self
+
+    def map_qubits(self, qubit_map):
+        return self.copy().relabel(qubit_map)
+
+    def gates(self):
+        #(name, control, target) tuples, control is None for H
+        for op, c, t in zip(self.opcodes.tolist(), self.controls.tolist(), self.targets.tolist()):
+            yield GATE_NAMES[op], (c if c >= 0 else None), t
+
+    @classmethod
+    def from_tequila(cls, circuit):
+        '''
+        Reads H and (singly controlled) X gates of a tequila circuit
+        '''
+        U = cls()
+        for gate in circuit.gates:
+            name = gate.name.upper()
+            if name == 'H' and len(gate.control) == 0:
+                U.H(target=list(gate.target))
+            elif name in ['X', 'CX', 'CNOT'] and len(gate.control) == 1:
+                U.CX(control=gate.control[0], target=list(gate.target))
+            else:
+                raise ValueError('Unsupported gate {} for QRMcircuit.'.format(gate))
+        return U
+
+    def to_tequila(self):
+        gates = []
+        for op, c, t in zip(self.opcodes.tolist(), self.controls.tolist(), self.targets.tolist()):
+            if op == H_GATE:
+                gates += tequila.gates.H(target=t).gates
+            else:
+                gates += tequila.gates.CX(control=c, target=t).gates
+        return tequila.QCircuit(gates=gates)
+
+    def to_qiskit(self):
+        qc = QuantumCircuit(self.n_qubits)
+        for op, c, t in zip(self.opcodes.tolist(), self.controls.tolist(), self.targets.tolist()):
+            if op == H_GATE:
+                qc.h(t)
+            else:
+                qc.cx(c, t)
+        return qc
+
+    def to_stim(self):
+        #one instruction per run of equal gates, stim applies the targets of an instruction in order
+        circuit = stim.Circuit()
+        op, ctrl, tgt = self.opcodes, self.controls, self.targets
+        runs = (np.flatnonzero(np.diff(op)) + 1).tolist()
+        for a, b in zip([0] + runs, runs + [self._n]):
+            if a == b:
+                continue
+            if op[a] == H_GATE:
+                circuit.append('H', tgt[a:b].tolist())
+            else:
+                circuit.append('CX', np.stack([ctrl[a:b], tgt[a:b]], axis=1).reshape(-1).tolist())
+        return circuit
+
+    def get_circuit(self, circ_type = 'tequila'):
+        if circ_type == 'tequila':
+            return self.to_tequila()
+        elif circ_type == 'stim':
+            return self.to_stim()
+        elif circ_type == 'qiskit':
+            return self.to_qiskit()
+        elif circ_type == 'native':
+            return self
+        raise ValueError('Unknown circuit type {}'.format(circ_type))
+
+    def __repr__(self) -> str:
+        string = 'QRMcircuit with {} gates'.format(self._n)
+        for name, c, t in self.gates():
+            if c is None:
+                string += '\n{}(target=({},))'.format(name, t)
+            else:
+                string += '\n{}(target=({},), control=({},))'.format(name, t, c)
+        return string
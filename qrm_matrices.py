@@ -2,37 +2,36 @@
 #Praveen Jayakumar, July 2023
 
 import numpy as np
-from qrm_utils import filter_wt, leading_bit_index, get_eval_set, min_set, puncture_matrix, puncture_row
+from qrm_utils import puncture_matrix
+from rm_generators import rm_monomials, dense_generator_r1r2
+from gf2 import monomial_r_matrix
 
 def apply_qubit_partition(i, m, qubit_list):
     #applies Plotkin-i partition of passed qubit_list
     #0 - normal Plotkin partition.
     assert i < m, 'Invalid partition specification.'
 
-    row = get_QRM_generators_r1r2(1, 1, m)[m-i-1]
-    q1 = []
-    q2 = []
-    for j, q in enumerate(row):
-        if q == 0:
-            q1.append(qubit_list[j])
-        else:
-            q2.append(qubit_list[j])
+    #row m-i-1 of G(1, 1, m) is Eval(x_{m-i-1}), ie columns with bit m-i-1 set
+    bit = 1 << (m-i-1)
+    q1 = [qubit_list[j] for j in range(2**m) if not j & bit]
+    q2 = [qubit_list[j] for j in range(2**m) if j & bit]
     return q1, q2
 
 def apply_punc_qubit_partition(i, m, qubit_list, punc_bit_list = [0]):
     #applies Plotkin-i partition of passed qubit_list
     assert i < m, 'Invalid partition specification.'
     
-    row = get_QRM_generators_r1r2(1, 1, m)[m-i-1]
-    p_row = puncture_row(row, punc_bit_list)
+    bit = 1 << (m-i-1)
+    punc_bits = set(punc_bit_list)
+    columns = [j for j in range(2**m) if j not in punc_bits]
 
     q1 = []
     q2 = []
-    for j, q in enumerate(p_row):
-        if q == 0:
-            q1.append(qubit_list[j])
-        else:
+    for j, c in enumerate(columns):
+        if c & bit:
             q2.append(qubit_list[j])
+        else:
+            q1.append(qubit_list[j])
     return q1, q2
 
 def get_full_matrix(m):
@@ -47,13 +46,12 @@ def get_full_matrix(m):
 
 def Hrm(r, m):
     #returns parity check for RM(r, m)
-    F = get_full_matrix(m)
-    return [F[i] for i in range(len(F)) if sum(F[i]) >=2**(r+1)]
+    #rows of weight >= 2**(r+1) are the monomials of degree <= m-r-1
+    return list(dense_generator_r1r2(0, m-r-1, m))
 
 def Grm(r, m):
     #generator for RM(r, m)
-    F = get_full_matrix(m)
-    return [F[i] for i in range(len(F)) if sum(F[i]) >=2**(m-r)]
+    return list(dense_generator_r1r2(0, r, m))
 
 def Hqrm(r, m):
     '''
@@ -79,8 +77,8 @@ def get_QRM_generator(C1_params: tuple, C2_params: tuple):
         return
     
     G2perp = Hrm(r2, m2)
-    G1 = Grm(r1, m1)
-    G1q = filter_wt(G1, weights = [2**(i) for i in range(m1 - r1, r2 + 1)])
+    #rows of G(r1, m1) with weight 2**(m1-r1) to 2**r2
+    G1q = list(dense_generator_r1r2(m1 - r2, r1, m1))
     return (G2perp, G1q)
 
 def get_QRM_punc_generator(C1_params: tuple, C2_params: tuple):
@@ -101,9 +99,15 @@ def get_QRM_generators_r1r2(r1, r2, m):
         print('Invalid parameters r1: {}, r2: {}, m: {}'.format(r1, r2, m))
     if m == 0:
         return [[1]]
-    G1 = Grm(r2, m)
-    G1q = filter_wt(G1, weights = [2**(m-i) for i in range(r1, r2 + 1)])
-    return G1q
+    return list(dense_generator_r1r2(r1, r2, m))
+
+def get_leading_bits_r1r2(r1, r2, m):
+    '''
+    Leading bit indices of the rows of get_QRM_generators_r1r2(r1, r2, m), without building the rows
+    '''
+    if m == 0:
+        return [0]
+    return rm_monomials(r1, r2, m).tolist()
 
 def GeneratorQuotient(r1, r2, m):
     """
@@ -111,28 +115,19 @@ def GeneratorQuotient(r1, r2, m):
     """
     if r1 == r2 or r1 < r2:
         return []
-    G1 = Grm(r1, m)
-
-    G1q = filter_wt(G1, weights = [2**(m-i) for i in range(r2+1, r1+1)])
-    return G1q
+    return list(dense_generator_r1r2(r2 + 1, r1, m))
 
 def get_R(G):
     '''
     Row transform matrix for G(r, m)
-    
+
+    Row i adds the rows whose leading bit is x_i | T, T a subset of the r - |x_i| lowest zero bits of x_i,
+    see gf2.monomial_r_matrix
     '''
     k = len(G)
-    R = []
     if k == 0:
         return [[]]
-    indexes = [leading_bit_index(row) for row in G]
-    eval_sets = [get_eval_set(row, reversed=True) for row in G] #reversed since the rows of G are sorted for increasing leading bit position.
-    r = max([len(s) for s in eval_sets])
-    for i, se in enumerate(eval_sets):
-        ms = min_set(se, r, as_int =True)
-        js = [0]*k
-        for j, s in enumerate(indexes):
-            if s in ms:
-                js[j] = 1
-        R.append(js)
-    return R
\ No newline at end of file
+    G = np.asarray(G)
+    m = int(np.log2(G.shape[1]))
+    indexes = np.argmax(G != 0, axis=1) #rows of G are sorted for increasing leading bit position
+    return monomial_r_matrix(indexes, m).tolist()
@@ -0,0 +1,235 @@
+#opt-in instrumentation of the encoder builders
+#a Profiler swaps the functions and methods of the instrumented modules for timing wrappers while it is active
+#and restores the originals afterwards, so nothing is added to the calls when profiling is off.
+#usage:
+#   with Profiler() as prof:
+#       RecursiveQRM(7, 12)
+#   prof.print_summary(); prof.write_json('profile.json'); prof.write_folded('profile.folded')
+#the folded file (one 'f1;f2;f3 self_microseconds' line per stack) is read by flamegraph.pl and speedscope.
+#the sub-encoder and stream caches are cleared on start and stop, so encoders are rebuilt under the profiler instead
+#of being cache hits, and circuits built while profiling are not reused afterwards.
+#command line: python qrm_profile.py RecursiveQRM 7 12 --json profile.json --folded profile.folded
+
+import sys
+import json
+import argparse
+import time
+import types
+import functools
+import importlib
+import tracemalloc
+
+import qrm_circuits
+import encoder_stream
+
+MODULES = ['qrm_matrices', 'qrm_circuits', 'qrm_circuits_new', 'permutations', 'qrm_gates', 'rm_generators']
+
+#methods that are not worth a wrapper (or are called by the profiler itself)
+SKIP_METHODS = {'__repr__', '__str__', '__format__', '__getattr__', '__getattribute__', '__setattr__', '__delattr__',
+                '__del__', '__new__', '__init_subclass__', '__subclasshook__', '__reduce__', '__reduce_ex__'}
+
+def _targets(module):
+    #(owner, attribute name, function, qualified name) of the functions and methods defined in module
+    for name, obj in list(vars(module).items()):
+        if getattr(obj, '__module__', None) != module.__name__:
+            continue
+        if isinstance(obj, type):
+            for attr, member in list(vars(obj).items()):
+                if attr in SKIP_METHODS:
+                    continue
+                if isinstance(member, (staticmethod, classmethod)):
+                    yield obj, attr, member, '{}.{}.{}'.format(module.__name__, name, attr)
+                elif isinstance(member, types.FunctionType):
+                    yield obj, attr, member, '{}.{}.{}'.format(module.__name__, name, attr)
+        elif callable(obj) and (isinstance(obj, types.FunctionType) or hasattr(obj, 'cache_info')):
+            yield module, name, obj, '{}.{}'.format(module.__name__, name)
+
+def clear_caches():
+    qrm_circuits.clear_sub_encoder_cache()
+    encoder_stream.clear_stream_cache()
+
+class _Frame:
+    __slots__ = ['name', 'start', 'child_time', 'mem_start', 'mem_peak']
+
+    def __init__(self, name, start, mem_start):
+        self.name, self.start, self.child_time = name, start, 0.0
+        self.mem_start = self.mem_peak = mem_start
+
+class Profiler:
+    '''
+    Records, per instrumented function and recursion level (number of active calls of the same function),
+    the call count, cumulative (inclusive) and self time and, with memory = True, the peak traced allocation
+    (tracemalloc, slows the run down). Stacks of self times are kept for flame graphs.
+    '''
+    def __init__(self, modules = MODULES, memory = False):
+        self.modules = [importlib.import_module(m) if isinstance(m, str) else m for m in modules]
+        self.memory = memory
+        self.stats = {} #(name, level) -> [calls, total, self, peak bytes]
+        self.stacks = {} #tuple of names -> self seconds
+        self.wall = 0.0
+        self._stack = []
+        self._depth = {}
+        self._patched = []
+
+    ### recording
+
+    def _enter(self, name):
+        level = self._depth.get(name, 0)
+        self._depth[name] = level + 1
+        mem = 0
+        if self.memory:
+            mem, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent.mem_peak = max(parent.mem_peak, peak)
+            tracemalloc.reset_peak()
+        self._stack.append(_Frame(name, time.perf_counter(), mem))
+        return level
+
+    def _exit(self, level):
+        end = time.perf_counter()
+        frame = self._stack.pop()
+        self._depth[frame.name] = level
+        total = end - frame.start
+        own = total - frame.child_time
+        peak = 0
+        if self.memory:
+            frame.mem_peak = max(frame.mem_peak, tracemalloc.get_traced_memory()[1])
+            peak = frame.mem_peak - frame.mem_start
+            tracemalloc.reset_peak()
+        if self._stack:
+            parent = self._stack[-1]
+            parent.child_time += total
+            parent.mem_peak = max(parent.mem_peak, frame.mem_peak)
+        key = tuple(f.name for f in self._stack) + (frame.name,)
+        self.stacks[key] = self.stacks.get(key, 0.0) + own
+        s = self.stats.get((frame.name, level))
+        if s is None:
+            self.stats[(frame.name, level)] = [1, total, own, peak]
+        else:
+            s[0] += 1
+            s[1] += total
+            s[2] += own
+            s[3] = max(s[3], peak)
+
+    def _wrap(self, function, name):
+        profiler = self
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            level = profiler._enter(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler._exit(level)
+        for attr in ['cache_info', 'cache_clear']:
+            if hasattr(function, attr):
+                setattr(wrapper, attr, getattr(function, attr))
+        return wrapper
+
+    ### patching
+
+    def start(self):
+        clear_caches()
+        originals = {}
+        for module in self.modules:
+            for owner, attr, obj, name in _targets(module):
+                if isinstance(obj, (staticmethod, classmethod)):
+                    wrapped = type(obj)(self._wrap(obj.__func__, name))
+                else:
+                    wrapped = self._wrap(obj, name)
+                    originals[id(obj)] = (obj, wrapped)
+                self._patched.append((owner, attr, obj))
+                setattr(owner, attr, wrapped)
+        #names imported from one instrumented module into another
+        for module in self.modules:
+            for attr, obj in list(vars(module).items()):
+                if id(obj) in originals and originals[id(obj)][0] is obj:
+                    self._patched.append((module, attr, obj))
+                    setattr(module, attr, originals[id(obj)][1])
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._t0 = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.wall += time.perf_counter() - self._t0
+        for owner, attr, obj in reversed(self._patched):
+            setattr(owner, attr, obj)
+        self._patched = []
+        clear_caches()
+        if getattr(self, '_started_tracing', False):
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    ### reports
+
+    def report(self):
+        '''
+        {'wall_s', 'functions': {name: {'calls', 'total_s', 'self_s', 'peak_bytes', 'levels': {level: {...}}}}},
+        total_s of a function counts its outermost calls only (recursive calls are inside them)
+        '''
+        functions = {}
+        for (name, level), (calls, total, own, peak) in sorted(self.stats.items()):
+            f = functions.setdefault(name, {'calls': 0, 'total_s': 0.0, 'self_s': 0.0, 'peak_bytes': 0, 'levels': {}})
+            f['calls'] += calls
+            f['self_s'] += own
+            f['peak_bytes'] = max(f['peak_bytes'], peak)
+            if level == 0:
+                f['total_s'] += total
+            f['levels'][level] = {'calls': calls, 'total_s': total, 'self_s': own, 'peak_bytes': peak}
+        return {'wall_s': self.wall, 'memory': self.memory, 'functions': functions}
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def folded(self):
+        #flame graph lines 'f1;f2;f3 microseconds' of self time per stack
+        return ['{} {}'.format(';'.join(stack), int(round(t*1e6))) for stack, t in sorted(self.stacks.items())]
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            f.write('\n'.join(self.folded()) + '\n')
+
+    def print_summary(self, n = 20, file = sys.stdout):
+        #the n functions with the largest self time
+        functions = self.report()['functions']
+        print('{:>10} {:>10} {:>10} {:>12}  {}'.format('calls', 'total s', 'self s', 'peak MB', 'function'), file=file)
+        for name, f in sorted(functions.items(), key=lambda kv: -kv[1]['self_s'])[:n]:
+            print('{:>10} {:>10.4f} {:>10.4f} {:>12.2f}  {}'.format(f['calls'], f['total_s'], f['self_s'],
+                                                                 f['peak_bytes']/2**20, name), file=file)
+        print('wall {:.4f} s'.format(self.wall), file=file)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile one encoder build.')
+    parser.add_argument('encoder', help='encoder of qrm_circuits or qrm_circuits_new, e.g. RecursiveQRM')
+    parser.add_argument('r', type=int)
+    parser.add_argument('m', type=int)
+    parser.add_argument('--circ-type', default='native')
+    parser.add_argument('--memory', action='store_true', help='record peak allocations with tracemalloc')
+    parser.add_argument('--json', default=None)
+    parser.add_argument('--folded', default=None)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    import qrm_circuits, qrm_circuits_new
+    encoder = getattr(qrm_circuits_new, args.encoder, None) or getattr(qrm_circuits, args.encoder)
+    sys.setrecursionlimit(10000)
+    with Profiler(memory=args.memory) as prof:
+        #looked up again so the instrumented version runs
+        encoder = getattr(sys.modules[encoder.__module__], encoder.__name__)
+        encoder(args.r, args.m, circ_type=args.circ_type)
+    prof.print_summary(args.top)
+    if args.json:
+        prof.write_json(args.json)
+    if args.folded:
+        prof.write_folded(args.folded)
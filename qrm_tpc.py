@@ -1,94 +1,113 @@
 #QRM TPC rates
 #Priya Nadkarni and Praveen Jayakumar
 
+#importable rate engine, the brute force scan, the theorem 3 points and the plot are functions (see __main__)
+#rates are computed from cumulative binomial tables, normalized F[m, j] = sum_{i < j} comb(m, i)/2^m,
+#in float64 (Pascal recurrence, default) or as exact python ints (exact = True)
+
 import math
-import matplotlib.pyplot as plt
-
-def binom_sum(m,start,end):
-    sum_binom = 0
-    for i in range(end-start+1):
-        sum_binom += math.comb(m,start+i)
-    return sum_binom
- 
-def catalytic_rate(r, m): #TPC
-    m1=m
-    m2=m # m2 > m1
-    r1 = r # From RM(0,m1) code
-    r2 = r# m2-r-1 # r2 = 0
-    return (pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)))/pow(2, m1+m2)
-
-points = []
-rs = []
-ms = []
-m_list = list(range(1, 100))
-for m in m_list:
-    for r in range(int((m-1)/2)+1):
-        if m-r-1 < m/2: #checking not self-dual containing.
-            continue
-        cr = catalytic_rate(r, m)
-        if cr > 0:
-            #print(r, m, cr)
-            points.append([r, m])
-            rs.append(r)
-            ms.append(m)
-
-#adding theorem 3 bound
-def lr(r):
-    diff = 1
-    i = 0
-    prods = [math.comb(2*r, u) for u in range(r+1)]
-    while diff > 0:
-        i+=1
-        prods = [p*(2*r + i)/(2*r + i -u) for u, p in enumerate(prods)]
-        diff = sum(prods) - ((2**(2*r + i))/(2 + math.sqrt(2)))
-    return i-1
-
-rs_thm = []
-ms_thm = []
-points_thm = []
-
-for r in range(max(rs)+1):
-    l =  lr(r)
-    m_allowed = [2*r + s for s in range(1, l+1)]
-    for m in m_allowed:
-        if m-r-1 < m/2: #checking not self-dual containing.
-            continue
-        cr = catalytic_rate(r, m) #sanity check
-        if cr > 0:
-            #print(r, m, cr)
-            points_thm.append([r, m])
-            rs_thm.append(r)
-            ms_thm.append(m)
-
-r_lemma = list(range(max(rs)+1))
-m_lemma = [r*2 + 2 for r in r_lemma]
-
-r_lemma_n = list(range(max(rs)+1))
-m_lemma_n = [r*3 + 1 for r in r_lemma]
-
-plt.scatter(rs_thm, ms_thm, s = 15, label = 'Theorem 3')
-plt.scatter(rs, ms, s=2, label = 'found by brute force')
-plt.plot(r_lemma, m_lemma, label = 'lemma 6, m = 2r+2', color='r')
-#plt.plot(r_lemma_n, m_lemma_n, label = 'm = 3r+1', color='g')
-plt.legend()
-plt.xlabel('r')
-plt.ylabel('m')
-plt.savefig('EATPRM.png')
- 
-def EA_rate(r, m):
-    m1 =m
-    m2 =m # m2 > m1
-    r1 =r # From RM(0,m1) code
-    r2 =r# m2-r-1 # r2 = 0
-    return (pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)) + (binom_sum(m1,r1+1,m1-r1-1)*binom_sum(m2,r2+1,m2-r2-1)))/pow(2, m1+m2)
-
-def catalytic_rate(r, m):
-    m1=m
-    m2=m # m2 > m1
-    r1 = r # From RM(0,m1) code
-    r2 = r# m2-r-1 # r2 = 0
-    print("EA Rate = ", (pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)) + (binom_sum(m1,r1+1,m1-r1-1)*binom_sum(m2,r2+1,m2-r2-1)))/pow(2, m1+m2))
-    print("Catalytic rate = ", (pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)))/pow(2, m1+m2))
+from functools import lru_cache
+import numpy as np
+
+LR_THRESHOLD = 1/(2 + math.sqrt(2))
+
+@lru_cache(maxsize=1024)
+def cumulative_binomials(m):
+    '''
+    Exact prefix sums S[j] = sum_{i < j} comb(m, i), j = 0..m+1, as a tuple of python ints
+    '''
+    S, c = [0], 1
+    for i in range(m + 1):
+        S.append(S[-1] + c)
+        c = c*(m - i)//(i + 1)
+    return tuple(S)
+
+def binom_sum(m, start, end):
+    #sum_{start <= i <= end} comb(m, i), exact
+    if end < start:
+        return 0
+    S = cumulative_binomials(m)
+    return S[min(end, m) + 1] - S[min(max(start, 0), m + 1)]
+
+@lru_cache(maxsize=8)
+def _cumulative_table(m_max, exact):
+    if exact:
+        T = np.empty((m_max + 1, m_max + 2), dtype=object)
+        for m in range(m_max + 1):
+            S = cumulative_binomials(m)
+            T[m, :m + 2] = S
+            T[m, m + 2:] = S[-1]
+        return T
+    T = np.ones((m_max + 1, m_max + 2), dtype=np.float64)
+    p = np.zeros(m_max + 1, dtype=np.float64) #comb(m, i)/2^m
+    p[0] = 1
+    for m in range(m_max + 1):
+        if m:
+            p[1:m + 1] = (p[1:m + 1] + p[:m])/2
+            p[0] /= 2
+        T[m, 0] = 0
+        T[m, 1:m + 2] = np.minimum(np.cumsum(p[:m + 1]), 1)
+    return T
+
+def cumulative_table(m_max, exact = False):
+    '''
+    Table T[m, j] for 0 <= m <= m_max, 0 <= j <= m_max + 1 (j > m + 1 holds the full sum):
+    float64 normalized sums sum_{i < j} comb(m, i)/2^m, or with exact = True python int sums sum_{i < j} comb(m, i)
+    '''
+    #tables are grown in steps of 64 so that nearby calls share one table
+    return _cumulative_table(-(-(m_max + 1)//64)*64, exact)
+
+def _prefix(m, j, exact):
+    #normalized (float) or integer prefix sums at broadcast m, j
+    m, j = np.broadcast_arrays(np.asarray(m, dtype=np.int64), np.asarray(j, dtype=np.int64))
+    T = cumulative_table(int(m.max(initial=0)), exact)
+    return T[m, np.clip(j, 0, m + 1)]
+
+def _result(x):
+    x = np.asarray(x)
+    if x.dtype == object:
+        x = x.astype(np.float64)
+    return x[()] if x.ndim == 0 else x
+
+def catalytic_rate_assym(r1, r2, m1, m2, exact = False):
+    '''
+    (2^{m1+m2} - 2 S(m1, m1-r1-1) S(m2, m2-r2-1))/2^{m1+m2}, S(m, k) = sum_{i <= k} comb(m, i).
+    Broadcasts over arrays of parameters, exact = True evaluates with python ints (correctly rounded).
+    '''
+    if not exact:
+        return _result(1 - 2*_prefix(m1, np.subtract(m1, r1), False)*_prefix(m2, np.subtract(m2, r2), False))
+    f = np.frompyfunc(lambda r1, r2, m1, m2: (2**(m1 + m2) - 2*binom_sum(m1, 0, m1-r1-1)*binom_sum(m2, 0, m2-r2-1))/2**(m1 + m2), 4, 1)
+    return _result(f(r1, r2, m1, m2))
+
+def catalytic_rate(r, m, exact = False): #TPC
+    return catalytic_rate_assym(r, r, m, m, exact=exact)
+
+def EA_rate(r1, r2, m1 = None, m2 = None, exact = False):
+    '''
+    Entanglement assisted rate of the (r1, m1), (r2, m2) TPC, EA_rate(r, m) for r1 = r2 = r, m1 = m2 = m
+    '''
+    if m1 is None:
+        r1, r2, m1, m2 = r1, r1, r2, r2
+    if not exact:
+        #sum_{r+1 <= i <= m-r-1} comb(m, i)/2^m, zero for empty ranges
+        G1 = np.maximum(_prefix(m1, np.subtract(m1, r1), False) - _prefix(m1, np.add(r1, 1), False), 0)
+        G2 = np.maximum(_prefix(m2, np.subtract(m2, r2), False) - _prefix(m2, np.add(r2, 1), False), 0)
+        return _result(catalytic_rate_assym(r1, r2, m1, m2) + G1*G2)
+    f = np.frompyfunc(lambda r1, r2, m1, m2: (2**(m1 + m2) - 2*binom_sum(m1, 0, m1-r1-1)*binom_sum(m2, 0, m2-r2-1)
+                                              + binom_sum(m1, r1+1, m1-r1-1)*binom_sum(m2, r2+1, m2-r2-1))/2**(m1 + m2), 4, 1)
+    return _result(f(r1, r2, m1, m2))
+
+def catalytic_rate_RM(r, m, exact = False):
+    if not exact:
+        return _result(2*_prefix(m, np.add(r, 1), False) - 1)
+    f = np.frompyfunc(lambda r, m: (2*binom_sum(m, 0, r) - 2**m)/2**m, 2, 1)
+    return _result(f(r, m))
+
+def print_rates(r, m):
+    #rates of the (r, m) TPC and of the example (r1, m1, r2, m2) = (0, 4, 1, 10) code
+    m1, m2, r1, r2 = m, m, r, r
+    print("EA Rate = ", EA_rate(r, m, exact=True))
+    print("Catalytic rate = ", catalytic_rate(r, m, exact=True))
     print("1(b) Rate in last step = ", binom_sum(m1,0,r1)*(binom_sum(m2,m2-r2,m2) + binom_sum(m2,0,r2)))
     m1=4
     m2=10 # m2 > m1
@@ -97,24 +116,78 @@ def catalytic_rate(r, m):
     r2 = m2-r-1 # r2 = 1
     print("2(a) Rate in first step = ", pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)) + (binom_sum(m1,r1+1,m1-r1-1)*binom_sum(m2,r2+1,m2-r2-1)))
     print("2(b) Rate in last step = ", binom_sum(m1,0,r1)*(binom_sum(m2,m2-r2,m2) + binom_sum(m2,0,r2)))
- 
-def EA_rate(r1, r2, m1, m2):
-    return (pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)) + (binom_sum(m1,r1+1,m1-r1-1)*binom_sum(m2,r2+1,m2-r2-1)))/pow(2, m1+m2)
 
-def catalytic_rate_assym(r1, r2, m1, m2):
-    return (pow(2, m1+m2) - (2*binom_sum(m1,0,m1-r1-1)*binom_sum(m2,0,m2-r2-1)))/pow(2, m1+m2)
+### theorem 3 bound
 
-def catalytic_rate_RM(r, m):
-    return (2*(binom_sum(m, 0, r)) - pow(2, m))/pow(2, m)
+def _below_threshold(r, m):
+    #sum_{i <= r} comb(m, i) <= 2^m/(2 + sqrt(2)), decreasing in m for fixed r
+    return binom_sum(m, 0, r)/2**m <= LR_THRESHOLD
+
+def lr(r):
+    '''
+    l(r) = (first i >= 1 with sum_{u <= r} comb(2r+i, u) <= 2^{2r+i}/(2 + sqrt(2))) - 1,
+    by doubling then binary search on i (the condition is monotone in i)
+    '''
+    hi = 1
+    while not _below_threshold(r, 2*r + hi):
+        hi *= 2
+    lo = hi//2 #condition false at lo (or lo = 0)
+    while hi - lo > 1:
+        mid = (lo + hi)//2
+        if _below_threshold(r, 2*r + mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi - 1
 
 def obtain_l_r(r):
-    for m0 in range(300):
-        m = 2*r+1 + m0
-        if binom_sum(m,0,r) <= (pow(2,m)/(2+np.sqrt(2))):
-            return m-1
+    #largest m with sum_{i <= r} comb(m, i) > 2^m/(2 + sqrt(2)), m >= 2r
+    return 2*r + lr(r)
+
+def positive_rate_points(m_max = 99):
+    '''
+    (rs, ms) with 1 <= m <= m_max, r <= (m-1)/2, m-r-1 >= m/2 (not self-dual containing) and catalytic_rate(r, m) > 0,
+    in the order of the brute force scan (m, then r)
+    '''
+    m, r = np.meshgrid(np.arange(1, m_max + 1), np.arange(0, (m_max - 1)//2 + 1), indexing='ij')
+    valid = (r <= (m - 1)//2) & (m - r - 1 >= m/2)
+    valid[valid] = catalytic_rate(r[valid], m[valid]) > 0
+    return r[valid].tolist(), m[valid].tolist()
+
+def theorem3_points(r_max):
+    #(rs, ms) with 2r < m <= 2r + l(r), not self-dual containing and positive catalytic rate (sanity check)
+    rs, ms = [], []
+    for r in range(r_max + 1):
+        m = np.arange(2*r + 1, 2*r + lr(r) + 1)
+        m = m[(m - r - 1 >= m/2)]
+        m = m[catalytic_rate(r, m) > 0] if len(m) else m
+        rs += [r]*len(m)
+        ms += m.tolist()
+    return rs, ms
+
+def plot_rates(m_max = 99, path = 'EATPRM.png'):
+    '''
+    Scatter of the (r, m) with positive catalytic rate found by brute force and by theorem 3, saved to path
+    '''
+    import matplotlib.pyplot as plt
+    rs, ms = positive_rate_points(m_max)
+    rs_thm, ms_thm = theorem3_points(max(rs))
+
+    r_lemma = list(range(max(rs)+1))
+    m_lemma = [r*2 + 2 for r in r_lemma]
+
+    plt.scatter(rs_thm, ms_thm, s = 15, label = 'Theorem 3')
+    plt.scatter(rs, ms, s=2, label = 'found by brute force')
+    plt.plot(r_lemma, m_lemma, label = 'lemma 6, m = 2r+2', color='r')
+    plt.legend()
+    plt.xlabel('r')
+    plt.ylabel('m')
+    plt.savefig(path)
 
 def main(l, u):
     for r in range(l, u):
         print("r = ", r+1, ", lower bound = ", (2 * (r+1) + 2),", l(r) = ", obtain_l_r(r+1), ", difference = ", obtain_l_r(r+1) -(2 * (r+1) + 2)+1)
 
-main(530, 540)
\ No newline at end of file
+if __name__ == '__main__':
+    plot_rates()
+    main(530, 540)
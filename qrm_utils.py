@@ -7,6 +7,11 @@ import copy
 import tequila
 from qiskit import QuantumCircuit
 from qiskit.tools.visualization import circuit_drawer
+import stim
+from qrm_gates import QRMcircuit, CX_GATE, qubit_map_array
+from permutations import Permutation
+from stim_utils import tequila_to_stim
+from rm_generators import binom_range
 
 def binom_sum(m,start,end):
     #includes start and end
@@ -16,7 +21,10 @@ def binom_sum(m,start,end):
     if start > m or end > m:
         print('Print comb start or end larger than m')
         return
-    return np.sum([math.comb(m, i) for i in range(start, end + 1)])
+    if start < 0:
+        raise ValueError('start must be non-negative')
+    #exact python int, from the cached cumulative binomials
+    return binom_range(m, start, end)
 
 def reorder_wt(G, reverse = True):
     #orders rows with weight
@@ -210,16 +218,91 @@ def draw_tequila_circuit(circuit, justify = 'left'):
     qc = get_qiskit_circuit(circuit)
     return circuit_drawer(qc, fold=-1, justify = justify)
 
-def check_if_same_circuit(circuit_1, circuit_2, tol = 1e-6):
+def check_if_same_circuit(circuit_1, circuit_2, tol = 1e-6, method = 'statevector', qubit_map = None):
     '''
-    checks if two tequila circuits are the same by simulating
-    #todo: do this with stim for more qubits and faster simulation.
+    checks if two circuits are the same
+    method:
+        'statevector': simulates both tequila circuits on |0..0> and compares the wavefunctions (exponential in qubits)
+        'stabilizer': compares the stabilizer states prepared from |0..0>, up to global phase
+        'tableau': compares the Clifford tableaus, ie the unitaries up to global phase
+    'stabilizer' and 'tableau' are polynomial time with stim, for Clifford (H + CNOT) circuits given as tequila, QRMcircuit or stim.
+    qubit_map: qubit q of circuit_1 corresponds to qubit qubit_map[q] of circuit_2, as dict (eg. position dict),
+    Permutation or array. With P moving qubit q to qubit_map[q], 'tableau' checks U_1 = U_2 P (input qubits) and
+    'stabilizer' checks P U_1|0> = U_2|0> (output qubits, the all zero input is permutation invariant).
     '''
-    wf1 = tequila.simulate(circuit_1)
-    wf2 = tequila.simulate(circuit_2)
-    wf3 = wf1 - wf2
-    diff = sum(np.abs(list(wf3.values())))
-    return diff < tol
+    if method == 'statevector':
+        wf1 = tequila.simulate(circuit_1)
+        wf2 = tequila.simulate(circuit_2)
+        wf3 = wf1 - wf2
+        diff = sum(np.abs(list(wf3.values())))
+        return diff < tol
+    
+    c1 = to_stim_circuit(circuit_1)
+    c2 = to_stim_circuit(circuit_2)
+    if method == 'stabilizer':
+        if qubit_map is not None:
+            c1 = c1 + permutation_circuit(qubit_map)
+        #U_2^dagger U_1 |0> = |0> iff its inverse maps every Z_i to a product of Z's with sign +
+        tableau = inverse_tableau(c1 + c2.inverse())
+        _, _, z2x, _, _, z_signs = tableau.to_numpy(bit_packed=True)
+        return not z2x.any() and not z_signs.any()
+    if method == 'tableau':
+        if qubit_map is not None:
+            c2 = permutation_circuit(qubit_map) + c2
+        return is_identity_tableau(inverse_tableau(c1 + c2.inverse()))
+    raise ValueError('Unknown method {}'.format(method))
+
+def to_stim_circuit(circuit):
+    if isinstance(circuit, stim.Circuit):
+        return circuit
+    if isinstance(circuit, QRMcircuit):
+        return circuit.to_stim()
+    return tequila_to_stim(circuit)
+
+def inverse_tableau(circuit):
+    #the tableau simulator tracks the inverse tableau, cheaper than stim.Tableau.from_circuit
+    sim = stim.TableauSimulator()
+    sim.do(circuit)
+    return sim.current_inverse_tableau()
+
+def permutation_circuit(qubit_map):
+    '''
+    stim circuit of SWAPs moving qubit q to qubit_map[q], unmapped qubits are filled in sorted order
+    '''
+    qmap = qubit_map_array(qubit_map)
+    keys = np.flatnonzero(qmap >= 0)
+    P = Permutation(dict(zip(keys.tolist(), qmap[keys].tolist())))
+    n = max(len(qmap), int(qmap.max(initial=-1)) + 1)
+    P.fill(range(n))
+    perm = P.array
+    circuit = stim.Circuit()
+    seen = np.zeros(n, dtype=bool)
+    for start in range(n):
+        if seen[start]:
+            continue
+        #cycle start -> perm[start] -> ..., SWAP(c0, c1), SWAP(c0, c2), ...
+        seen[start] = True
+        q = int(perm[start])
+        while q != start:
+            circuit.append('SWAP', [start, q])
+            seen[q] = True
+            q = int(perm[q])
+    return circuit
+
+def is_identity_tableau(tableau):
+    x2x, x2z, z2x, z2z, x_signs, z_signs = tableau.to_numpy(bit_packed=True)
+    if x2z.any() or z2x.any() or x_signs.any() or z_signs.any():
+        return False
+    n = len(tableau)
+    diag = np.arange(n)
+    bits = (1 << (diag % 8)).astype(np.uint8)
+    for M in (x2x, z2z):
+        if not (M[diag, diag//8] & bits).all():
+            return False
+        M[diag, diag//8] ^= bits
+        if M.any():
+            return False
+    return True
 
 def puncture_row(row, remove_ind = [0]):
     '''
@@ -237,33 +320,51 @@ def puncture_matrix(M, remove_ind = [0]):
     '''
     return [puncture_row(row, remove_ind=remove_ind) for row in M]
 
-def connectivity(circuit, n_qubit):
+def cnot_arrays(circuit):
+    '''
+    Flat (controls, targets) arrays of a CNOT-only circuit
+    circuit: tequila circuit, QRMcircuit or a (controls, targets) pair
+    '''
+    if isinstance(circuit, QRMcircuit):
+        assert (circuit.opcodes == CX_GATE).all(), 'Gate not CNOT, error.'
+        return circuit.controls, circuit.targets
+    if isinstance(circuit, tuple):
+        return np.asarray(circuit[0]), np.asarray(circuit[1])
+    controls, targets = [], []
+    for gate in circuit.gates:
+        assert gate.name.lower() == 'x', 'Gate not CNOT, error.'
+        assert len(gate.control) == 1, 'Gate has incorrect controls'
+        assert len(gate.target) == 1, 'Gate has incorrect targets'
+        controls.append(gate.control[0])
+        targets.append(gate.target[0])
+    return np.array(controls, dtype=np.int64), np.array(targets, dtype=np.int64)
+
+def bitset_to_set(b):
+    #set of the positions of the 1 bits of the python int b
+    if b == 0:
+        return set()
+    bits = np.unpackbits(np.frombuffer(b.to_bytes((b.bit_length() + 7)//8, 'little'), dtype=np.uint8), bitorder='little')
+    return set(np.flatnonzero(bits).tolist())
+
+def connectivity(circuit, n_qubit, as_bitsets = False):
     '''
     Returns (list((control connectivity, target connectivity)), Ed)
     Assuming input circuit with only CNOT gates
 
-    ''' 
-    if len(circuit.gates) == 0:
-        return [{'x': set(), 'z': set()} for _ in range(n_qubit)], 0
-    
-    #recursively call
-    gate = circuit.gates[0]
-    rec_circuit = tequila.QCircuit(gates = circuit.gates[1:])
-    conn_res, Ed = connectivity(rec_circuit, n_qubit)
-
-    #add gate
-    assert gate.name.lower() == 'x', 'Gate not CNOT, error.'
-    assert len(gate.control) == 1, 'Gate has incorrect controls'
-    assert len(gate.target) == 1, 'Gate has incorrect targets'
+    Single reverse pass over the gates, with the X and Z reachability of every qubit kept as python int bitsets.
+    as_bitsets: return [{'x': int, 'z': int}] instead of sets, bit q set for qubit q
+    '''
+    controls, targets = cnot_arrays(circuit)
+    x = [0]*n_qubit
+    z = [0]*n_qubit
+    for control, target in zip(reversed(controls.tolist()), reversed(targets.tolist())):
+        x[control] |= x[target] | (1 << target)
+        z[target] |= z[control] | (1 << control)
     
-    control = gate.control[0]
-    target = gate.target[0]
-
-    #combine
-    conn_res[control]['x'] = conn_res[control]['x'].union(conn_res[target]['x'])
-    conn_res[control]['x'].add(target)
-    conn_res[target]['z'] = conn_res[target]['z'].union(conn_res[control]['z'])
-    conn_res[target]['z'].add(control)
-
-    Ed = np.average([len(conn_res[i]['x'].union(conn_res[i]['z'])) for i in range(n_qubit)])
-    return conn_res, Ed
\ No newline at end of file
+    if len(controls) == 0:
+        Ed = 0
+    else:
+        Ed = np.average([(a | b).bit_count() for a, b in zip(x, z)])
+    if as_bitsets:
+        return [{'x': a, 'z': b} for a, b in zip(x, z)], Ed
+    return [{'x': bitset_to_set(a), 'z': bitset_to_set(b)} for a, b in zip(x, z)], Ed
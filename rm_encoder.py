@@ -0,0 +1,139 @@
+#batched classical Reed-Muller encoding by the Plotkin butterfly
+#the codeword of the message a (one bit per monomial x, in the order of rm_monomials(0, r, m), ie the rows of
+#Grm(r, m)) is c[z] = sum_{x contained in z} a[x]. Writing a on the monomial coordinates of a 2^m array and running
+#the m butterfly layers hi ^= lo (the (u | u+v) step of QRM_rec_classical_circuit, one layer per recursion level)
+#gives c in place with O(n log n) word operations.
+#two batch layouts:
+#   packed along the batch (as qrm_decoder.pack_shots): (k, words) -> (n, words) uint64, 64 codewords per word,
+#          all m layers are word XORs
+#   rows: (batch, k) 0/1 messages -> (batch, n) uint8 codewords or (batch, n_words(m)) uint64 rows bit-packed as
+#          rm_generators. The messages are packed with np.packbits, every message byte is deposited on the coordinate
+#          words z >> 6 by a table that already holds the 6 low layers (the butterflies are linear), the layers of
+#          the higher bits are word XORs.
+#subcodes keep the monomials of degree r1 to r (or any monomial list), punctured codes drop coordinates
+#(punctured=True drops coordinate 0, as QRM_rec_punc_circuit).
+#the partitions of the recursive circuits only reorder the layers, the codewords are the same.
+
+import numpy as np
+from functools import lru_cache
+from rm_generators import rm_monomials, n_words
+from qrm_decoder import subset_sums
+
+def code_monomials(r, m, r1 = 0, monomials = None):
+    '''
+    Monomials (message coordinates) of the subcode of RM(r, m) spanned by the monomials of degree r1 to r,
+    or the given monomial indices
+    '''
+    if monomials is not None:
+        return np.asarray(monomials, dtype=np.int64)
+    return rm_monomials(r1, r, m)
+
+def kept_coordinates(m, punctured):
+    #codeword coordinates left after puncturing (None: all)
+    if punctured is True:
+        punctured = [0]
+    if punctured is None or punctured is False or len(punctured) == 0:
+        return None
+    keep = np.ones(1 << m, dtype=bool)
+    keep[np.asarray(punctured, dtype=np.int64)] = False
+    return np.flatnonzero(keep)
+
+def _check(r, m):
+    if r > m or m < 0 or r < -1:
+        print('Invalid parameters r, m : {}, {}'.format(r, m))
+        return False
+    return True
+
+### packed along the batch
+
+def rm_encode_packed(messages, r, m, r1 = 0, monomials = None, punctured = None, chunk = 256):
+    '''
+    Codewords (n, words) of the messages (k, words) bit-packed along the batch (qrm_decoder.pack_shots),
+    bit i of a message is the coefficient of code_monomials(r, m, r1, monomials)[i].
+    punctured: coordinates to drop (True for [0]). The words are encoded in chunks of chunk columns.
+    The unpunctured output is in the layout of qrm_decoder.reed_decode.
+    '''
+    if not _check(r, m):
+        return None
+    monomials = code_monomials(r, m, r1, monomials)
+    messages = np.asarray(messages, dtype=np.uint64)
+    if messages.ndim != 2 or messages.shape[0] != len(monomials):
+        raise ValueError('Messages of shape {}, expected ({}, words)'.format(messages.shape, len(monomials)))
+    words, n = messages.shape[1], 1 << m
+    keep = kept_coordinates(m, punctured)
+    out = np.empty((n if keep is None else len(keep), words), dtype=np.uint64)
+    for start in range(0, words, chunk):
+        stop = min(start + chunk, words)
+        block = np.zeros((n, stop - start), dtype=np.uint64)
+        block[monomials] = messages[:, start:stop]
+        subset_sums(block, m)
+        out[:, start:stop] = block if keep is None else block[keep]
+    return out
+
+### rows
+
+def _low_layers(w, bits):
+    #subset sums over the low bits of the coordinates inside uint64 words, in place
+    for b in range(bits):
+        mask = np.uint64(sum(1 << j for j in range(64) if not j >> b & 1))
+        w ^= (w & mask) << np.uint64(1 << b)
+    return w
+
+@lru_cache(maxsize=128)
+def _byte_tables(monomials, m):
+    '''
+    (words, bytes, tables) with tables[i] (256,) uint64 the low layers of the coordinates in word words[i] set by
+    every value of the packed message byte bytes[i] (a byte holding monomials of two words has two tables)
+    '''
+    monomials = np.asarray(monomials, dtype=np.int64)
+    values = np.arange(256, dtype=np.uint64)
+    tables = {}
+    for i, z in enumerate(monomials.tolist()):
+        key = (z >> 6, i//8)
+        if key not in tables:
+            tables[key] = np.zeros(256, dtype=np.uint64)
+        tables[key] |= ((values >> np.uint64(i % 8)) & np.uint64(1)) << np.uint64(z & 63)
+    keys = sorted(tables)
+    T = np.array([tables[key] for key in keys], dtype=np.uint64).reshape(-1, 256)
+    words = np.array([h for h, j in keys], dtype=np.int64)
+    return words, np.array([j for h, j in keys], dtype=np.int64), _low_layers(T, min(m, 6))
+
+def _encode_rows(messages, m, tables, out):
+    #bit-packed rows (batch, n_words(m)) of the codewords of messages
+    words, positions, T = tables
+    packed = np.packbits(messages, axis=1, bitorder='little').T.astype(np.intp)
+    cols = np.zeros((out.shape[1], len(out)), dtype=np.uint64)
+    for h, j, t in zip(words.tolist(), positions.tolist(), T):
+        cols[h] ^= t.take(packed[j])
+    for b in range(6, m):
+        v = cols.reshape(1 << (m-b-1), 2, 1 << (b-6), cols.shape[1])
+        v[:, 1] ^= v[:, 0]
+    out[:] = cols.T
+    return out
+
+def rm_encode(messages, r, m, r1 = 0, monomials = None, punctured = None, packed_rows = False, chunk = 4096):
+    '''
+    Codewords (batch, n) uint8 of the messages (batch, k), bit i of a message is the coefficient of
+    code_monomials(r, m, r1, monomials)[i], so rm_encode(a, r, m) = a Grm(r, m) mod 2.
+    punctured: coordinates to drop (True for [0]). packed_rows: return the rows bit-packed as rm_generators,
+    (batch, n_words(m)) uint64 (unpunctured). The batch is encoded in chunks of chunk rows.
+    '''
+    if not _check(r, m):
+        return None
+    monomials = code_monomials(r, m, r1, monomials)
+    messages = np.asarray(messages, dtype=np.uint8)
+    if messages.ndim != 2 or messages.shape[1] != len(monomials):
+        raise ValueError('Messages of shape {}, expected (batch, {})'.format(messages.shape, len(monomials)))
+    tables = _byte_tables(tuple(monomials.tolist()), m)
+    batch = len(messages)
+    rows = np.empty((batch, n_words(m)), dtype=np.uint64)
+    for start in range(0, batch, chunk):
+        stop = min(start + chunk, batch)
+        _encode_rows(messages[start:stop], m, tables, rows[start:stop])
+    if packed_rows:
+        if kept_coordinates(m, punctured) is not None:
+            raise ValueError('packed_rows codewords are unpunctured')
+        return rows
+    keep = kept_coordinates(m, punctured)
+    out = np.unpackbits(rows.astype('<u8', copy=False).view(np.uint8), axis=1, count=1 << m, bitorder='little')
+    return out if keep is None else out[:, keep]
@@ -0,0 +1,210 @@
+#bit-packed Reed-Muller generator rows, built directly from monomial indices
+
+import math
+import numpy as np
+from functools import lru_cache
+
+CACHE_SIZE = 128
+
+def _readonly(a):
+    a.flags.writeable = False
+    return a
+
+def _low_masks():
+    #word patterns for the low 6 bits of a monomial index
+    masks = np.zeros(64, dtype=np.uint64)
+    for low in range(64):
+        w = 0
+        for t in range(64):
+            if t & low == low:
+                w |= 1 << t
+        masks[low] = w
+    return masks
+
+LOW_MASKS = _readonly(_low_masks())
+
+def n_words(m):
+    '''
+    Number of uint64 words holding a row of length 2**m
+    '''
+    return max(1, (1 << m) >> 6)
+
+@lru_cache(maxsize=None)
+def popcounts(m):
+    '''
+    Degree (number of variables) of every monomial index in [0, 2**m)
+    '''
+    idx = np.arange(1 << m, dtype=np.int64)
+    pc = np.zeros(1 << m, dtype=np.int64)
+    for b in range(m):
+        pc += (idx >> b) & 1
+    return _readonly(pc)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rm_monomials(r1, r2, m):
+    '''
+    Monomial indices of degree r1 to r2 in increasing order.
+
+    These are the leading bit indices of the rows of the m-fold tensor power of [[1, 1], [0, 1]]
+    with weight 2**(m-r2) to 2**(m-r1), in the order the rows appear.
+    '''
+    pc = popcounts(m)
+    return _readonly(np.flatnonzero((pc >= r1) & (pc <= r2)))
+
+def pack_monomial_rows(indices, m):
+    '''
+    Bit-packed evaluation vectors of the monomials in indices.
+
+    Column j of row i is 1 iff the bits of i are contained in j,
+    stored in bit j%64 of word j//64.
+    '''
+    indices = np.asarray(indices, dtype=np.int64)
+    if m < 6:
+        masks = LOW_MASKS[indices & 63] & np.uint64((1 << (1 << m)) - 1)
+        return masks.reshape(-1, 1)
+    low = indices & 63
+    high = (indices >> 6)[:, None]
+    words = np.arange(n_words(m), dtype=np.int64)[None, :]
+    return np.where((words & high) == high, LOW_MASKS[low][:, None], np.uint64(0))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def packed_generator_r1r2(r1, r2, m):
+    '''
+    Bit-packed rows of G(r2, m) with degree r1 to r2, shape (k, n_words(m))
+    '''
+    return _readonly(pack_monomial_rows(rm_monomials(r1, r2, m), m))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def packed_generator(r, m):
+    '''
+    Bit-packed rows of G(r, m)
+    '''
+    return packed_generator_r1r2(0, r, m)
+
+def unpack_rows(packed, m, dtype=np.int64):
+    '''
+    Dense 0/1 matrix of shape (k, 2**m) from bit-packed rows
+    '''
+    packed = np.ascontiguousarray(packed, dtype='<u8')
+    bits = np.unpackbits(packed.view(np.uint8), axis=1, bitorder='little')
+    return bits[:, :1 << m].astype(dtype)
+
+def dense_generator_r1r2(r1, r2, m):
+    return unpack_rows(packed_generator_r1r2(r1, r2, m), m)
+
+def cache_info():
+    return {'rm_monomials': rm_monomials.cache_info(),
+            'packed_generator': packed_generator.cache_info(),
+            'packed_generator_r1r2': packed_generator_r1r2.cache_info()}
+
+def clear_cache():
+    rm_monomials.cache_clear()
+    packed_generator.cache_clear()
+    packed_generator_r1r2.cache_clear()
+
+@lru_cache(maxsize=None)
+def cumulative_binomials(n):
+    '''
+    [sum_{d < k} comb(n, d) for k in range(n + 2)]
+    '''
+    cum = [0]
+    for d in range(n + 1):
+        cum.append(cum[-1] + math.comb(n, d))
+    return cum
+
+def binom_range(n, lo, hi):
+    #sum of comb(n, d) for lo <= d <= hi
+    lo, hi = max(lo, 0), min(hi, n)
+    if lo > hi:
+        return 0
+    cum = cumulative_binomials(n)
+    return cum[hi + 1] - cum[lo]
+
+def monomial_rank(x, lo, hi):
+    '''
+    Number of monomial indices y < x with degree lo to hi, in O(log x)
+    '''
+    count = 0
+    ones = 0
+    for b in range(x.bit_length() - 1, -1, -1):
+        if x >> b & 1:
+            #y shares the bits of x above b, has 0 at b and any lower bits
+            count += binom_range(b, lo - ones, hi - ones)
+            ones += 1
+    return count
+
+class MonomialIndex:
+    '''
+    Row positions of a generator matrix over 2**m columns whose rows are monomial evaluation vectors.
+
+    The rows are given as blocks (lo, hi, n): the monomials in the first n variables with
+    degree lo to hi, in increasing index order. Positions are computed in O(m) from the monomial
+    index, replacing the {tuple(row): position} dictionaries of RowIndexList.
+    '''
+    def __init__(self, m, blocks):
+        self.m = m
+        self.blocks = [tuple(b) for b in blocks]
+        self.offsets = [0]
+        for lo, hi, n in self.blocks:
+            self.offsets.append(self.offsets[-1] + binom_range(n, lo, hi))
+    
+    def __len__(self):
+        return self.offsets[-1]
+    
+    def find(self, monomial):
+        #position of monomial, None if not a row. Later blocks take precedence, as in a dict.
+        monomial = int(monomial)
+        if monomial < 0:
+            return None
+        d = bin(monomial).count('1')
+        for (lo, hi, n), offset in zip(reversed(self.blocks), reversed(self.offsets[:-1])):
+            if monomial < 1 << n and lo <= d <= hi:
+                return offset + monomial_rank(monomial, lo, hi)
+        return None
+    
+    def index(self, monomial):
+        i = self.find(monomial)
+        if i is None:
+            raise KeyError(monomial)
+        return i
+    
+    def plotkin(self, monomial, half):
+        '''
+        Position of the (u, u) (half = 0) or (0, u) (half = 1) row, with u = Eval^{m-1}(monomial)
+        '''
+        return self.index(monomial | (half << (self.m - 1)))
+    
+    def monomials(self):
+        #monomial indices in row order
+        if len(self.blocks) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([rm_monomials(lo, hi, n) for lo, hi, n in self.blocks])
+    
+    def __contains__(self, monomial):
+        return self.find(monomial) is not None
+    
+    def __getitem__(self, key):
+        '''
+        Accepts a monomial index or, as RowIndexList, an evaluation vector of length 2**m
+        '''
+        if isinstance(key, (int, np.integer)):
+            return self.index(key)
+        row = np.asarray(key)
+        nz = np.flatnonzero(row)
+        if len(row) != 1 << self.m or len(nz) == 0:
+            raise KeyError(tuple(key))
+        monomial = int(nz[0])
+        if not np.array_equal(row != 0, unpack_rows(pack_monomial_rows([monomial], self.m), self.m)[0] != 0):
+            raise KeyError(tuple(key))
+        return self.index(monomial)
+    
+    def to_dict(self):
+        '''
+        Equivalent RowIndexList dictionary {tuple(row): position}
+        '''
+        monomials = self.monomials()
+        rows = unpack_rows(pack_monomial_rows(monomials, self.m), self.m)
+        return {tuple(row): self.index(i) for i, row in zip(monomials.tolist(), rows)}
+    
+    def __repr__(self) -> str:
+        return 'MonomialIndex(m={}, blocks={})'.format(self.m, self.blocks)
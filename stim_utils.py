@@ -1,11 +1,19 @@
 #utilities for simulation with stim
 #Praveen Jayakumar, July 2023
+import numpy as np
 import stim
+import tequila
+from qrm_gates import QRMcircuit, GATE_NAMES, H_GATE, qubit_map_array
+
+#tequila name -> stim name, uncontrolled and singly controlled
+SINGLE_QUBIT_GATES = {'H': 'H', 'X': 'X', 'Y': 'Y', 'Z': 'Z'}
+CONTROLLED_GATES = {'X': 'CX', 'Y': 'CY', 'Z': 'CZ'}
+#phase angle in units of pi/2 -> stim name
+PHASE_GATES = {1: 'S', 2: 'Z', 3: 'S_DAG'}
 
 def stim_CNOT_list(controls, targets):
     circuit = stim.Circuit()
-    for c, t in zip(controls, targets):
-        circuit.append("CNOT", [c, t])
+    circuit.append("CNOT", [q for pair in zip(controls, targets) for q in pair])
     return circuit
 
 def stim_H_list(targets = []):
@@ -13,24 +21,179 @@ def stim_H_list(targets = []):
     circuit.append("H", targets)
     return circuit
 
+def tequila_gate_to_stim(gate):
+    '''
+    (stim name, targets) of a Clifford tequila gate, raises ValueError for non Clifford gates
+    '''
+    name = gate.name
+    target, control = list(gate.target), list(gate.control)
+    if name == 'SWAP' and len(control) == 0:
+        return 'SWAP', target
+    if name == 'Phase' and len(control) == 0:
+        quarter_turns = float(gate.parameter)/(np.pi/2)
+        k = int(np.round(quarter_turns))
+        if abs(quarter_turns - k) < 1e-9:
+            if k % 4 == 0:
+                return None, []
+            return PHASE_GATES[k % 4], target
+    if len(control) == 0 and name in SINGLE_QUBIT_GATES:
+        return SINGLE_QUBIT_GATES[name], target
+    if len(control) == 1 and name in CONTROLLED_GATES:
+        return CONTROLLED_GATES[name], [q for t in target for q in (control[0], t)]
+    raise ValueError('Gate {} has no stim equivalent.'.format(gate))
+
+def circuit_moments(circuit):
+    '''
+    Splits a tequila circuit or QRMcircuit into moments, each a list of (stim name, targets) acting on disjoint qubits.
+    QRMcircuit keeps its own moments, tequila gates are layered greedily in circuit order.
+    '''
+    if isinstance(circuit, QRMcircuit):
+        op, ctrl, tgt = circuit.opcodes, circuit.controls, circuit.targets
+        bounds = circuit.moments.tolist() + [len(circuit)]
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            runs = (a + np.flatnonzero(np.diff(op[a:b])) + 1).tolist()
+            moment = []
+            for s, e in zip([a] + runs, runs + [b]):
+                if s == e:
+                    continue
+                if op[s] == H_GATE:
+                    moment.append((GATE_NAMES[H_GATE], tgt[s:e].tolist()))
+                else:
+                    moment.append((GATE_NAMES[op[s]], np.stack([ctrl[s:e], tgt[s:e]], axis=1).reshape(-1).tolist()))
+            yield moment
+        return
+
+    moment, used = {}, set()
+    for gate in circuit.gates:
+        name, targets = tequila_gate_to_stim(gate)
+        if name is None:
+            continue
+        qubits = set(targets)
+        if used & qubits:
+            yield list(moment.items())
+            moment, used = {}, set()
+        moment.setdefault(name, []).extend(targets)
+        used |= qubits
+    if moment:
+        yield list(moment.items())
+
+def check_noises(noises):
+    '''
+    noises: list of (stim noise channel, argument(s)), e.g. [('DEPOLARIZE2', 1e-3), ('X_ERROR', 1e-4)]
+    '''
+    checked = []
+    for name, args in noises:
+        data = stim.gate_data(name)
+        if not data.is_noisy_gate or data.produces_measurements:
+            raise ValueError('{} is not a noise channel.'.format(name))
+        checked.append((data.name, list(np.atleast_1d(args).astype(float)), data.is_two_qubit_gate))
+    return checked
+
+def add_noise(stim_circuit, noises, moment, idle_qubits = None):
+    '''
+    Appends the checked noises after a moment. Two qubit channels act on the pairs of the two qubit gates,
+    single qubit channels on the qubits of the moment, or on idle_qubits if given (noise per layer).
+    '''
+    for name, args, two_qubit in noises:
+        if two_qubit:
+            pairs = [q for gate, targets in moment if stim.gate_data(gate).is_two_qubit_gate for q in targets]
+            if len(pairs):
+                stim_circuit.append(name, pairs, args)
+        else:
+            qubits = idle_qubits if idle_qubits is not None else sorted(set(q for _, targets in moment for q in targets))
+            stim_circuit.append(name, qubits, args)
+    return stim_circuit
+
 #write stim to tequila and vice versa
-def stim_to_tequila(stim_circuit):
-    print('Not implemented')
-    return
+def stim_to_tequila(stim_circuit, qubit_map = None):
+    '''
+    Converts the unitary gates of a stim circuit into a tequila circuit.
+    Noise channels and annotations (TICK, DETECTOR, ...) are dropped, measurements and resets raise ValueError.
+    '''
+    qmap = None if qubit_map is None else qubit_map_array(qubit_map)
+    gates = []
+    for instruction in stim_circuit.flattened():
+        data = stim.gate_data(instruction.name)
+        if data.produces_measurements or data.is_reset:
+            raise ValueError('{} has no tequila equivalent.'.format(instruction.name))
+        if not data.is_unitary:
+            continue
+        targets = []
+        for t in instruction.targets_copy():
+            if not t.is_qubit_target:
+                raise ValueError('Unsupported target {} in {}.'.format(t, instruction))
+            q = t.value
+            if qmap is not None:
+                if q >= len(qmap) or qmap[q] < 0:
+                    raise KeyError(q)
+                q = int(qmap[q])
+            targets.append(q)
 
-def tequila_to_stim(tq_circuit, noises = []):
+        name = data.name
+        if data.is_two_qubit_gate:
+            for c, t in zip(targets[::2], targets[1::2]):
+                if name == 'CX':
+                    gates += tequila.gates.CNOT(control=c, target=t).gates
+                elif name == 'CY':
+                    gates += tequila.gates.Y(target=t, control=c).gates
+                elif name == 'CZ':
+                    gates += tequila.gates.Z(target=t, control=c).gates
+                elif name == 'SWAP':
+                    gates += tequila.gates.SWAP(c, t).gates
+                else:
+                    raise ValueError('{} has no tequila equivalent.'.format(name))
+        else:
+            for t in targets:
+                if name in ['H', 'X', 'Y', 'Z']:
+                    gates += getattr(tequila.gates, name)(target=t).gates
+                elif name == 'S':
+                    gates += tequila.gates.S(target=t).gates
+                elif name == 'S_DAG':
+                    gates += tequila.gates.Phase(target=t, angle=-np.pi/2).gates
+                elif name == 'I':
+                    continue
+                else:
+                    raise ValueError('{} has no tequila equivalent.'.format(name))
+    return tequila.QCircuit(gates=gates)
+
+def tequila_to_stim(tq_circuit, noises = [], noise_after = 'gate', qubit_map = None, tick = False):
     '''
-    Converts the tequila circuit into stim circuit, adds noise if noise is not None
+    Converts the tequila circuit (or QRMcircuit) into stim circuit, one instruction per gate type per moment.
+
+    noises: list of (stim noise channel, argument(s)) appended after every moment
+    noise_after: 'gate', single qubit channels on the qubits acted on, or 'layer', on all qubits of the circuit.
+    Two qubit channels always follow the two qubit gates.
+    qubit_map: dict, Permutation or array, qubit q of the circuit becomes qubit qubit_map[q] in stim
+    tick: adds TICK between moments
     '''
+    if noise_after not in ['gate', 'layer']:
+        raise ValueError('Unknown noise_after {}'.format(noise_after))
+    noises = check_noises(noises)
+    qmap = None if qubit_map is None else qubit_map_array(qubit_map)
+
+    def relabel(qubits):
+        if qmap is None:
+            return qubits
+        qubits = np.asarray(qubits, dtype=np.int64)
+        inside = qubits < len(qmap)
+        mapped = np.full(len(qubits), -1, dtype=np.int64)
+        mapped[inside] = qmap[qubits[inside]]
+        if (mapped < 0).any():
+            raise KeyError(int(qubits[mapped < 0][0]))
+        return mapped.tolist()
+
+    idle_qubits = None
+    if noise_after == 'layer':
+        idle_qubits = relabel(list(tq_circuit.qubits))
+
     stim_circuit = stim.Circuit()
-    gates = tq_circuit.gates
-    for gate in gates:
-        if gate.name == 'H':
-            stim_circuit += stim_H_list(targets=gate.target)
-        if gate.name == 'X':
-            stim_circuit += stim_CNOT_list(controls=gate.control, targets=gate.target)
-        
-        if len(noises) != 0:
-            for noise in noises:
-                stim_circuit.append("")
-    return stim_circuit
\ No newline at end of file
+    first = True
+    for moment in circuit_moments(tq_circuit):
+        moment = [(name, relabel(targets)) for name, targets in moment]
+        if tick and not first:
+            stim_circuit.append('TICK')
+        first = False
+        for name, targets in moment:
+            stim_circuit.append(name, targets)
+        add_noise(stim_circuit, noises, moment, idle_qubits)
+    return stim_circuit
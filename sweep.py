@@ -0,0 +1,188 @@
+#parallel sweep over (family, r, m, flags) encoder jobs: build, count gates, depth and connectivity Ed,
+#and check against the qrm_counts predictions. Rows are appended to a CSV, which is also the checkpoint.
+#usage: python sweep.py --m-max 14 --families rec std --out sweep.csv
+
+import io
+import os
+import csv
+import json
+import time
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from qrm_gates import CX_GATE
+from qrm_utils import connectivity
+from qrm_circuits import QRM_std_circuit, QRM_punc_std_circuit, QRM_rec_circuit, QRM_rec_punc_circuit
+from qrm_circuits_new import RecursiveQRM, RecursiveBasisQRM
+import qrm_counts
+
+def naive_std_count(r, m):
+    #CX count of QRM_std_circuit without transform_rows, qrm_counts.naive_CX_count except at (2, 2) where that
+    #count is 4 and the circuit has the 5 CNOTs of the formula
+    return None if (r, m) == (2, 2) else qrm_counts.naive_CX_count(r, m)
+
+#family: (encoder(r, m, **flags) -> QRMcircuit, predicted CX count, predicted depth or None, valid (r, m))
+FAMILIES = {
+    'std': (lambda r, m, transform_rows=True, only_cnots=False: QRM_std_circuit(r, m, transform_rows=transform_rows, only_cnots=only_cnots, circ_type='native')[0],
+            lambda r, m, transform_rows=True, **kw: qrm_counts.std_CX_count(r, m) if transform_rows else naive_std_count(r, m),
+            None,
+            lambda r, m: m//2 <= r <= m),
+    'std_punc': (lambda r, m, transform_rows=True, only_cnots=False: QRM_punc_std_circuit(r, m, transform_rows=transform_rows, only_cnots=only_cnots, circ_type='native')[0],
+                 None,
+                 None,
+                 lambda r, m: m//2 <= r < m),
+    'rec': (lambda r, m, only_cnots=False, classical=False: QRM_rec_circuit(r, m, only_cnots=only_cnots, classical=classical, circ_type='native')[0],
+            lambda r, m, classical=False, **kw: qrm_counts.Urm_CX_count(r, m) if classical else qrm_counts.rec_CX_count(r, m),
+            lambda r, m, only_cnots=False, classical=False: qrm_counts.rec_depth(r, m, only_cnots=only_cnots, classical=classical),
+            lambda r, m: max(m//2, 1) <= r <= m),
+    'rec_punc': (lambda r, m, only_cnots=False, state_prep=False: QRM_rec_punc_circuit(r, m, only_cnots=only_cnots, state_prep=state_prep, circ_type='native')[0],
+                 lambda r, m, state_prep=False, **kw: qrm_counts.rec_CX_count_punc(r, m, state_prep=state_prep),
+                 lambda r, m, state_prep=False, **kw: None if only_cnots_flag(kw) else qrm_counts.rec_depth_punc(r, m, state_prep=state_prep),
+                 lambda r, m: m//2 <= r < m and m > 1),
+    'RecursiveQRM': (lambda r, m: RecursiveQRM(r, m, circ_type='native')[0],
+                     lambda r, m: qrm_counts.rec_CX_count(r, m),
+                     lambda r, m: qrm_counts.rec_depth(r, m),
+                     lambda r, m: max(m//2, 1) <= r <= m),
+    'RecursiveBasisQRM': (lambda r, m: RecursiveBasisQRM(r, m, circ_type='native')[0],
+                          lambda r, m: qrm_counts.Urm_CX_count(r, m),
+                          lambda r, m: qrm_counts.Urm_depth(r, m),
+                          lambda r, m: 0 <= r <= m),
+}
+
+COLUMNS = ['family', 'r', 'm', 'flags', 'n_qubits', 'gates', 'CX', 'H', 'depth', 'Ed',
+           'predicted_CX', 'predicted_depth', 'CX_ok', 'depth_ok', 'build_s', 'analysis_s', 'error']
+
+def only_cnots_flag(flags):
+    return flags.get('only_cnots', False)
+
+def job_key(family, r, m, flags):
+    return (family, int(r), int(m), json.dumps(flags, sort_keys=True))
+
+def sweep_jobs(families = None, m_max = 10, m_min = 1, flags = {}):
+    '''
+    [(family, r, m, flags)] of every valid (r, m) with m_min <= m <= m_max, largest m first.
+    flags: dict of encoder flags per family, e.g. {'std': {'only_cnots': True}}
+    '''
+    jobs = []
+    for family in families or FAMILIES:
+        valid = FAMILIES[family][3]
+        for m in range(m_min, m_max + 1):
+            for r in range(m + 1):
+                if valid(r, m):
+                    jobs.append((family, r, m, dict(flags.get(family, {}))))
+    return sorted(jobs, key=lambda j: -j[2])
+
+def run_job(job):
+    '''
+    Row (dict of COLUMNS) of one (family, r, m, flags) job
+    '''
+    family, r, m, flags = job
+    encoder, count, depth, _ = FAMILIES[family]
+    row = dict.fromkeys(COLUMNS, '')
+    row.update(family=family, r=r, m=m, flags=json.dumps(flags, sort_keys=True))
+    try:
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            U = encoder(r, m, **flags)
+        row['build_s'] = round(time.perf_counter() - t, 4)
+
+        t = time.perf_counter()
+        is_cx = U.opcodes == CX_GATE
+        n_qubits = 2**m - 1 if 'punc' in family else 2**m
+        _, Ed = connectivity((U.controls[is_cx], U.targets[is_cx]), n_qubits)
+        row.update(n_qubits=n_qubits, gates=len(U), CX=int(is_cx.sum()), H=int((~is_cx).sum()),
+                   depth=U.depth, Ed=round(float(Ed), 6))
+        with contextlib.redirect_stdout(io.StringIO()):
+            if count is not None:
+                predicted = count(r, m, **flags)
+                if predicted is not None:
+                    row['predicted_CX'] = predicted
+                    row['CX_ok'] = predicted == row['CX']
+            if depth is not None:
+                predicted = depth(r, m, **flags)
+                if predicted is not None:
+                    row['predicted_depth'] = predicted
+                    row['depth_ok'] = predicted == row['depth']
+        row['analysis_s'] = round(time.perf_counter() - t, 4)
+    except Exception as e:
+        row['error'] = '{}: {}'.format(type(e).__name__, e)
+    return row
+
+def read_sweep(path):
+    '''
+    Rows of a sweep CSV as a dict of columns (lists)
+    '''
+    columns = {c: [] for c in COLUMNS}
+    if not os.path.isfile(path):
+        return columns
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            for c in COLUMNS:
+                columns[c].append(row.get(c, ''))
+    return columns
+
+def done_keys(path):
+    columns = read_sweep(path)
+    return set(job_key(f, r, m, json.loads(fl)) for f, r, m, fl in
+               zip(columns['family'], columns['r'], columns['m'], columns['flags']))
+
+def sweep(jobs, out = 'sweep.csv', processes = None, verbose = True):
+    '''
+    Runs the jobs over a process pool (processes = None uses all cores, 1 runs in this process).
+    Every finished row is appended to the CSV out, jobs already in out are skipped, so an interrupted
+    sweep resumes where it stopped. Returns the rows of this run.
+    '''
+    done = done_keys(out)
+    todo = [j for j in jobs if job_key(*j) not in done]
+    if verbose:
+        print('{} jobs, {} already in {}'.format(len(jobs), len(jobs) - len(todo), out))
+    new_file = not os.path.isfile(out) or os.path.getsize(out) == 0
+    rows = []
+    with open(out, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+
+        def record(row):
+            writer.writerow(row)
+            f.flush()
+            rows.append(row)
+            if verbose:
+                status = row['error'] or 'CX {} depth {}'.format(row['CX_ok'], row['depth_ok'])
+                print('{} r = {} m = {} {}: {:.2f} s, {}'.format(row['family'], row['r'], row['m'], row['flags'],
+                                                                 float(row['build_s'] or 0), status))
+
+        if processes == 1:
+            for job in todo:
+                record(run_job(job))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = [pool.submit(run_job, job) for job in todo]
+                for future in as_completed(futures):
+                    record(future.result())
+    return rows
+
+def mismatches(path):
+    '''
+    Rows of a sweep CSV whose counts or depths differ from the prediction, or that failed
+    '''
+    columns = read_sweep(path)
+    rows = [dict(zip(COLUMNS, values)) for values in zip(*[columns[c] for c in COLUMNS])]
+    return [row for row in rows if row['error'] or row['CX_ok'] == 'False' or row['depth_ok'] == 'False']
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel sweep of QRM encoders over (r, m).')
+    parser.add_argument('--m-min', type=int, default=1)
+    parser.add_argument('--m-max', type=int, default=10)
+    parser.add_argument('--families', nargs='+', default=list(FAMILIES), choices=list(FAMILIES))
+    parser.add_argument('--flags', type=json.loads, default={}, help='JSON dict of flags per family, e.g. \'{"std": {"only_cnots": true}}\'')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args()
+
+    sweep(sweep_jobs(args.families, m_max=args.m_max, m_min=args.m_min, flags=args.flags), out=args.out, processes=args.processes)
+    bad = mismatches(args.out)
+    print('{} mismatches or errors'.format(len(bad)))
+    for row in bad:
+        print(row)